@@ -0,0 +1,70 @@
+# isort: skip_file
+# Needs to be first to set up django environment
+from .helpers import *
+from typing import List
+
+from posthog.models.feature_flag import FeatureFlag, FeatureFlagMatcher
+
+
+PROPERTY_VALUE_OVERRIDES = {"plan": "pro", "email": "someone@posthog.com", "$browser": "Chrome"}
+
+
+def _build_feature_flags(count: int) -> List[FeatureFlag]:
+    feature_flags = []
+    for index in range(count):
+        filters = {
+            "groups": [
+                {
+                    "properties": [
+                        {"key": "plan", "value": ["pro", "enterprise"], "type": "person"},
+                        {"key": "email", "value": f"@domain-{index % 3}.com", "operator": "not_icontains"},
+                    ],
+                    "rollout_percentage": 50,
+                },
+                {"properties": [{"key": "$browser", "value": "Safari", "type": "person"}]},
+                {"rollout_percentage": 20},
+            ]
+        }
+        # Every fourth flag is a multivariate experiment
+        if index % 4 == 0:
+            filters["multivariate"] = {
+                "variants": [
+                    {"key": f"variant-{variant}", "rollout_percentage": percentage}
+                    for variant, percentage in enumerate([40, 20, 20, 10, 10])
+                ]
+            }
+        feature_flags.append(FeatureFlag(id=index + 1, team_id=1, key=f"flag-{index}", filters=filters))
+    return feature_flags
+
+
+class FeatureFlagMatchingSuite:
+    """
+    Matches all the flags of a team for users whose property overrides settle every condition, so that no
+    queries are made and only matching itself (property matching, rollout hashing, variant selection) is timed.
+
+    Like `HogQLParserSuite` these don't need ClickHouse, run e.g. with
+    `asv run --config ee/benchmarks/asv.conf.json --bench FeatureFlagMatchingSuite --quick`
+    """
+
+    version = "v001"
+    params = [20, 200, 1000]
+    param_names = ["flag_count"]
+
+    def setup(self, flag_count):
+        self.feature_flags = [feature_flag.compile_for_matching() for feature_flag in _build_feature_flags(flag_count)]
+
+    def time_get_matches(self, flag_count):
+        FeatureFlagMatcher(
+            self.feature_flags, "some_distinct_id", property_value_overrides=PROPERTY_VALUE_OVERRIDES
+        ).get_matches()
+
+    def time_get_matches_for_100_users(self, flag_count):
+        for index in range(100):
+            FeatureFlagMatcher(
+                self.feature_flags, f"distinct_id_{index}", property_value_overrides=PROPERTY_VALUE_OVERRIDES
+            ).get_matches()
+
+    def time_get_matching_variant(self, flag_count):
+        matcher = FeatureFlagMatcher(self.feature_flags, "some_distinct_id")
+        for feature_flag in self.feature_flags:
+            matcher.get_matching_variant(feature_flag)
@@ -0,0 +1,81 @@
+# isort: skip_file
+# Needs to be first to set up django environment
+from .helpers import *
+from unittest.mock import patch
+
+from posthog.models import Organization, Team
+from posthog.models.filters.filter import Filter
+from posthog.models.filters.mixins.property import PropertyMixin
+from posthog.queries.funnels.funnel_event_query import FunnelEventQuery
+from posthog.queries.trends.trends_event_query import TrendsEventQuery
+
+
+PROPERTIES = {
+    "type": "AND",
+    "values": [
+        {
+            "type": "OR",
+            "values": [
+                {"key": "$browser", "value": ["Chrome", "Safari"], "operator": "exact", "type": "event"},
+                {"key": "$current_url", "value": "/pricing", "operator": "icontains", "type": "event"},
+            ],
+        },
+        {"type": "AND", "values": [{"key": "email", "value": "@posthog.com", "operator": "not_icontains"}]},
+    ],
+}
+
+
+def _build_filter_data(series_count: int) -> dict:
+    return {
+        "events": [
+            {"id": f"event_{index}", "order": index, "properties": [{"key": "$os", "value": "Mac OS X"}]}
+            for index in range(series_count)
+        ],
+        "properties": PROPERTIES,
+        "date_from": "-30d",
+        "interval": "day",
+        "breakdown": "$browser",
+    }
+
+
+class FilterQueryBuildingSuite:
+    """
+    Builds the ClickHouse SQL of insights without running it, to time the work done on filters while building
+    queries (parsing properties, entities and dates), with two filters used alternately as concurrent requests do.
+
+    Like `QuerySuite` these need the benchmarking database for the team, run e.g. with
+    `asv run --config ee/benchmarks/asv.conf.json --bench FilterQueryBuildingSuite --quick`
+    """
+
+    version = "v001"
+    params = [1, 10]
+    param_names = ["series_count"]
+
+    def setup(self, series_count):
+        # :TRICKY: Data in benchmark servers has ID=2
+        team = Team.objects.filter(id=2).first()
+        if team is None:
+            organization = Organization.objects.create()
+            team = Team.objects.create(id=2, organization=organization, name="The Bakery")
+        self.team = team
+        self.filter_data = _build_filter_data(series_count)
+
+    def _build_queries(self):
+        filters = [Filter(data=self.filter_data, team=self.team) for _ in range(2)]
+        for index in range(len(self.filter_data["events"])):
+            for filter in filters:
+                TrendsEventQuery(filter=filter, entity=filter.entities[index], team=self.team).get_query()
+        for filter in filters:
+            FunnelEventQuery(filter=filter, team=self.team).get_query()
+
+    def time_build_trends_and_funnel_queries(self, series_count):
+        self._build_queries()
+
+    def track_property_group_parses(self, series_count):
+        with patch.object(
+            PropertyMixin, "_parse_property_group", autospec=True, side_effect=PropertyMixin._parse_property_group
+        ) as parse_property_group:
+            self._build_queries()
+        return parse_property_group.call_count
+
+    track_property_group_parses.unit = "parses"  # type: ignore
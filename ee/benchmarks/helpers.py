@@ -4,8 +4,6 @@ from contextlib import contextmanager
 from functools import wraps
 from os.path import dirname
 
-from django.utils.timezone import now
-
 os.environ["POSTHOG_DB_NAME"] = "posthog_test"
 os.environ["DJANGO_SETTINGS_MODULE"] = "posthog.settings"
 sys.path.append(dirname(dirname(dirname(__file__))))
@@ -71,6 +69,7 @@ def benchmark_clickhouse(fn):
 @contextmanager
 def no_materialized_columns():
     "Allows running a function without any materialized columns being used in query"
-    get_materialized_columns._cache = {("events",): (now(), {}), ("person",): (now(), {})}
+    for table in ("events", "person"):
+        get_materialized_columns._cache.set(((table,), frozenset()), {})
     yield
-    get_materialized_columns._cache = {}
+    get_materialized_columns._cache.clear()
@@ -0,0 +1,115 @@
+# isort: skip_file
+# Needs to be first to set up django environment
+from .helpers import *
+import base64
+import json
+import random
+from typing import Any, Dict, List
+
+from posthog.session_recordings.session_recording_helpers import (
+    GZIP_BASE64,
+    SNAPSHOT_CODECS,
+    ZSTD_BASE64,
+    compress_and_chunk_snapshots,
+    decompress_chunked_snapshot_data,
+    stream_chunked_snapshot_data,
+)
+from posthog.models.session_recording.metadata import SnapshotDataTaggedWithWindowId
+
+
+def _build_dom_node(depth: int, index: int) -> Dict[str, Any]:
+    node: Dict[str, Any] = {
+        "type": 2,
+        "tagName": "div",
+        "attributes": {"class": f"container level-{depth} item-{index}", "data-attr": f"node-{depth}-{index}"},
+        "id": depth * 1000 + index,
+        "childNodes": [{"type": 3, "textContent": f"Some text content for node {depth}-{index} 🦔", "id": index}],
+    }
+    if depth < 4:
+        node["childNodes"].extend(_build_dom_node(depth + 1, child) for child in range(5))
+    return node
+
+
+def _build_snapshot_events(incremental_event_count: int) -> List[Dict[str, Any]]:
+    rng = random.Random(0)
+    snapshots: List[Dict[str, Any]] = [
+        {"type": 4, "data": {"href": "https://example.com", "width": 1920, "height": 1080}, "timestamp": 0},
+        {"type": 2, "data": {"node": _build_dom_node(0, 0), "initialOffset": {"top": 0, "left": 0}}, "timestamp": 1},
+    ]
+    for index in range(incremental_event_count):
+        snapshots.append(
+            {
+                "type": 3,
+                "data": {
+                    "source": 1,
+                    "positions": [
+                        {
+                            "x": rng.randint(0, 1920),
+                            "y": rng.randint(0, 1080),
+                            "id": rng.randint(0, 5000),
+                            "timeOffset": -i,
+                        }
+                        for i in range(10)
+                    ],
+                },
+                "timestamp": 2 + index,
+            }
+        )
+    return [
+        {"event": "$snapshot", "properties": {"$session_id": "1", "$window_id": "1", "$snapshot_data": snapshot}}
+        for snapshot in snapshots
+    ]
+
+
+class SnapshotCompressionSuite:
+    """
+    Compares the snapshot compression codecs on ingestion CPU, stored bytes and playback decode time.
+
+    Unlike `QuerySuite` these don't need ClickHouse, run e.g. with
+    `asv run --config ee/benchmarks/asv.conf.json --bench SnapshotCompressionSuite --quick`
+    """
+
+    version = "v001"
+    params = [GZIP_BASE64, ZSTD_BASE64]
+    param_names = ["compression"]
+
+    def setup(self, compression):
+        self.events = _build_snapshot_events(5_000)
+        self.chunks = [
+            SnapshotDataTaggedWithWindowId(window_id="1", snapshot_data=event["properties"]["$snapshot_data"])
+            for event in compress_and_chunk_snapshots(self.events, compression=compression)
+        ]
+
+    def time_compress_and_chunk(self, compression):
+        list(compress_and_chunk_snapshots(self.events, compression=compression))
+
+    def track_stored_bytes(self, compression):
+        return sum(len(chunk["snapshot_data"]["data"]) for chunk in self.chunks)
+
+    track_stored_bytes.unit = "bytes"  # type: ignore
+
+    def track_compression_ratio(self, compression):
+        uncompressed_bytes = len(json.dumps([event["properties"]["$snapshot_data"] for event in self.events]))
+        return uncompressed_bytes / self.track_stored_bytes(compression)
+
+    def time_decompress_chunked_snapshot_data(self, compression):
+        decompress_chunked_snapshot_data(2, "benchmark", self.chunks)
+
+    def time_decode_only(self, compression):
+        data = base64.b64decode("".join(chunk["snapshot_data"]["data"] for chunk in self.chunks))
+        SNAPSHOT_CODECS[compression].decompress(data)
+
+    def time_stream_chunked_snapshot_data(self, compression):
+        self._consume_stream(compression)
+
+    def peakmem_decompress_chunked_snapshot_data(self, compression):
+        decompress_chunked_snapshot_data(2, "benchmark", self.chunks)
+
+    def peakmem_stream_chunked_snapshot_data(self, compression):
+        self._consume_stream(compression)
+
+    def _consume_stream(self, compression):
+        streamed = stream_chunked_snapshot_data(2, "benchmark", self.chunks, max_bytes=10 * 1024 * 1024)
+        for snapshot_data in streamed["snapshot_data_by_window_id"].values():
+            for _ in snapshot_data:
+                pass
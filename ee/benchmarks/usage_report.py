@@ -0,0 +1,75 @@
+# isort: skip_file
+# Needs to be first to set up django environment
+from .helpers import *
+import random
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from posthog.models.organization import Organization
+from posthog.models.team.team import Team
+from posthog.tasks.usage_report import build_org_reports, convert_team_usage_rows_to_dict
+
+
+USAGE_REPORT_QUERIES = [
+    "teams_with_event_count_lifetime",
+    "teams_with_event_count_in_period",
+    "teams_with_event_count_in_month",
+    "teams_with_event_count_with_groups_in_period",
+    "teams_with_recording_count_in_period",
+    "teams_with_recording_count_total",
+    "teams_with_group_types_total",
+    "teams_with_dashboard_count",
+    "teams_with_dashboard_template_count",
+    "teams_with_dashboard_shared_count",
+    "teams_with_dashboard_tagged_count",
+    "teams_with_ff_count",
+    "teams_with_ff_active_count",
+]
+
+
+def _build_teams(count: int) -> List[Team]:
+    created_at = datetime(2022, 1, 1)
+    # A few teams per organization, like on cloud
+    organizations = [
+        Organization(id=f"00000000-0000-0000-0000-{index:012d}", name=f"Org {index}", created_at=created_at)
+        for index in range(count // 3 + 1)
+    ]
+    return [Team(id=index + 1, organization=organizations[index // 3]) for index in range(count)]
+
+
+def _build_query_rows(team_count: int) -> Dict[str, List[Tuple[int, int]]]:
+    rng = random.Random(0)
+    # Only some teams have usage for each count, as rows are only returned for teams with any
+    return {
+        query: [(team_id, rng.randint(1, 10_000)) for team_id in range(1, team_count + 1) if rng.random() < 0.6]
+        for query in USAGE_REPORT_QUERIES
+    }
+
+
+class UsageReportSuite:
+    """
+    Builds the organization reports of `send_all_org_usage_reports` from synthetic query results, so that only
+    indexing and summing the per-team counts is timed.
+
+    Like `HogQLParserSuite` these don't need ClickHouse, run e.g. with
+    `asv run --config ee/benchmarks/asv.conf.json --bench UsageReportSuite --quick`
+    """
+
+    version = "v001"
+    params = [1_000, 10_000, 100_000]
+    param_names = ["team_count"]
+    timeout = 300
+
+    def setup(self, team_count):
+        self.teams = _build_teams(team_count)
+        self.query_rows = _build_query_rows(team_count)
+        self.all_data = {query: convert_team_usage_rows_to_dict(rows) for query, rows in self.query_rows.items()}
+        self.org_user_counts = {str(team.organization.id): 3 for team in self.teams}
+        self.period_start = datetime(2022, 1, 10)
+
+    def time_convert_team_usage_rows(self, team_count):
+        for rows in self.query_rows.values():
+            convert_team_usage_rows_to_dict(rows)
+
+    def time_build_org_reports(self, team_count):
+        build_org_reports(self.teams, self.all_data, self.org_user_counts, self.period_start)
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 
+from django.test import override_settings
 from django.utils import timezone
 from freezegun import freeze_time
 
@@ -9,7 +10,11 @@ from posthog.models.action import Action
 from posthog.models.action_step import ActionStep
 from posthog.models.cohort import Cohort
 from posthog.models.cohort.sql import GET_COHORTPEOPLE_BY_COHORT_ID
-from posthog.models.cohort.util import format_filter_query, get_person_ids_by_cohort_id
+from posthog.models.cohort.util import (
+    can_recalculate_cohortpeople_incrementally,
+    format_filter_query,
+    get_person_ids_by_cohort_id,
+)
 from posthog.models.filters import Filter
 from posthog.models.organization import Organization
 from posthog.models.person import Person
@@ -365,6 +370,86 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
         results = self._get_cohortpeople(cohort1)
         self.assertEqual(len(results), 2)
 
+    @override_settings(RECALCULATE_COHORTS_INCREMENTALLY=True)
+    def test_cohortpeople_incremental_recalculation(self):
+        with freeze_time("2023-05-01T12:00:00Z"):
+            staying = Person.objects.create(team_id=self.team.pk, distinct_ids=["1"], properties={"$some_prop": "a"})
+            leaving = Person.objects.create(team_id=self.team.pk, distinct_ids=["2"], properties={"$some_prop": "a"})
+            cohort = Cohort.objects.create(
+                team=self.team,
+                groups=[{"properties": [{"key": "$some_prop", "value": "a", "type": "person"}]}],
+                name="cohort1",
+            )
+            self.assertFalse(can_recalculate_cohortpeople_incrementally(cohort))
+            cohort.calculate_people_ch(pending_version=1)
+
+        with freeze_time("2023-05-01T14:00:00Z"):
+            leaving.properties = {"$some_prop": "b"}
+            leaving.version = 1
+            leaving.save()
+            joining = Person.objects.create(team_id=self.team.pk, distinct_ids=["3"], properties={"$some_prop": "a"})
+
+            cohort = Cohort.objects.get(pk=cohort.pk)
+            self.assertTrue(can_recalculate_cohortpeople_incrementally(cohort))
+            cohort.calculate_people_ch(pending_version=cohort.version, incremental=True)
+
+        cohort.refresh_from_db()
+        self.assertEqual(cohort.version, 1)
+        self.assertEqual(cohort.count, 2)
+        results = self._get_cohortpeople(cohort)
+        self.assertCountEqual([str(row[0]) for row in results], [str(staying.uuid), str(joining.uuid)])
+
+        # Changing the filters needs a full recalculation first
+        cohort.groups = [{"properties": [{"key": "$some_prop", "value": "b", "type": "person"}]}]
+        cohort.save()
+        self.assertFalse(can_recalculate_cohortpeople_incrementally(cohort))
+
+    def test_overlapping_incremental_recalculations_count_members_once(self):
+        with freeze_time("2023-05-01T12:00:00Z"):
+            staying = Person.objects.create(team_id=self.team.pk, distinct_ids=["1"], properties={"$some_prop": "a"})
+            leaving = Person.objects.create(team_id=self.team.pk, distinct_ids=["2"], properties={"$some_prop": "a"})
+            cohort = Cohort.objects.create(
+                team=self.team,
+                groups=[{"properties": [{"key": "$some_prop", "value": "a", "type": "person"}]}],
+                name="cohort1",
+            )
+            cohort.calculate_people_ch(pending_version=1)
+
+        with freeze_time("2023-05-01T14:00:00Z"):
+            leaving.properties = {"$some_prop": "b"}
+            leaving.version = 1
+            leaving.save()
+            joining = Person.objects.create(team_id=self.team.pk, distinct_ids=["3"], properties={"$some_prop": "a"})
+
+            # Both runs start from the same last calculation, as when a second one is dispatched before the first
+            # one finishes
+            first_run, second_run = Cohort.objects.get(pk=cohort.pk), Cohort.objects.get(pk=cohort.pk)
+            first_run.calculate_people_ch(pending_version=first_run.version, incremental=True)
+            second_run.calculate_people_ch(pending_version=second_run.version, incremental=True)
+
+        signs = sync_execute(
+            "SELECT person_id, sum(sign) FROM cohortpeople WHERE team_id = %(team_id)s AND cohort_id = %(cohort_id)s "
+            "GROUP BY person_id HAVING sum(sign) != 0",
+            {"team_id": self.team.pk, "cohort_id": cohort.pk},
+        )
+        self.assertCountEqual(
+            [(str(person_id), sign) for person_id, sign in signs], [(str(staying.uuid), 1), (str(joining.uuid), 1)]
+        )
+        cohort.refresh_from_db()
+        self.assertEqual(cohort.count, 2)
+
+    @override_settings(RECALCULATE_COHORTS_INCREMENTALLY=True)
+    def test_behavioral_cohorts_are_not_recalculated_incrementally(self):
+        cohort = Cohort.objects.create(
+            team=self.team,
+            groups=[{"event_id": "$pageview", "days": 7}],
+            name="cohort1",
+        )
+        cohort.calculate_people_ch(pending_version=1)
+        cohort.refresh_from_db()
+
+        self.assertFalse(can_recalculate_cohortpeople_incrementally(cohort))
+
     def test_cohortpeople_action_basic(self):
         action = _create_action(team=self.team, name="$pageview")
         Person.objects.create(
@@ -264,6 +264,56 @@ class TestFilters(PGTestFilters):
             },
         )
 
+    def test_simplify_loads_all_cohorts_in_one_query(self):
+        static_cohort = Cohort.objects.create(team=self.team, groups=[], is_static=True)
+        person_cohort = Cohort.objects.create(
+            team=self.team,
+            groups=[{"properties": [{"key": "email", "operator": "icontains", "value": ".com", "type": "person"}]}],
+        )
+        filter = Filter(
+            data={
+                "properties": [
+                    {"type": "cohort", "key": "id", "value": static_cohort.pk},
+                    {"type": "cohort", "key": "id", "value": 555_555},
+                ],
+                "events": [
+                    {"id": "$pageview", "properties": [{"type": "cohort", "key": "id", "value": person_cohort.pk}]},
+                    {
+                        "id": "$pageleave",
+                        "properties": [{"type": "cohort", "key": "id", "value": str(static_cohort.pk)}],
+                    },
+                ],
+            }
+        )
+
+        with self.assertNumQueries(1):
+            simplified_filter = filter.simplify(self.team)
+
+        self.assertEqual(
+            simplified_filter.properties_to_dict(),
+            {
+                "properties": {
+                    "type": "AND",
+                    "values": [
+                        {"type": "static-cohort", "key": "id", "value": static_cohort.pk},
+                        {"type": "cohort", "key": "id", "value": 555_555},
+                    ],
+                }
+            },
+        )
+        self.assertEqual(
+            [entity["properties"] for entity in simplified_filter.entities_to_dict()["events"]],
+            [
+                {
+                    "type": "AND",
+                    "values": [{"key": "email", "operator": "icontains", "value": ".com", "type": "person"}],
+                },
+                {"type": "AND", "values": [{"type": "static-cohort", "key": "id", "value": static_cohort.pk}]},
+            ],
+        )
+        # The filter being simplified is left as it was
+        self.assertEqual(filter.property_groups.flat[0].type, "cohort")
+
     def test_simplify_entities_with_group_math(self):
         filter = Filter(data={"events": [{"id": "$pageview", "math": "unique_group", "math_group_type_index": 2}]})
 
@@ -22,6 +22,36 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
         self.assertTrue(result.complete)
         self.assertEqual(result.results, [[2]])
 
+    @patch("posthog.clickhouse.client.execute_async.RESULT_BLOCK_ROWS", 2)
+    def test_async_query_client_pages_through_result_blocks(self):
+        query = "SELECT number FROM numbers(5)"
+        team_id = 2
+        query_id = client.enqueue_execute_with_progress(team_id, query, bypass_celery=True, force=True)
+
+        result = client.get_status_or_results(team_id, query_id)
+        self.assertTrue(result.complete)
+        self.assertEqual(result.result_blocks, 3)
+        self.assertEqual(result.results, [[0], [1], [2], [3], [4]])
+
+        result = client.get_status_or_results(team_id, query_id, block_offset=1, block_limit=1)
+        self.assertEqual(result.results, [[2], [3]])
+
+        result = client.get_status_or_results(team_id, query_id, block_offset=2, block_limit=5)
+        self.assertEqual(result.results, [[4]])
+
+        result = client.get_status_or_results(team_id, query_id, block_offset=3)
+        self.assertEqual(result.results, [])
+
+    def test_async_query_client_with_column_types(self):
+        query = "SELECT 1 AS one WHERE 0"
+        team_id = 2
+        query_id = client.enqueue_execute_with_progress(team_id, query, with_column_types=True, bypass_celery=True)
+        result = client.get_status_or_results(team_id, query_id)
+        self.assertTrue(result.complete)
+        self.assertEqual(result.result_blocks, 0)
+        self.assertEqual(result.results, [])
+        self.assertEqual(result.columns, [["one", "UInt8"]])
+
     def test_async_query_client_errors(self):
         query = "SELECT WOW SUCH DATA FROM NOWHERE THIS WILL CERTAINLY WORK"
         team_id = 2
@@ -58,7 +58,9 @@ def _calculate_secondary_experiment_results(experiment: Experiment, parsed_id: i
 
 
 def _experiment_results_cached(experiment: Experiment, results_type: str, filter: Filter, calculate_func: Callable):
-    cache_key = generate_cache_key(f"experiment_{results_type}_{filter.toJSON()}_{experiment.team.pk}_{experiment.pk}")
+    cache_key = generate_cache_key(
+        f"experiment_{results_type}_{filter.to_canonical_json()}_{experiment.team.pk}_{experiment.pk}"
+    )
 
     tag_queries(cache_key=cache_key)
 
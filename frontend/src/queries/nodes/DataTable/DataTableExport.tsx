@@ -3,18 +3,19 @@ import { IconExport } from 'lib/lemon-ui/icons'
 import { triggerExport } from 'lib/components/ExportButton/exporter'
 import { ExporterFormat } from '~/types'
 import { DataNode, DataTableNode } from '~/queries/schema'
-import { defaultDataTableColumns } from '~/queries/nodes/DataTable/utils'
+import { getDataNodeDefaultColumns } from '~/queries/nodes/DataTable/utils'
 import { isEventsQuery, isPersonsNode } from '~/queries/utils'
-import { getEventsEndpoint, getPersonsEndpoint } from '~/queries/query'
+import { getPersonsEndpoint } from '~/queries/query'
 import { ExportWithConfirmation } from '~/queries/nodes/DataTable/ExportWithConfirmation'
 
-const EXPORT_LIMIT_EVENTS = 3500
+// Events are exported by running their query on the server and streaming its results, so there can be many more
+const EXPORT_LIMIT_EVENTS = 1000000
 const EXPORT_LIMIT_PERSONS = 10000
 
 function startDownload(query: DataTableNode, onlySelectedColumns: boolean): void {
     const exportContext = isEventsQuery(query.source)
         ? {
-              path: getEventsEndpoint({ ...query.source, limit: EXPORT_LIMIT_EVENTS }),
+              source: { ...query.source, select: getDataNodeDefaultColumns(query.source) },
               max_limit: query.source.limit ?? EXPORT_LIMIT_EVENTS,
           }
         : isPersonsNode(query.source)
@@ -24,18 +25,21 @@ function startDownload(query: DataTableNode, onlySelectedColumns: boolean): void
         throw new Error('Unsupported node type')
     }
 
-    const columnMapping = {
-        url: ['properties.$current_url', 'properties.$screen_name'],
-        time: 'timestamp',
-        event: 'event',
-        source: 'properties.$lib',
-        person: isPersonsNode(query.source)
-            ? ['distinct_ids.0', 'properties.email']
-            : ['person.distinct_ids.0', 'person.properties.email'],
-    }
+    // Nested values of the columns not mapped here are exported as JSON
+    const columnMapping = isPersonsNode(query.source)
+        ? {
+              url: ['properties.$current_url', 'properties.$screen_name'],
+              time: 'timestamp',
+              event: 'event',
+              source: 'properties.$lib',
+              person: ['distinct_ids.0', 'properties.email'],
+          }
+        : {
+              person: ['person.distinct_id', 'person.properties.email'],
+          }
 
     if (onlySelectedColumns) {
-        exportContext['columns'] = (query.columns ?? defaultDataTableColumns(query.source.kind))
+        exportContext['columns'] = (query.columns ?? getDataNodeDefaultColumns(query.source))
             ?.flatMap((c) => columnMapping[c] || c)
             .filter((c) => c !== 'person.$delete')
     }
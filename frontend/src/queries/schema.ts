@@ -115,6 +115,8 @@ export interface HogQLQueryResponse {
     results?: any[]
     types?: any[]
     columns?: any[]
+    /** Seconds spent in each stage of running the query (parse, resolve, print, execute). Stages skipped thanks to caching are left out. */
+    timings?: Record<string, number>
 }
 
 export interface HogQLQuery extends DataNode {
@@ -3,17 +3,19 @@ import json
 import re
 import time
 from datetime import datetime
-from typing import Any, Dict, Iterator, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import orjson
 import structlog
 from dateutil import parser
 from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
 from django.http import JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from kafka.errors import KafkaError
 from kafka.producer.future import FutureRecordMetadata
-from prometheus_client import Counter
+from prometheus_client import Counter, Histogram
 from rest_framework import status
 from sentry_sdk import configure_scope
 from sentry_sdk.api import capture_exception, start_span
@@ -22,16 +24,20 @@ from token_bucket import Limiter, MemoryStorage
 
 from posthog.api.utils import (
     get_data,
+    get_invalid_payload_response,
+    get_request_too_large_response,
+    get_streamed_data,
     get_token,
     safe_clickhouse_string,
 )
-from posthog.exceptions import generate_exception_response
+from posthog.exceptions import RequestParsingError, generate_exception_response
 from posthog.kafka_client.client import KafkaProducer
 from posthog.kafka_client.topics import KAFKA_SESSION_RECORDING_EVENTS
 from posthog.logging.timing import timed
 from posthog.metrics import LABEL_RESOURCE_TYPE
 from posthog.models.utils import UUIDT
 from posthog.session_recordings.session_recording_helpers import (
+    iter_preprocess_session_recording_events,
     preprocess_session_recording_events_for_clickhouse,
 )
 from posthog.utils import cors_response, get_ip_address
@@ -54,6 +60,10 @@ LOG_RATE_LIMITER = Limiter(
 # fewer restrictions on e.g. the order they need to be processed in.
 SESSION_RECORDING_EVENT_NAMES = ("$snapshot", "$performance_event")
 
+# When decoding payloads in streaming mode, snapshots of a session and window are compressed
+# into chunks every this many events, rather than being buffered until the end of the request.
+STREAMING_MAX_BUFFERED_SNAPSHOTS = 100
+
 EVENTS_DROPPED_OVER_QUOTA_COUNTER = Counter(
     "capture_events_dropped_over_quota",
     "Events dropped by capture due to quota-limiting, per resource_type and token.",
@@ -72,6 +82,16 @@ TOKEN_SHAPE_INVALID_COUNTER = Counter(
     labelnames=["reason"],
 )
 
+BATCH_SERIALIZATION_TIME_HISTOGRAM = Histogram(
+    "capture_batch_serialization_seconds",
+    "Time spent building and serializing the Kafka messages of a capture request.",
+)
+
+BATCH_PRODUCE_TIME_HISTOGRAM = Histogram(
+    "capture_batch_produce_seconds",
+    "Time spent handing the serialized messages of a capture request to the Kafka producer.",
+)
+
 # This is a heuristic of ids we have seen used as anonymous. As they frequently
 # have significantly more traffic than non-anonymous distinct_ids, and likely
 # don't refer to the same underlying person we prefer to partition them randomly
@@ -99,6 +119,15 @@ LIKELY_ANONYMOUS_IDS = {
 }
 
 
+def _json_dumps(data: Any) -> bytes:
+    try:
+        return orjson.dumps(data)
+    except TypeError:
+        # orjson is stricter than the standard library, e.g. for integers over 64 bits or
+        # non-string keys, so we fall back rather than dropping the event.
+        return json.dumps(data).encode("utf-8")
+
+
 def build_kafka_event_data(
     distinct_id: str,
     ip: Optional[str],
@@ -115,23 +144,27 @@ def build_kafka_event_data(
         "distinct_id": safe_clickhouse_string(distinct_id),
         "ip": safe_clickhouse_string(ip) if ip else ip,
         "site_url": safe_clickhouse_string(site_url),
-        "data": json.dumps(data),
+        "data": _json_dumps(data).decode("utf-8"),
         "now": now.isoformat(),
         "sent_at": sent_at.isoformat() if sent_at else "",
         "token": token,
     }
 
 
-def log_event(data: Dict, event_name: str, partition_key: Optional[str]):
+def _get_kafka_topic(event_name: str) -> str:
     # To allow for different quality of service on session recordings and
     # `$performance_event` and other events, we push to a different topic.
     # TODO: split `$performance_event` out to it's own topic.
-    kafka_topic = (
+    return (
         KAFKA_SESSION_RECORDING_EVENTS
         if event_name in SESSION_RECORDING_EVENT_NAMES
         else settings.KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC
     )
 
+
+def log_event(data: Dict, event_name: str, partition_key: Optional[str]):
+    kafka_topic = _get_kafka_topic(event_name)
+
     logger.debug("logging_event", event_name=event_name, kafka_topic=kafka_topic)
 
     # TODO: Handle Kafka being unavailable with exponential backoff retries
@@ -218,16 +251,23 @@ def get_distinct_id(data: Dict[str, Any]) -> str:
     return str(raw_value)[0:200]
 
 
-def drop_events_over_quota(token: str, events: List[Any]) -> List[Any]:
+def drop_events_over_quota(token: str, events: Iterable[Any]) -> Iterable[Any]:
     if not settings.EE_AVAILABLE:
         return events
 
     from ee.billing.quota_limiting import QuotaResource, list_limited_team_tokens
 
-    results = []
+    # Limited tokens are fetched eagerly so that lookup errors are raised here rather than while
+    # iterating, while events themselves are filtered lazily as they are decoded.
     limited_tokens_events = list_limited_team_tokens(QuotaResource.EVENTS)
     limited_tokens_recordings = list_limited_team_tokens(QuotaResource.RECORDINGS)
 
+    return _iter_events_within_quota(token, events, limited_tokens_events, limited_tokens_recordings)
+
+
+def _iter_events_within_quota(
+    token: str, events: Iterable[Any], limited_tokens_events: List[str], limited_tokens_recordings: List[str]
+) -> Iterator[Any]:
     for event in events:
         if event.get("event") in SESSION_RECORDING_EVENT_NAMES:
             if token in limited_tokens_recordings:
@@ -240,9 +280,7 @@ def drop_events_over_quota(token: str, events: List[Any]) -> List[Any]:
             if settings.QUOTA_LIMITING_ENABLED:
                 continue
 
-        results.append(event)
-
-    return results
+        yield event
 
 
 @csrf_exempt
@@ -256,7 +294,13 @@ def get_event(request):
 
     now = timezone.now()
 
-    data, error_response = get_data(request)
+    # When streaming, a top-level list of events is decoded lazily as `events_stream` and
+    # processed event by event, with `data` only holding the first event for authentication.
+    events_stream: Optional[Iterator[Any]] = None
+    if settings.CAPTURE_STREAMING_DECODE_ENABLED:
+        data, events_stream, error_response = get_streamed_data(request)
+    else:
+        data, error_response = get_data(request)
 
     if error_response:
         return error_response
@@ -311,7 +355,10 @@ def get_event(request):
             elif "engage" in request.path_info:  # JS identify call
                 data["event"] = "$identify"  # make sure it has an event name
 
-        if isinstance(data, list):
+        events: Iterable[Any]
+        if events_stream is not None:
+            events = events_stream
+        elif isinstance(data, list):
             events = data
         else:
             events = [data]
@@ -322,12 +369,17 @@ def get_event(request):
             # NOTE: Whilst we are testing this code we want to track exceptions but allow the events through if anything goes wrong
             capture_exception(e)
 
-        try:
-            events = preprocess_session_recording_events_for_clickhouse(events)
-        except ValueError as e:
-            return cors_response(
-                request, generate_exception_response("capture", f"Invalid payload: {e}", code="invalid_payload")
+        if events_stream is not None:
+            events = iter_preprocess_session_recording_events(
+                events, max_buffered_snapshots=STREAMING_MAX_BUFFERED_SNAPSHOTS
             )
+        else:
+            try:
+                events = preprocess_session_recording_events_for_clickhouse(events)  # type: ignore
+            except ValueError as e:
+                return cors_response(
+                    request, generate_exception_response("capture", f"Invalid payload: {e}", code="invalid_payload")
+                )
 
         site_url = request.build_absolute_uri("/")[:-1]
         ip = get_ip_address(request)
@@ -338,35 +390,44 @@ def get_event(request):
             return cors_response(
                 request, generate_exception_response("capture", f"Invalid payload: {e}", code="invalid_payload")
             )
+        # Only raised while decoding a streamed payload
+        except RequestParsingError as error:
+            return get_invalid_payload_response(request, error)
+        except RequestDataTooBig:
+            return get_request_too_large_response(request)
 
     futures: List[FutureRecordMetadata] = []
 
     with start_span(op="kafka.produce") as span:
         span.set_tag("event.count", len(processed_events))
-        for event, event_uuid, distinct_id in processed_events:
-            try:
-                futures.append(capture_internal(event, distinct_id, ip, site_url, now, sent_at, event_uuid, token))
-            except Exception as exc:
-                capture_exception(exc, {"data": data})
-                statsd.incr("posthog_cloud_raw_endpoint_failure", tags={"endpoint": "capture"})
-                logger.error("kafka_produce_failure", exc_info=exc)
-                return cors_response(
-                    request,
-                    generate_exception_response(
-                        "capture",
-                        "Unable to store event. Please try again. If you are the owner of this app you can check the logs for further details.",
-                        code="server_error",
-                        type="server_error",
-                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    ),
-                )
+        try:
+            if settings.CAPTURE_BATCHED_PRODUCE_ENABLED:
+                futures = capture_batch_internal(processed_events, ip, site_url, now, sent_at, token)
+            else:
+                for event, event_uuid, distinct_id in processed_events:
+                    futures.append(capture_internal(event, distinct_id, ip, site_url, now, sent_at, event_uuid, token))
+        except Exception as exc:
+            capture_exception(exc, {"data": data})
+            statsd.incr("posthog_cloud_raw_endpoint_failure", tags={"endpoint": "capture"})
+            logger.error("kafka_produce_failure", exc_info=exc)
+            return cors_response(
+                request,
+                generate_exception_response(
+                    "capture",
+                    "Unable to store event. Please try again. If you are the owner of this app you can check the logs for further details.",
+                    code="server_error",
+                    type="server_error",
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                ),
+            )
 
-    with start_span(op="kafka.wait"):
+    with start_span(op="kafka.wait") as span:
         span.set_tag("future.count", len(futures))
-        start_time = time.monotonic()
+        # All acks share a single deadline, rather than each future getting the full timeout
+        deadline = time.monotonic() + settings.KAFKA_PRODUCE_ACK_TIMEOUT_SECONDS
         for future in futures:
             try:
-                future.get(timeout=settings.KAFKA_PRODUCE_ACK_TIMEOUT_SECONDS - (time.monotonic() - start_time))
+                future.get(timeout=max(deadline - time.monotonic(), 0))
             except KafkaError as exc:
                 # TODO: distinguish between retriable errors and non-retriable
                 # errors, and set Retry-After header accordingly.
@@ -388,7 +449,7 @@ def get_event(request):
     return cors_response(request, JsonResponse({"status": 1}))
 
 
-def preprocess_events(events: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], UUIDT, str]]:
+def preprocess_events(events: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], UUIDT, str]]:
     for event in events:
         event_uuid = UUIDT()
         distinct_id = get_distinct_id(event)
@@ -437,20 +498,73 @@ def capture_internal(event, distinct_id, ip, site_url, now, sent_at, event_uuid=
         token=token,
     )
 
+    kafka_partition_key = get_partition_key(event["event"], distinct_id, token)
+
+    return log_event(parsed_event, event["event"], partition_key=kafka_partition_key)
+
+
+def capture_batch_internal(
+    events: List[Tuple[Dict[str, Any], UUIDT, str]],
+    ip: Optional[str],
+    site_url: str,
+    now: datetime,
+    sent_at: Optional[datetime],
+    token: str,
+) -> List[FutureRecordMetadata]:
+    """
+    Batched counterpart of `capture_internal`, taking the output of `preprocess_events`.
+
+    All the Kafka messages are built and serialized in a single pass, then handed to the
+    producer in one call. The returned futures are in the same order as `events`.
+    """
+    serialization_start = time.monotonic()
+    messages: List[Tuple[str, bytes, Optional[str]]] = []
+    for event, event_uuid, distinct_id in events:
+        parsed_event = build_kafka_event_data(
+            distinct_id=distinct_id,
+            ip=ip,
+            site_url=site_url,
+            data=event,
+            now=now,
+            sent_at=sent_at,
+            event_uuid=event_uuid,
+            token=token,
+        )
+        messages.append(
+            (
+                _get_kafka_topic(event["event"]),
+                _json_dumps(parsed_event),
+                get_partition_key(event["event"], distinct_id, token),
+            )
+        )
+    BATCH_SERIALIZATION_TIME_HISTOGRAM.observe(time.monotonic() - serialization_start)
+
+    produce_start = time.monotonic()
+    try:
+        futures = KafkaProducer().produce_batch(messages)
+    except Exception as e:
+        statsd.incr("capture_endpoint_log_event_error")
+        logger.exception("Failed to produce batch of %s events to Kafka with error", len(messages))
+        raise e
+    BATCH_PRODUCE_TIME_HISTOGRAM.observe(time.monotonic() - produce_start)
+
+    statsd.incr("posthog_cloud_plugin_server_ingestion", len(messages))
+    return futures
+
+
+def get_partition_key(event_name: str, distinct_id: str, token: Optional[str]) -> Optional[str]:
     # We aim to always partition by {team_id}:{distinct_id} but allow
     # overriding this to deal with hot partitions in specific cases.
     # Setting the partition key to None means using random partitioning.
-    kafka_partition_key = None
-
-    if event["event"] in ("$snapshot", "$performance_event"):
-        return log_event(parsed_event, event["event"], partition_key=kafka_partition_key)
+    if event_name in SESSION_RECORDING_EVENT_NAMES:
+        return None
 
     candidate_partition_key = f"{token}:{distinct_id}"
 
     if distinct_id.lower() not in LIKELY_ANONYMOUS_IDS and is_randomly_partitioned(candidate_partition_key) is False:
-        kafka_partition_key = hashlib.sha256(candidate_partition_key.encode()).hexdigest()
+        return hashlib.sha256(candidate_partition_key.encode()).hexdigest()
 
-    return log_event(parsed_event, event["event"], partition_key=kafka_partition_key)
+    return None
 
 
 def is_randomly_partitioned(candidate_partition_key: str) -> bool:
@@ -185,7 +185,7 @@ def get_decide(request: HttpRequest):
             site_apps = []
             if team.inject_web_apps:
                 try:
-                    site_apps = get_decide_site_apps(team)
+                    site_apps = get_decide_site_apps(team, use_cache=True)
                 except Exception:
                     pass
 
@@ -20,9 +20,11 @@ from posthog.models.activity_logging.activity_page import activity_page_response
 from posthog.models.cohort import Cohort
 from posthog.models.cohort.util import get_dependent_cohorts
 from posthog.models.feature_flag import (
+    FeatureFlagEvaluationTarget,
     FeatureFlagMatcher,
     can_user_edit_feature_flag,
     get_all_feature_flags,
+    get_all_feature_flags_for_distinct_ids,
     get_user_blast_radius,
 )
 from posthog.models.group_type_mapping import GroupTypeMapping
@@ -31,6 +33,10 @@ from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMembe
 from posthog.rate_limit import BurstRateThrottle
 
 
+# How many distinct_ids a single bulk_evaluation request can evaluate flags for
+BULK_EVALUATION_MAX_DISTINCT_IDS = 1000
+
+
 class FeatureFlagThrottle(BurstRateThrottle):
     # Throttle class that's scoped just to the local evaluation endpoint.
     # This makes the rate limit independent of other endpoints.
@@ -424,6 +430,51 @@ class FeatureFlagViewSet(TaggedItemViewSetMixin, StructuredViewSetMixin, ForbidD
 
         return Response(flags_with_evaluation_reasons)
 
+    @action(methods=["POST"], detail=False, throttle_classes=[FeatureFlagThrottle])
+    def bulk_evaluation(self, request: request.Request, **kwargs):
+        """
+        Evaluates flags for many distinct_ids at once, e.g. from server-side libraries or backfills. Takes
+        `evaluations`, a list of `distinct_id`s with optional `groups`, `person_properties` and `group_properties`
+        like /decide, and returns /decide's `featureFlags`, `featureFlagPayloads` and `errorsWhileComputingFlags`
+        for each distinct_id.
+        """
+        evaluations = request.data.get("evaluations")
+        if not isinstance(evaluations, list) or len(evaluations) == 0:
+            raise exceptions.ValidationError("evaluations must be a non-empty list")
+        if len(evaluations) > BULK_EVALUATION_MAX_DISTINCT_IDS:
+            raise exceptions.ValidationError(
+                f"At most {BULK_EVALUATION_MAX_DISTINCT_IDS} distinct_ids can be evaluated at once"
+            )
+
+        targets = []
+        for evaluation in evaluations:
+            if not isinstance(evaluation, dict) or not evaluation.get("distinct_id"):
+                raise exceptions.ValidationError("Each evaluation needs a distinct_id")
+            for key in ["groups", "person_properties", "group_properties"]:
+                if not isinstance(evaluation.get(key) or {}, dict):
+                    raise exceptions.ValidationError(f"{key} must be an object")
+            targets.append(
+                FeatureFlagEvaluationTarget(
+                    distinct_id=str(evaluation["distinct_id"]),
+                    groups=evaluation.get("groups") or {},
+                    property_value_overrides=evaluation.get("person_properties") or {},
+                    group_property_value_overrides=evaluation.get("group_properties") or {},
+                )
+            )
+
+        results = get_all_feature_flags_for_distinct_ids(self.team_id, targets)
+
+        return Response(
+            {
+                distinct_id: {
+                    "featureFlags": flags,
+                    "featureFlagPayloads": payloads,
+                    "errorsWhileComputingFlags": errors,
+                }
+                for distinct_id, (flags, _, payloads, errors) in results.items()
+            }
+        )
+
     @action(methods=["POST"], detail=False)
     def user_blast_radius(self, request: request.Request, **kwargs):
 
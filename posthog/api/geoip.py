@@ -1,9 +1,13 @@
-from typing import Dict, Optional
+import math
+from typing import Dict, Optional, cast
 
 import structlog
+from django.conf import settings
 from django.contrib.gis.geoip2 import GeoIP2
 from sentry_sdk import capture_exception
 
+from posthog.cache_utils import TTLCache
+
 logger = structlog.get_logger(__name__)
 
 
@@ -26,6 +30,10 @@ VALID_GEOIP_PROPERTIES = [
     "time_zone",
 ]
 
+# The same IPs call /decide over and over, so their lookups are kept around. Hit rates are exported by
+# the `memoized_function_cache` counter, labelled `geoip`.
+_geoip_cache = TTLCache(None, ttl=math.inf, max_size=settings.GEOIP_CACHE_SIZE, name="geoip")
+
 
 def get_geoip_properties(ip_address: Optional[str]) -> Dict[str, str]:
     """
@@ -44,10 +52,23 @@ def get_geoip_properties(ip_address: Optional[str]) -> Dict[str, str]:
         # "127.0.0.1" would throw "The address 127.0.0.1 is not in the database." below
         return {}
 
+    if not settings.GEOIP_CACHE_ENABLED:
+        return _lookup_geoip_properties(ip_address)
+    try:
+        properties = _geoip_cache.get(ip_address, lambda: _lookup_geoip_properties(ip_address, raise_errors=True))
+    except Exception:
+        # Failed lookups aren't cached, they're usually down to the database and might succeed next time
+        return {}
+    return dict(properties)
+
+
+def _lookup_geoip_properties(ip_address: str, raise_errors: bool = False) -> Dict[str, str]:
     try:
-        geoip_properties = geoip.city(ip_address)
+        geoip_properties = cast(GeoIP2, geoip).city(ip_address)
     except Exception as e:
         logger.exception(f"geoIP computation error: {e}")
+        if raise_errors:
+            raise
         return {}
 
     properties = {}
@@ -1,10 +1,10 @@
 import json
-from typing import Any, List, Type, cast
+from typing import Any, Dict, Iterator, List, Optional, Type, cast
 
 import structlog
 from dateutil import parser
 from django.db.models import Count, Prefetch
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import exceptions, request, serializers, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -18,6 +18,7 @@ from posthog.constants import SESSION_RECORDINGS_FILTER_IDS
 from posthog.models import Filter
 from posthog.models.filters.session_recordings_filter import SessionRecordingsFilter
 from posthog.models.person.person import PersonDistinctId
+from posthog.models.session_recording.metadata import SnapshotData, WindowId
 from posthog.models.session_recording.session_recording import SessionRecording
 from posthog.models.session_recording_event import SessionRecordingViewed
 from posthog.models.team.team import Team
@@ -28,6 +29,7 @@ from posthog.rate_limit import ClickHouseBurstRateThrottle, ClickHouseSustainedR
 from posthog.utils import format_query_params_absolute_url
 
 DEFAULT_RECORDING_CHUNK_LIMIT = 20  # Should be tuned to find the best value
+MAX_RECORDING_PAGE_SIZE_BYTES = 10 * 1024 * 1024
 
 logger = structlog.get_logger(__name__)
 
@@ -86,6 +88,22 @@ class SessionRecordingPropertiesSerializer(serializers.Serializer):
         }
 
 
+def stream_snapshots_response(
+    next_url: Optional[str], snapshot_data_by_window_id: Dict[WindowId, Iterator[SnapshotData]]
+) -> Iterator[str]:
+    """
+    Renders the same JSON as the snapshots endpoint, without the legacy `result` key, event by event.
+    """
+    yield '{"next": %s, "snapshot_data_by_window_id": {' % json.dumps(next_url)
+    for window_index, (window_id, snapshot_data) in enumerate(snapshot_data_by_window_id.items()):
+        # Matches how `json.dumps` renders a None key
+        yield "%s%s: [" % ("," if window_index else "", json.dumps("null" if window_id is None else window_id))
+        for event_index, event in enumerate(snapshot_data):
+            yield ("," if event_index else "") + json.dumps(event)
+        yield "]"
+    yield "}}"
+
+
 class SessionRecordingViewSet(StructuredViewSetMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated, ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission]
     throttle_classes = [ClickHouseBurstRateThrottle, ClickHouseSustainedRateThrottle]
@@ -153,6 +171,26 @@ class SessionRecordingViewSet(StructuredViewSetMixin, viewsets.ViewSet):
             )
             recording.start_time = recording_start_time
 
+        # When a byte budget is given, pages are sized by stored bytes and the response is streamed as the
+        # snapshots are decoded, rather than decoding `limit` chunks into memory before responding
+        if request.GET.get("page_size_bytes"):
+            try:
+                page_size_bytes = int(request.GET["page_size_bytes"])
+            except ValueError:
+                raise exceptions.ValidationError("page_size_bytes must be an integer")
+            streamed = recording.stream_snapshots(min(page_size_bytes, MAX_RECORDING_PAGE_SIZE_BYTES), offset)
+
+            if not streamed:
+                raise exceptions.NotFound("Snapshots not found")
+
+            next_url = (
+                format_query_params_absolute_url(request, streamed["next_offset"]) if streamed["has_next"] else None
+            )
+            return StreamingHttpResponse(
+                stream_snapshots_response(next_url, streamed["snapshot_data_by_window_id"]),
+                content_type="application/json",
+            )
+
         recording.load_snapshots(limit, offset)
 
         if not recording.snapshot_data_by_window_id:
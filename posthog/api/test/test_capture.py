@@ -1,5 +1,6 @@
 import base64
 import gzip
+import hashlib
 import json
 import pathlib
 import random
@@ -604,6 +605,115 @@ class TestCapture(BaseTest):
 
         validate_response(openapi_spec, response)
 
+    @patch("posthog.kafka_client.client._KafkaProducer.produce_batch", return_value=[])
+    def test_batch_produces_in_a_single_call(self, kafka_produce_batch):
+        data = [
+            {"type": "capture", "event": "event1", "distinct_id": "2"},
+            {"type": "capture", "event": "$snapshot", "distinct_id": "2", "properties": {"$snapshot_data": {}}},
+            {"type": "capture", "event": "event3", "distinct_id": "anonymous"},
+        ]
+        with self.settings(CAPTURE_BATCHED_PRODUCE_ENABLED=True):
+            response = self.client.post(
+                "/batch/", data={"api_key": self.team.api_token, "batch": data}, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(kafka_produce_batch.call_count, 1)
+
+        messages = kafka_produce_batch.call_args[0][0]
+        self.assertEqual(
+            [topic for topic, _, _ in messages],
+            [KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, KAFKA_SESSION_RECORDING_EVENTS, KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC],
+        )
+        self.assertEqual(
+            [key for _, _, key in messages],
+            [hashlib.sha256(f"{self.team.api_token}:2".encode()).hexdigest(), None, None],
+        )
+
+        envelope = json.loads(messages[0][1])
+        self.assertEqual(envelope["distinct_id"], "2")
+        self.assertEqual(envelope["token"], self.team.api_token)
+        self.assertEqual(json.loads(envelope["data"]), {**data[0], "properties": {}})
+
+    @patch("posthog.kafka_client.client._KafkaProducer.produce_batch")
+    def test_batch_produce_503_on_kafka_errors(self, kafka_produce_batch):
+        produce_future = FutureProduceResult(topic_partition=TopicPartition(KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, 1))
+        future = FutureRecordMetadata(
+            produce_future=produce_future,
+            relative_offset=0,
+            timestamp_ms=0,
+            checksum=0,
+            serialized_key_size=0,
+            serialized_value_size=0,
+            serialized_header_size=0,
+        )
+        future.failure(KafkaError("Failed to produce"))
+        kafka_produce_batch.return_value = [future]
+
+        data = {"type": "capture", "event": "user signed up", "distinct_id": "2"}
+        with self.settings(CAPTURE_BATCHED_PRODUCE_ENABLED=True):
+            response = self.client.post(
+                "/batch/", data={"api_key": self.team.api_token, "batch": [data]}, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_streaming_decode_of_gzipped_list(self, kafka_produce):
+        events = [
+            {"event": f"event {i}", "properties": {"distinct_id": "2", "token": self.team.api_token}} for i in range(5)
+        ]
+        with self.settings(CAPTURE_STREAMING_DECODE_ENABLED=True):
+            response = self.client.post(
+                "/e/?compression=gzip-js",
+                data=gzip.compress(json.dumps(events).encode("utf-8")),
+                content_type="text/plain",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [json.loads(call[1]["data"]["data"])["event"] for call in kafka_produce.call_args_list],
+            [f"event {i}" for i in range(5)],
+        )
+
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_streaming_decode_of_batch_object(self, kafka_produce):
+        data = {"type": "capture", "event": "user signed up", "distinct_id": "2"}
+        with self.settings(CAPTURE_STREAMING_DECODE_ENABLED=True):
+            response = self.client.post(
+                "/batch/",
+                data={"batch": [data], "api_key": self.team.api_token},
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._to_arguments(kafka_produce)["data"], {**data, "properties": {}})
+
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_streaming_decode_rejects_invalid_json_after_first_event(self, kafka_produce):
+        body = '[{"event": "event", "properties": {"distinct_id": "2", "token": "%s"}}, {"event":' % self.team.api_token
+        with self.settings(CAPTURE_STREAMING_DECODE_ENABLED=True):
+            response = self.client.post("/e/", data=body, content_type="text/plain")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["code"], "invalid_payload")
+        self.assertEqual(kafka_produce.call_count, 0)
+
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_streaming_decode_caps_decompressed_size(self, kafka_produce):
+        events = [
+            {"event": "event", "properties": {"distinct_id": "2", "token": self.team.api_token, "big": "x" * 10_000}}
+        ]
+        with self.settings(CAPTURE_STREAMING_DECODE_ENABLED=True, CAPTURE_STREAMING_MAX_DECODED_BYTES=1000):
+            response = self.client.post(
+                "/e/?compression=gzip",
+                data=gzip.compress(json.dumps(events).encode("utf-8")),
+                content_type="text/plain",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(kafka_produce.call_count, 0)
+
     @patch("posthog.kafka_client.client._KafkaProducer.produce")
     def test_batch_with_dumped_json_data(self, kafka_produce):
         """Test batch rejects payloads that contained JSON dumped data.
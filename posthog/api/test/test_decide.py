@@ -247,6 +247,31 @@ class TestDecide(BaseTest, QueryMatchingTest):
             self.assertEqual(len(injected), 1)
             self.assertTrue(injected[0]["url"].startswith(f"/site_app/{plugin_config.id}/{plugin_config.web_token}/"))
 
+    def test_site_apps_are_cached_until_plugin_configs_change(self):
+        plugin = Plugin.objects.create(organization=self.team.organization, name="My Plugin", plugin_type="source")
+        PluginSourceFile.objects.create(
+            plugin=plugin,
+            filename="site.ts",
+            source="export function inject (){}",
+            transpiled="function inject(){}",
+            status=PluginSourceFile.Status.TRANSPILED,
+        )
+        plugin_config = PluginConfig.objects.create(
+            plugin=plugin, enabled=True, order=1, team=self.team, config={}, web_token="tokentoken"
+        )
+        injected = self._post_decide().json()["siteApps"]
+        self.assertEqual(len(injected), 1)
+
+        # Changes that skip Django signals only show up once the cached site apps expire
+        PluginConfig.objects.filter(pk=plugin_config.pk).update(web_token="othertoken")
+        self.assertEqual(self._post_decide().json()["siteApps"], injected)
+
+        plugin_config.refresh_from_db()
+        plugin_config.save()
+        injected = self._post_decide().json()["siteApps"]
+        self.assertEqual(len(injected), 1)
+        self.assertTrue(injected[0]["url"].startswith(f"/site_app/{plugin_config.id}/othertoken/"))
+
     def test_feature_flags(self):
         self.team.app_urls = ["https://example.com"]
         self.team.save()
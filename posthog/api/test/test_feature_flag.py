@@ -1457,6 +1457,71 @@ class TestFeatureFlag(APIBaseTest):
             sorted_flags[1],
         )
 
+    def test_bulk_evaluation(self):
+        Person.objects.create(team_id=self.team.pk, distinct_ids=["1"], properties={"beta-property": "beta-value"})
+        FeatureFlag.objects.create(
+            team=self.team,
+            key="beta-feature",
+            created_by=self.user,
+            filters={"groups": [{"properties": [{"key": "beta-property", "value": "beta-value", "type": "person"}]}]},
+        )
+
+        response = self.client.post(
+            f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation",
+            {
+                "evaluations": [
+                    {"distinct_id": "1"},
+                    {"distinct_id": "2"},
+                    {"distinct_id": 3, "person_properties": {"beta-property": "beta-value"}},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json(),
+            {
+                "1": {
+                    "featureFlags": {"red_button": True, "beta-feature": True},
+                    "featureFlagPayloads": {},
+                    "errorsWhileComputingFlags": False,
+                },
+                "2": {
+                    "featureFlags": {"red_button": True, "beta-feature": False},
+                    "featureFlagPayloads": {},
+                    "errorsWhileComputingFlags": False,
+                },
+                "3": {
+                    "featureFlags": {"red_button": True, "beta-feature": True},
+                    "featureFlagPayloads": {},
+                    "errorsWhileComputingFlags": False,
+                },
+            },
+        )
+
+    def test_bulk_evaluation_validates_evaluations(self):
+        for data in [
+            {},
+            {"evaluations": []},
+            {"evaluations": [{"groups": {}}]},
+            {"evaluations": [{"distinct_id": "1", "groups": ["organization", "1"]}]},
+            {"evaluations": [{"distinct_id": "1", "person_properties": "email"}]},
+            {"evaluations": [{"distinct_id": "1", "group_properties": [{"organization": {}}]}]},
+        ]:
+            response = self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation", data, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with patch("posthog.api.feature_flag.BULK_EVALUATION_MAX_DISTINCT_IDS", 2):
+            response = self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation",
+                {"evaluations": [{"distinct_id": str(index)} for index in range(3)]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     @patch("posthog.api.feature_flag.report_user_action")
     def test_evaluation_reasons(self, mock_capture):
         FeatureFlag.objects.all().delete()
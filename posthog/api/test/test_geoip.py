@@ -3,9 +3,9 @@ from unittest.mock import Mock
 
 import pytest
 from django.contrib.gis.geoip2 import GeoIP2, GeoIP2Exception
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from posthog.api.geoip import geoip, get_geoip_properties
+from posthog.api.geoip import _geoip_cache, geoip, get_geoip_properties
 
 australia_ip = "13.106.122.3"
 uk_ip = "31.28.64.3"
@@ -49,3 +49,32 @@ class TestGeoIPError(TestCase):
         properties = get_geoip_properties(None)
 
         self.assertEqual(properties, {})
+
+
+@override_settings(GEOIP_CACHE_ENABLED=True)
+class TestGeoIPCache(TestCase):
+    def setUp(self) -> None:
+        _geoip_cache.clear()
+        self.geoip_city_method = cast(GeoIP2, geoip).city
+        self.geoip_city_mock = Mock(wraps=self.geoip_city_method)
+        geoip.city = self.geoip_city_mock  # type: ignore
+
+    def tearDown(self) -> None:
+        geoip.city = self.geoip_city_method  # type: ignore
+        _geoip_cache.clear()
+
+    def test_geoip_lookups_are_cached_by_ip(self):
+        properties = get_geoip_properties(australia_ip)
+        properties["$geoip_country_name"] = "Mutated"
+
+        self.assertEqual(get_geoip_properties(australia_ip)["$geoip_country_name"], "Australia")
+        self.assertEqual(get_geoip_properties(uk_ip)["$geoip_country_name"], "United Kingdom")
+        self.assertEqual(self.geoip_city_mock.call_count, 2)
+
+    def test_failed_geoip_lookups_are_not_cached(self):
+        self.geoip_city_mock.side_effect = GeoIP2Exception("GeoIP file not found")
+        self.assertEqual(get_geoip_properties(australia_ip), {})
+
+        self.geoip_city_mock.side_effect = None
+        self.assertEqual(get_geoip_properties(australia_ip)["$geoip_country_name"], "Australia")
+        self.assertEqual(self.geoip_city_mock.call_count, 2)
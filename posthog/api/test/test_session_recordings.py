@@ -1,3 +1,4 @@
+import json
 from datetime import datetime, timedelta, timezone
 from unittest.mock import ANY
 from urllib.parse import urlencode
@@ -367,6 +368,48 @@ class TestSessionRecordings(APIBaseTest, ClickhouseTestMixin, QueryMatchingTest)
 
                 next_url = response_data["result"]["next"]
 
+    def test_stream_snapshots_for_chunked_session_recording_by_byte_budget(self):
+        chunked_session_id = "chunk_id"
+        num_chunks = 10
+        snapshots_per_chunk = 2
+
+        with freeze_time("2020-09-13T12:26:40.000Z"):
+            start_time = now()
+            for index in range(num_chunks):
+                self.create_chunked_snapshots(
+                    snapshots_per_chunk,
+                    "user",
+                    chunked_session_id,
+                    start_time + relativedelta(minutes=index),
+                    window_id="1" if index % 2 == 0 else "2",
+                )
+
+            next_url = (
+                f"/api/projects/{self.team.id}/session_recordings/{chunked_session_id}/snapshots?page_size_bytes=1"
+            )
+            snapshot_count = 0
+            request_count = 0
+            while next_url:
+                response = self.client.get(next_url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                response_data = json.loads(b"".join(response.streaming_content))
+
+                # A page always holds at least one chunk group, even when it is over the byte budget
+                snapshot_count += sum(len(events) for events in response_data["snapshot_data_by_window_id"].values())
+                request_count += 1
+                next_url = response_data["next"]
+
+            self.assertEqual(snapshot_count, num_chunks * snapshots_per_chunk)
+            self.assertEqual(request_count, num_chunks)
+
+            response = self.client.get(
+                f"/api/projects/{self.team.id}/session_recordings/{chunked_session_id}/snapshots?page_size_bytes=10000000"
+            )
+            response_data = json.loads(b"".join(response.streaming_content))
+            self.assertIsNone(response_data["next"])
+            self.assertEqual(len(response_data["snapshot_data_by_window_id"]["1"]), num_chunks)
+            self.assertEqual(len(response_data["snapshot_data_by_window_id"]["2"]), num_chunks)
+
     def test_get_metadata_for_chunked_session_recording(self):
 
         with freeze_time("2020-09-13T12:26:40.000Z"):
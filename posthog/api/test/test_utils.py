@@ -1,5 +1,6 @@
 import json
 from typing import Any, cast
+from unittest.mock import call, patch
 
 from django.http import HttpRequest
 from django.test.client import RequestFactory
@@ -10,6 +11,7 @@ from posthog.api.utils import (
     check_definition_ids_inclusion_field_sql,
     format_paginated_url,
     get_data,
+    get_streamed_data,
     get_target_entity,
     safe_clickhouse_string,
 )
@@ -37,6 +39,26 @@ class TestUtils(BaseTest):
         self.assertEqual(data, {"event": "some event"})
         self.assertEqual(error_response, None)
 
+    @patch("posthog.utils.configure_scope")
+    def test_get_streamed_data_pushes_debug_information_into_sentry_scope(self, patched_scope):
+        mock_set_tag = patched_scope.return_value.__enter__.return_value.set_tag
+        mock_set_context = patched_scope.return_value.__enter__.return_value.set_context
+
+        request = RequestFactory().post(
+            "/batch/?ver=1.20.0",
+            json.dumps({"api_key": "token", "batch": [{"event": "some event"}]}),
+            "text/plain",
+            HTTP_ORIGIN="potato.io",
+            HTTP_REFERER="https://potato.io",
+        )
+        data, events, error_response = get_streamed_data(request)
+
+        self.assertEqual(error_response, None)
+        mock_set_tag.assert_has_calls(
+            [call("origin", "potato.io"), call("referer", "https://potato.io"), call("library.version", "1.20.0")]
+        )
+        mock_set_context.assert_called_once_with("data", data)
+
     def test_format_paginated_url(self):
         request = lambda url: cast(Any, RequestFactory().get(url))
 
@@ -1,12 +1,16 @@
+import codecs
+import itertools
 import json
 import re
 from enum import Enum, auto
-from typing import List, Literal, Optional, Union
+from typing import Any, Iterator, List, Literal, Optional, Tuple, Union
 from uuid import UUID
 
 import structlog
+from django.conf import settings
 from django.core.exceptions import RequestDataTooBig
 from django.db.models import QuerySet
+from django.http import HttpResponse
 from rest_framework import request, status
 from rest_framework.exceptions import ValidationError
 from statshog.defaults.django import statsd
@@ -17,7 +21,16 @@ from posthog.models import Entity, EventDefinition
 from posthog.models.entity import MathType
 from posthog.models.filters.filter import Filter
 from posthog.models.filters.stickiness_filter import StickinessFilter
-from posthog.utils import cors_response, load_data_from_request
+from posthog.utils import (
+    GZIP_MAGIC_BYTES,
+    StreamingJSONReader,
+    cors_response,
+    decompress,
+    iter_gunzip,
+    iter_request_body,
+    load_data_from_request,
+    set_request_scope,
+)
 
 logger = structlog.get_logger(__name__)
 
@@ -158,40 +171,118 @@ def get_project_id(data, request) -> Optional[int]:
     return None
 
 
+def get_invalid_payload_response(request, error: Exception) -> HttpResponse:
+    statsd.incr("capture_endpoint_invalid_payload")
+    logger.exception(f"Invalid payload", error=error)
+    return cors_response(
+        request,
+        generate_exception_response(
+            "capture",
+            f"Malformed request data: {error}",
+            code="invalid_payload",
+        ),
+    )
+
+
+def get_request_too_large_response(request) -> HttpResponse:
+    return cors_response(
+        request,
+        generate_exception_response(
+            endpoint="capture",
+            detail="Request too large.",
+            type="client_error",
+            code="request_too_large",
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        ),
+    )
+
+
 def get_data(request):
     data = None
     try:
         data = load_data_from_request(request)
     except RequestParsingError as error:
-        statsd.incr("capture_endpoint_invalid_payload")
-        logger.exception(f"Invalid payload", error=error)
-        return (
-            None,
-            cors_response(
-                request,
-                generate_exception_response(
-                    "capture",
-                    f"Malformed request data: {error}",
-                    code="invalid_payload",
-                ),
-            ),
-        )
+        return None, get_invalid_payload_response(request, error)
 
     except RequestDataTooBig:
-        return (
-            None,
-            cors_response(
-                request,
-                generate_exception_response(
-                    endpoint="capture",
-                    detail="Request too large.",
-                    type="client_error",
-                    code="request_too_large",
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                ),
-            ),
-        )
+        return None, get_request_too_large_response(request)
+
+    return _check_data_found(request, data)
+
+
+def get_streamed_data(request) -> Tuple[Any, Optional[Iterator[Any]], Optional[HttpResponse]]:
+    """
+    Streaming counterpart of `get_data`, returning `(data, events, error_response)`.
+
+    The body is read, decompressed and decoded incrementally, so the compressed and
+    decompressed copies of it are never held in memory in full. For a top-level list
+    of events, `data` only holds the first event (enough to authenticate the request)
+    and `events` lazily decodes all of them, raising `RequestParsingError` or
+    `RequestDataTooBig` as it goes. Objects are decoded key by key and returned as
+    `data`, with `events` set to None. Payloads that can't be streamed (GET or form
+    requests, lz64, base64) fall back to `get_data`.
+    """
+    compression = (
+        request.GET.get("compression") or request.POST.get("compression") or request.headers.get("content-encoding", "")
+    ).lower()
+    if (
+        request.method != "POST"
+        or request.content_type not in ["", "text/plain", "application/json"]
+        or compression not in ["", "gzip", "gzip-js"]
+    ):
+        data, error_response = get_data(request)
+        return data, None, error_response
+
+    set_request_scope(request)
+    try:
+        chunks = iter_request_body(request, settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+        first_chunk = next(chunks, b"")
+        if first_chunk.startswith(GZIP_MAGIC_BYTES):
+            compression = "gzip"
+        elif compression == "" and first_chunk.lstrip()[:1] not in (b"[", b"{"):
+            # Legacy payloads, e.g. base64 encoded JSON, are decoded in one go
+            data = decompress(first_chunk + b"".join(chunks), compression)
+            set_request_scope(request, data)
+            data, error_response = _check_data_found(request, data)
+            return data, None, error_response
+
+        body: Iterator[bytes] = itertools.chain([first_chunk], chunks)
+        if compression in ["gzip", "gzip-js"]:
+            if first_chunk == b"undefined":
+                raise RequestParsingError(
+                    "data being loaded from the request body for decompression is the literal string 'undefined'"
+                )
+            body = iter_gunzip(body, settings.CAPTURE_STREAMING_MAX_DECODED_BYTES)
+
+        reader = StreamingJSONReader(codecs.iterdecode(body, "utf-8", "surrogatepass"))
+        if reader.peek() == "[":
+            events = reader.iter_array()
+            first_event = next(events, None)
+            if first_event is not None:
+                return [first_event], _end_after(itertools.chain([first_event], events), reader), None
+            data = None
+        elif reader.peek() == "{":
+            data = reader.object(stream_keys=("batch",))
+            set_request_scope(request, data)
+        else:
+            data = reader.value()
+        reader.end()
+    except RequestParsingError as error:
+        return None, None, get_invalid_payload_response(request, error)
+    except RequestDataTooBig:
+        return None, None, get_request_too_large_response(request)
+
+    data, error_response = _check_data_found(request, data)
+    return data, None, error_response
+
+
+def _end_after(events: Iterator[Any], reader: StreamingJSONReader) -> Iterator[Any]:
+    yield from events
+    # Make sure nothing follows the list, as `json.loads` would
+    reader.end()
+
 
+def _check_data_found(request, data):
     if not data:
         return (
             None,
@@ -1,48 +1,139 @@
 import threading
+import time
+from collections import OrderedDict
 from datetime import timedelta
-from functools import wraps
-from typing import no_type_check
+from functools import partial, wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, no_type_check
 
-from django.utils.timezone import now
+from prometheus_client import Counter
 
 from posthog.settings import TEST
 
+MEMOIZED_FUNCTION_CACHE_COUNTER = Counter(
+    "memoized_function_cache",
+    "Lookups in and evictions from in-process TTLCaches, e.g. those of functions decorated with cache_for.",
+    labelnames=["function", "result"],
+)
 
-def cache_for(cache_time: timedelta, background_refresh=False):
+DEFAULT_CACHE_MAX_SIZE = 1000
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache of at most `max_size` values, evicting the least recently used, where each
+    value is recomputed by `compute(key)` once older than `ttl` seconds. Callers whose values depend on more
+    than the key can instead pass their own `compute` to `get`.
+
+    Only one caller computes a missing or expired key at a time (the others wait for its result), and with
+    `background_refresh` expired values keep being returned while a single thread refreshes them.
+    """
+
+    def __init__(
+        self,
+        compute: Optional[Callable[[Hashable], Any]],
+        ttl: float,
+        max_size: int = DEFAULT_CACHE_MAX_SIZE,
+        background_refresh: bool = False,
+        name: str = "",
+    ):
+        self.compute = compute
+        self.ttl = ttl
+        self.max_size = max_size
+        self.background_refresh = background_refresh
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Keys being computed, with an event set once done, so that other callers can wait on it
+        self._in_flight: Dict[Hashable, threading.Event] = {}
+
+    def get(self, key: Hashable, compute: Optional[Callable[[], Any]] = None) -> Any:
+        compute = compute or partial(self.compute, key)  # type: ignore
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    computed_at, value = entry
+                    self._entries.move_to_end(key)
+                    if time.monotonic() - computed_at <= self.ttl:
+                        self._record("hit")
+                        return value
+                    if self.background_refresh:
+                        self._record("stale")
+                        if key not in self._in_flight:
+                            self._in_flight[key] = threading.Event()
+                            threading.Thread(target=self._refresh, args=(key, compute), daemon=True).start()
+                        return value
+
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    self._in_flight[key] = threading.Event()
+                    self._record("miss")
+                    break
+
+            # Someone else is computing this key, their result (or failure) is picked up on the next loop
+            in_flight.wait()
+
+        return self._refresh(key, compute)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _refresh(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        try:
+            value = compute()
+            with self._lock:
+                self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key).set()
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._record("eviction")
+
+    def _record(self, result: str) -> None:
+        MEMOIZED_FUNCTION_CACHE_COUNTER.labels(function=self.name, result=result).inc()
+
+
+def cache_for(cache_time: timedelta, background_refresh=False, max_size: int = DEFAULT_CACHE_MAX_SIZE):
     def wrapper(fn):
+        def compute(key):
+            args, kwargs = key
+            return fn(*args, **dict(kwargs))
+
+        cache = TTLCache(
+            compute,
+            ttl=cache_time.total_seconds(),
+            max_size=max_size,
+            background_refresh=background_refresh,
+            name=f"{fn.__module__}.{fn.__qualname__}",
+        )
+
         @wraps(fn)
         @no_type_check
         def memoized_fn(*args, use_cache=not TEST, **kwargs):
             if not use_cache:
                 return fn(*args, **kwargs)
 
-            current_time = now()
-            key = (args, frozenset(sorted(kwargs.items())))
-
-            def refresh():
-                try:
-                    value = fn(*args, **kwargs)
-                    memoized_fn._cache[key] = (now(), value)
-                    memoized_fn._refreshing[key] = None
-                except Exception:
-                    memoized_fn._refreshing[key] = None
-                    raise
-
-            if key not in memoized_fn._cache:
-                refresh()
-            elif current_time - memoized_fn._cache[key][0] > cache_time:
-                if background_refresh:
-                    if not memoized_fn._refreshing.get(key):
-                        memoized_fn._refreshing[key] = current_time
-                        t = threading.Thread(target=refresh)
-                        t.start()
-                else:
-                    refresh()
-
-            return memoized_fn._cache[key][1]
-
-        memoized_fn._cache = {}
-        memoized_fn._refreshing = {}
+            return cache.get((args, frozenset(sorted(kwargs.items()))))
+
+        memoized_fn._cache = cache
         return memoized_fn
 
     return wrapper
@@ -1,10 +1,16 @@
+import bisect
+import itertools
+import threading
+import time
 from contextlib import contextmanager
 from enum import Enum
 from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 from clickhouse_driver import Client as SyncClient
 from clickhouse_pool import ChPool
 from django.conf import settings
+from prometheus_client import Counter, Gauge, Histogram
 
 
 class Workload(Enum):
@@ -18,6 +24,43 @@ class Workload(Enum):
 
 _default_workload = Workload.ONLINE
 
+# Lower is served first when waiting for a connection
+_WORKLOAD_PRIORITIES = {Workload.ONLINE: 0, Workload.DEFAULT: 1, Workload.OFFLINE: 2}
+
+CONNECTION_POOL_IN_USE_GAUGE = Gauge(
+    "clickhouse_connection_pool_in_use", "ClickHouse connections handed out by the pool.", labelnames=["pool"]
+)
+CONNECTION_POOL_IDLE_GAUGE = Gauge(
+    "clickhouse_connection_pool_idle", "Open ClickHouse connections not currently in use.", labelnames=["pool"]
+)
+CONNECTION_POOL_WAITING_GAUGE = Gauge(
+    "clickhouse_connection_pool_waiting", "Queries queued waiting for a ClickHouse connection.", labelnames=["pool"]
+)
+CONNECTION_POOL_WAIT_HISTOGRAM = Histogram(
+    "clickhouse_connection_pool_wait_seconds",
+    "Time queries waited for a ClickHouse connection.",
+    labelnames=["workload"],
+)
+CONNECTION_POOL_REJECTED_COUNTER = Counter(
+    "clickhouse_connection_pool_rejected",
+    "Queries that didn't get a ClickHouse connection, by reason: queue_full or timeout.",
+    labelnames=["workload", "reason"],
+)
+
+
+class ClickHousePoolExhausted(Exception):
+    pass
+
+
+def _resolve_workload(workload: Workload) -> Workload:
+    return _default_workload if workload == Workload.DEFAULT else workload
+
+
+def _get_pool_host(workload: Workload) -> Optional[str]:
+    if _resolve_workload(workload) == Workload.OFFLINE and settings.CLICKHOUSE_OFFLINE_CLUSTER_HOST is not None:
+        return settings.CLICKHOUSE_OFFLINE_CLUSTER_HOST
+    return None
+
 
 def get_pool(workload: Workload):
     """
@@ -25,14 +68,115 @@ def get_pool(workload: Workload):
 
     Note that the same pool should be returned every call.
     """
-    if (
-        workload == Workload.OFFLINE or workload == Workload.DEFAULT and _default_workload == Workload.OFFLINE
-    ) and settings.CLICKHOUSE_OFFLINE_CLUSTER_HOST is not None:
-        return make_ch_pool(host=settings.CLICKHOUSE_OFFLINE_CLUSTER_HOST)
+    host = _get_pool_host(workload)
+    if host is not None:
+        return make_ch_pool(host=host)
 
     return make_ch_pool()
 
 
+class ConnectionLimiter:
+    """
+    Hands out the connections of a pool to queries, so that queries queue up rather than fail when the pool is
+    exhausted, and so that the queue is fair.
+
+    Queries are served in priority order (ONLINE, then DEFAULT, then OFFLINE), skipping over queries that can't
+    run yet because their team is at its concurrency limit, or because OFFLINE queries are at theirs. At most
+    `max_waiting` queries can wait at once, each for at most `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        team_limit: int,
+        offline_limit: int,
+        max_waiting: int,
+        timeout: float,
+        pool: Optional[ChPool] = None,
+    ):
+        self.capacity = capacity
+        self.team_limit = team_limit
+        self.offline_limit = offline_limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._offline_in_use = 0
+        self._team_in_use: Dict[Optional[int], int] = {}
+        # Sorted by (priority, arrival), as (priority, arrival, workload, team_id)
+        self._waiters: List[Tuple[int, int, Workload, Optional[int]]] = []
+        self._arrivals = itertools.count()
+
+        CONNECTION_POOL_IN_USE_GAUGE.labels(pool=name).set_function(lambda: self._in_use)
+        CONNECTION_POOL_WAITING_GAUGE.labels(pool=name).set_function(lambda: len(self._waiters))
+        if pool is not None:
+            # ChPool keeps its idle connections in `_pool`
+            CONNECTION_POOL_IDLE_GAUGE.labels(pool=name).set_function(lambda: len(getattr(pool, "_pool", ())))
+
+    @contextmanager
+    def acquire(self, workload: Workload, team_id: Optional[int] = None):
+        workload = _resolve_workload(workload)
+        start_time = time.monotonic()
+        deadline = start_time + self.timeout
+
+        with self._condition:
+            if len(self._waiters) >= self.max_waiting:
+                CONNECTION_POOL_REJECTED_COUNTER.labels(workload=workload.value, reason="queue_full").inc()
+                raise ClickHousePoolExhausted("Too many queries waiting for a ClickHouse connection")
+
+            waiter = (_WORKLOAD_PRIORITIES[workload], next(self._arrivals), workload, team_id)
+            bisect.insort(self._waiters, waiter)
+            try:
+                while self._next_runnable_waiter() != waiter:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        CONNECTION_POOL_REJECTED_COUNTER.labels(workload=workload.value, reason="timeout").inc()
+                        raise ClickHousePoolExhausted("Timed out waiting for a ClickHouse connection")
+                    self._condition.wait(remaining)
+            finally:
+                self._waiters.remove(waiter)
+                # Whoever is next in line might have been waiting behind this query
+                self._condition.notify_all()
+
+            self._in_use += 1
+            self._team_in_use[team_id] = self._team_in_use.get(team_id, 0) + 1
+            if workload == Workload.OFFLINE:
+                self._offline_in_use += 1
+
+        CONNECTION_POOL_WAIT_HISTOGRAM.labels(workload=workload.value).observe(time.monotonic() - start_time)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= 1
+                self._team_in_use[team_id] -= 1
+                if not self._team_in_use[team_id]:
+                    del self._team_in_use[team_id]
+                if workload == Workload.OFFLINE:
+                    self._offline_in_use -= 1
+                self._condition.notify_all()
+
+    def _next_runnable_waiter(self) -> Optional[Tuple[int, int, Workload, Optional[int]]]:
+        if self._in_use >= self.capacity:
+            return None
+        for waiter in self._waiters:
+            _, _, workload, team_id = waiter
+            if team_id is not None and self._team_in_use.get(team_id, 0) >= self.team_limit:
+                continue
+            if workload == Workload.OFFLINE and self._offline_in_use >= self.offline_limit:
+                continue
+            return waiter
+        return None
+
+
+def get_connection_limiter(workload: Workload) -> ConnectionLimiter:
+    """Returns the limiter of the pool `get_pool` returns for the workload"""
+    host = _get_pool_host(workload)
+    return make_connection_limiter(host=host) if host is not None else make_connection_limiter()
+
+
 def default_client():
     """
     Return a bare bones client for use in places where we are only interested in general ClickHouse state
@@ -76,6 +220,19 @@ def make_ch_pool(**overrides) -> ChPool:
     return ChPool(**kwargs)
 
 
+@lru_cache(maxsize=None)
+def make_connection_limiter(**overrides) -> ConnectionLimiter:
+    return ConnectionLimiter(
+        name=overrides.get("host", settings.CLICKHOUSE_HOST),
+        capacity=settings.CLICKHOUSE_CONN_POOL_MAX,
+        team_limit=settings.CLICKHOUSE_CONN_POOL_TEAM_LIMIT,
+        offline_limit=settings.CLICKHOUSE_CONN_POOL_OFFLINE_LIMIT,
+        max_waiting=settings.CLICKHOUSE_CONN_POOL_MAX_WAITING,
+        timeout=settings.CLICKHOUSE_CONN_POOL_WAIT_TIMEOUT,
+        pool=make_ch_pool(**overrides),
+    )
+
+
 @contextmanager
 def set_default_clickhouse_workload_type(workload: Workload):
     global _default_workload
@@ -4,14 +4,14 @@ import types
 from contextlib import contextmanager
 from functools import lru_cache
 from time import perf_counter
-from typing import Any, Dict, List, Optional, Sequence, Union
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import sqlparse
 from clickhouse_driver import Client as SyncClient
 from django.conf import settings as app_settings
 from statshog.defaults.django import statsd
 
-from posthog.clickhouse.client.connection import Workload, get_pool
+from posthog.clickhouse.client.connection import Workload, get_connection_limiter, get_pool
 from posthog.clickhouse.client.escape import substitute_params
 from posthog.clickhouse.query_tagging import get_query_tag_value, get_query_tags
 from posthog.errors import wrap_query_error
@@ -88,39 +88,82 @@ def sync_execute(
         except ModuleNotFoundError:  # when we run plugin server tests it tries to run above, ignore
             pass
 
-    with get_pool(workload).get_client() as client:
-        start_time = perf_counter()
+    # Wait for a connection if the pool is busy, ONLINE queries first and with a cap per team
+    with get_connection_limiter(workload).acquire(workload, team_id=get_query_tag_value("team_id")):
+        with get_pool(workload).get_client() as client:
+            start_time = perf_counter()
+
+            prepared_sql, prepared_args, tags = _prepare_query(client=client, query=query, args=args, workload=workload)
+
+            query_id = validated_client_query_id()
+            core_settings = {**default_settings(), **(settings or {})}
+            tags["query_settings"] = core_settings
+            settings = {**core_settings, "log_comment": json.dumps(tags, separators=(",", ":"))}
+            try:
+                result = client.execute(
+                    prepared_sql,
+                    params=prepared_args,
+                    settings=settings,
+                    with_column_types=with_column_types,
+                    query_id=query_id,
+                )
+            except Exception as err:
+                err = wrap_query_error(err)
+                statsd.incr("clickhouse_sync_execution_failure", tags={"failed": True, "reason": type(err).__name__})
+
+                raise err
+            finally:
+                execution_time = perf_counter() - start_time
+
+                statsd.timing("clickhouse_sync_execution_time", execution_time * 1000.0)
+
+                if query_counter := getattr(thread_local_storage, "query_counter", None):
+                    query_counter.total_query_time += execution_time
+
+                if app_settings.SHELL_PLUS_PRINT_SQL:
+                    print("Execution time: %.6fs" % (execution_time,))  # noqa T201
+    return result
 
-        prepared_sql, prepared_args, tags = _prepare_query(client=client, query=query, args=args, workload=workload)
 
-        query_id = validated_client_query_id()
-        core_settings = {**default_settings(), **(settings or {})}
-        tags["query_settings"] = core_settings
-        settings = {**core_settings, "log_comment": json.dumps(tags, separators=(",", ":"))}
+def sync_execute_iter(
+    query,
+    args: Optional[NonInsertParams] = None,
+    settings=None,
+    *,
+    workload: Workload = Workload.DEFAULT,
+) -> Iterator[Tuple]:
+    """
+    Like `sync_execute`, but yields the rows of a SELECT as ClickHouse sends them, one block at a time, rather than
+    loading the whole result into memory. The connection is held until the generator is exhausted or closed.
+    """
+    if TEST:
         try:
-            result = client.execute(
-                prepared_sql,
-                params=prepared_args,
-                settings=settings,
-                with_column_types=with_column_types,
-                query_id=query_id,
-            )
-        except Exception as err:
-            err = wrap_query_error(err)
-            statsd.incr("clickhouse_sync_execution_failure", tags={"failed": True, "reason": type(err).__name__})
-
-            raise err
-        finally:
-            execution_time = perf_counter() - start_time
-
-            statsd.timing("clickhouse_sync_execution_time", execution_time * 1000.0)
+            from posthog.test.base import flush_persons_and_events
 
-            if query_counter := getattr(thread_local_storage, "query_counter", None):
-                query_counter.total_query_time += execution_time
+            flush_persons_and_events()
+        except ModuleNotFoundError:
+            pass
 
-            if app_settings.SHELL_PLUS_PRINT_SQL:
-                print("Execution time: %.6fs" % (execution_time,))  # noqa T201
-    return result
+    with get_connection_limiter(workload).acquire(workload, team_id=get_query_tag_value("team_id")):
+        with get_pool(workload).get_client() as client:
+            start_time = perf_counter()
+
+            prepared_sql, prepared_args, tags = _prepare_query(client=client, query=query, args=args, workload=workload)
+
+            core_settings = {**default_settings(), **(settings or {})}
+            tags["query_settings"] = core_settings
+            settings = {**core_settings, "log_comment": json.dumps(tags, separators=(",", ":"))}
+            try:
+                yield from client.execute_iter(
+                    prepared_sql, params=prepared_args, settings=settings, query_id=validated_client_query_id()
+                )
+            except Exception as err:
+                err = wrap_query_error(err)
+                statsd.incr("clickhouse_sync_execution_failure", tags={"failed": True, "reason": type(err).__name__})
+
+                raise err
+            finally:
+                statsd.timing("clickhouse_sync_streamed_execution_time", (perf_counter() - start_time) * 1000.0)
 
 
 def query_with_columns(
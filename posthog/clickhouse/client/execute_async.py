@@ -4,7 +4,7 @@ import time
 from dataclasses import asdict as dataclass_asdict
 from dataclasses import dataclass
 from time import perf_counter
-from typing import Any, Optional
+from typing import Any, List, Optional
 
 from celery.task.control import revoke
 from clickhouse_driver import Client as SyncClient
@@ -26,6 +26,9 @@ from posthog.settings import (
 )
 
 REDIS_STATUS_TTL = 600  # 10 minutes
+# Results are stored in blocks of this many rows under their own keys, so that they can be written as they arrive
+# and read a page at a time, rather than as one huge value alongside the status
+RESULT_BLOCK_ROWS = 1000
 
 
 @dataclass
@@ -40,6 +43,9 @@ class QueryStatus:
     start_time: Optional[float] = None
     end_time: Optional[float] = None
     task_id: Optional[str] = None
+    # Number of result blocks written so far, see `get_status_or_results` for reading them
+    result_blocks: int = 0
+    columns: Optional[List] = None
 
 
 def generate_redis_results_key(query_id):
@@ -48,14 +54,46 @@ def generate_redis_results_key(query_id):
     return key
 
 
+def generate_redis_result_block_key(query_id, block_index: int):
+    return f"{generate_redis_results_key(query_id)}:results:{block_index}"
+
+
+class _ResultBlockWriter:
+    """Writes result rows to redis in blocks of RESULT_BLOCK_ROWS, each one along with the status pointing to it"""
+
+    def __init__(self, redis_client, query_id):
+        self.redis_client = redis_client
+        self.query_id = query_id
+        self.rows_written = 0
+        self.blocks_written = 0
+
+    def write(self, query_status: QueryStatus, rows: List, final: bool = False) -> None:
+        pipeline = self.redis_client.pipeline(transaction=True)
+        while len(rows) - self.rows_written >= RESULT_BLOCK_ROWS or (final and self.rows_written < len(rows)):
+            block = rows[self.rows_written : self.rows_written + RESULT_BLOCK_ROWS]
+            pipeline.set(
+                generate_redis_result_block_key(self.query_id, self.blocks_written),
+                json.dumps(block),
+                ex=REDIS_STATUS_TTL,
+            )
+            self.rows_written += len(block)
+            self.blocks_written += 1
+        query_status.result_blocks = self.blocks_written
+        # The status goes last, so that readers never see it point to blocks that aren't there yet
+        pipeline.set(
+            generate_redis_results_key(self.query_id), json.dumps(dataclass_asdict(query_status)), ex=REDIS_STATUS_TTL
+        )
+        pipeline.execute()
+
+
 def execute_with_progress(
     team_id, query_id, query, args=None, settings=None, with_column_types=False, update_freq=0.2, task_id=None
 ):
     """
     Kick off query with progress reporting
     Iterate over the progress status
-    Save status to redis
-    Once complete save results to redis
+    Save status to redis whenever it changes, along with the blocks of results received so far
+    Once complete save the remaining results to redis
     """
 
     key = generate_redis_results_key(query_id)
@@ -70,6 +108,7 @@ def execute_with_progress(
         settings={"max_result_rows": "10000"},
     )
     redis_client = redis.get_client()
+    result_writer = _ResultBlockWriter(redis_client, query_id)
 
     start_time = perf_counter()
 
@@ -79,26 +118,33 @@ def execute_with_progress(
 
     start_time = time.time()
 
+    written_progress = None
     try:
         progress = ch_client.execute_with_progress(
             prepared_sql, params=prepared_args, settings=settings, with_column_types=with_column_types
         )
         for num_rows, total_rows in progress:
-            query_status = QueryStatus(
-                team_id=team_id,
-                num_rows=num_rows,
-                total_rows=total_rows,
-                complete=False,
-                error=False,
-                error_message="",
-                results=None,
-                start_time=start_time,
-                task_id=task_id,
-            )
-            redis_client.set(key, json.dumps(dataclass_asdict(query_status)), ex=REDIS_STATUS_TTL)
+            # Rows of the data blocks received so far, these are only available when not selecting columnar data
+            received_rows = progress.data if isinstance(getattr(progress, "data", None), list) else []
+            has_new_block = len(received_rows) - result_writer.rows_written >= RESULT_BLOCK_ROWS
+            if (num_rows, total_rows) != written_progress or has_new_block:
+                written_progress = (num_rows, total_rows)
+                query_status = QueryStatus(
+                    team_id=team_id,
+                    num_rows=num_rows,
+                    total_rows=total_rows,
+                    complete=False,
+                    error=False,
+                    error_message="",
+                    results=None,
+                    start_time=start_time,
+                    task_id=task_id,
+                )
+                result_writer.write(query_status, received_rows)
             time.sleep(update_freq)
         else:
             rv = progress.get_result()
+            rows, columns = rv if with_column_types else (rv, None)
             query_status = QueryStatus(
                 team_id=team_id,
                 num_rows=query_status.num_rows,
@@ -108,10 +154,11 @@ def execute_with_progress(
                 start_time=query_status.start_time,
                 end_time=time.time(),
                 error_message="",
-                results=rv,
+                results=None,
                 task_id=task_id,
+                columns=columns,
             )
-            redis_client.set(key, json.dumps(dataclass_asdict(query_status)), ex=REDIS_STATUS_TTL)
+            result_writer.write(query_status, rows, final=True)
 
     except Exception as err:
         err = wrap_query_error(err)
@@ -164,7 +211,10 @@ def enqueue_execute_with_progress(
             revoke(query_task.task_id, terminate=True)
             # Then we need to make redis forget about this job entirely
             # and continue as normal. As if we never saw this query before
-            redis_client.delete(key)
+            redis_client.delete(
+                key,
+                *(generate_redis_result_block_key(query_id, index) for index in range(query_task.result_blocks)),
+            )
 
     if redis_client.get(key):
         # If we've seen this query before return the query_id and don't resubmit it.
@@ -183,13 +233,16 @@ def enqueue_execute_with_progress(
     return query_id
 
 
-def get_status_or_results(team_id, query_id):
+def get_status_or_results(team_id, query_id, block_offset: int = 0, block_limit: Optional[int] = None):
     """
     Returns QueryStatus data class
     QueryStatus data class contains either:
-    Current status of running query
+    Current status of running query, with the results received so far
     Results of completed query
     Error payload of failed query
+
+    Results are read from `block_limit` blocks of RESULT_BLOCK_ROWS rows starting at `block_offset`, all of them by
+    default. Page through them until `block_offset` reaches `result_blocks`, and the query is complete.
     """
     redis_client = redis.get_client()
     key = generate_redis_results_key(query_id)
@@ -202,11 +255,29 @@ def get_status_or_results(team_id, query_id):
         query_status = QueryStatus(**json.loads(str_results))
         if query_status.team_id != team_id:
             raise Exception("Requesting team is not executing team")
+        if query_status.result_blocks or query_status.complete:
+            query_status.results = _read_result_blocks(redis_client, query_id, query_status, block_offset, block_limit)
     except Exception as e:
         query_status = QueryStatus(team_id, error=True, error_message=str(e))
     return query_status
 
 
+def _read_result_blocks(
+    redis_client, query_id, query_status: QueryStatus, block_offset: int, block_limit: Optional[int]
+) -> List:
+    block_end = query_status.result_blocks if block_limit is None else block_offset + block_limit
+    block_indexes = range(block_offset, min(block_end, query_status.result_blocks))
+    if not block_indexes:
+        return []
+
+    results: List = []
+    for block in redis_client.mget([generate_redis_result_block_key(query_id, index) for index in block_indexes]):
+        if block is None:
+            raise Exception("Query results have expired")
+        results.extend(json.loads(block))
+    return results
+
+
 def _query_hash(query: str, team_id: int, args: Any) -> str:
     """
     Takes a query and returns a hex encoded hash of the query and args
@@ -1,6 +1,18 @@
+import threading
+import time
+
 import pytest
 
-from posthog.clickhouse.client.connection import Workload, get_pool, make_ch_pool, set_default_clickhouse_workload_type
+from posthog.clickhouse.client.connection import (
+    ClickHousePoolExhausted,
+    ConnectionLimiter,
+    Workload,
+    get_connection_limiter,
+    get_pool,
+    make_ch_pool,
+    make_connection_limiter,
+    set_default_clickhouse_workload_type,
+)
 
 
 def test_connection_pool_creation_without_offline_cluster(settings):
@@ -27,11 +39,122 @@ def test_connection_pool_creation_with_offline_cluster(settings):
     assert get_pool(Workload.DEFAULT) is offline_pool
 
 
+def test_connection_limiter_follows_pool_selection(settings):
+    settings.CLICKHOUSE_OFFLINE_CLUSTER_HOST = "ch-offline.example.com"
+
+    online_limiter = get_connection_limiter(Workload.ONLINE)
+    assert get_connection_limiter(Workload.DEFAULT) is online_limiter
+    assert get_connection_limiter(Workload.OFFLINE) is not online_limiter
+    assert get_connection_limiter(Workload.OFFLINE) is get_connection_limiter(Workload.OFFLINE)
+
+
+def _limiter(**kwargs) -> ConnectionLimiter:
+    return ConnectionLimiter(
+        **{
+            "name": "test",
+            "capacity": 1,
+            "team_limit": 10,
+            "offline_limit": 10,
+            "max_waiting": 10,
+            "timeout": 5,
+            **kwargs,
+        }
+    )
+
+
+def _acquire_in_thread(limiter: ConnectionLimiter, workload: Workload, team_id, order: list, hold: float = 0.0):
+    def run():
+        with limiter.acquire(workload, team_id=team_id):
+            order.append((workload, team_id))
+            time.sleep(hold)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    # Let the thread join the queue before the next one
+    time.sleep(0.05)
+    return thread
+
+
+def test_connection_limiter_serves_online_queries_first():
+    limiter = _limiter()
+    order: list = []
+
+    with limiter.acquire(Workload.ONLINE, team_id=1):
+        threads = [
+            _acquire_in_thread(limiter, Workload.OFFLINE, 2, order),
+            _acquire_in_thread(limiter, Workload.ONLINE, 3, order),
+        ]
+    for thread in threads:
+        thread.join()
+
+    assert order == [(Workload.ONLINE, 3), (Workload.OFFLINE, 2)]
+
+
+def test_connection_limiter_skips_teams_at_their_limit():
+    limiter = _limiter(capacity=2, team_limit=1)
+    order: list = []
+
+    with limiter.acquire(Workload.ONLINE, team_id=1):
+        threads = [
+            _acquire_in_thread(limiter, Workload.ONLINE, 1, order),
+            _acquire_in_thread(limiter, Workload.OFFLINE, 2, order),
+        ]
+        # Team 2 gets the free connection even though team 1 asked first
+        threads[1].join()
+        assert order == [(Workload.OFFLINE, 2)]
+    threads[0].join()
+
+    assert order == [(Workload.OFFLINE, 2), (Workload.ONLINE, 1)]
+
+
+def test_connection_limiter_caps_offline_queries():
+    limiter = _limiter(capacity=2, offline_limit=1)
+    order: list = []
+
+    with limiter.acquire(Workload.OFFLINE, team_id=1):
+        threads = [
+            _acquire_in_thread(limiter, Workload.OFFLINE, 2, order),
+            _acquire_in_thread(limiter, Workload.ONLINE, 3, order),
+        ]
+        threads[1].join()
+        assert order == [(Workload.ONLINE, 3)]
+    threads[0].join()
+
+
+def test_connection_limiter_rejects_when_the_queue_is_full():
+    limiter = _limiter(max_waiting=1)
+    order: list = []
+
+    with limiter.acquire(Workload.ONLINE, team_id=1):
+        thread = _acquire_in_thread(limiter, Workload.ONLINE, 2, order)
+        with pytest.raises(ClickHousePoolExhausted):
+            with limiter.acquire(Workload.ONLINE, team_id=3):
+                pass
+    thread.join()
+
+    assert order == [(Workload.ONLINE, 2)]
+
+
+def test_connection_limiter_times_out():
+    limiter = _limiter(timeout=0.05)
+
+    with limiter.acquire(Workload.ONLINE, team_id=1):
+        with pytest.raises(ClickHousePoolExhausted):
+            with limiter.acquire(Workload.ONLINE, team_id=2):
+                pass
+
+    # Nothing was left behind by the failed attempt
+    with limiter.acquire(Workload.ONLINE, team_id=2):
+        pass
+
+
 @pytest.fixture(autouse=True)
 def reset_state():
     make_ch_pool.cache_clear()
+    make_connection_limiter.cache_clear()
 
     yield
 
     make_ch_pool.cache_clear()
+    make_connection_limiter.cache_clear()
     set_default_clickhouse_workload_type(Workload.ONLINE)
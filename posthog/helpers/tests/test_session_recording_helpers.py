@@ -1,3 +1,5 @@
+import base64
+import json
 from datetime import datetime, timedelta, timezone
 from typing import cast
 
@@ -5,6 +7,9 @@ import pytest
 from pytest_mock import MockerFixture
 
 from posthog.session_recordings.session_recording_helpers import (
+    GZIP_BASE64,
+    SNAPSHOT_CODECS,
+    ZSTD_BASE64,
     PaginatedList,
     RecordingSegment,
     SessionRecordingEventSummary,
@@ -17,7 +22,9 @@ from posthog.session_recordings.session_recording_helpers import (
     get_events_summary_from_snapshot_data,
     is_active_event,
     paginate_list,
+    paginate_list_by_size,
     preprocess_session_recording_events_for_clickhouse,
+    stream_chunked_snapshot_data,
 )
 
 MILLISECOND_TIMESTAMP = round(datetime(2019, 1, 1).timestamp() * 1000)
@@ -133,6 +140,33 @@ def test_decompression_results_in_same_data(raw_snapshot_events):
     ]
 
 
+@pytest.mark.parametrize("compression", [GZIP_BASE64, ZSTD_BASE64])
+def test_decompression_with_each_codec_results_in_same_data(raw_snapshot_events, compression):
+    chunks = list(compress_and_chunk_snapshots(raw_snapshot_events, 100, compression=compression))
+    assert len(chunks) > 1
+    assert all(chunk["properties"]["$snapshot_data"]["compression"] == compression for chunk in chunks)
+    assert all(len(chunk["properties"]["$snapshot_data"]["data"]) <= 100 for chunk in chunks)
+    assert compress_decompress_and_extract(raw_snapshot_events, 100, compression=compression) == [
+        raw_snapshot_events[0]["properties"]["$snapshot_data"],
+        raw_snapshot_events[1]["properties"]["$snapshot_data"],
+    ]
+
+
+def test_zstd_chunks_can_be_decoded_individually(raw_snapshot_events):
+    chunks = list(compress_and_chunk_snapshots(raw_snapshot_events, 10, compression=ZSTD_BASE64))
+    data = b"".join(base64.b64decode(chunk["properties"]["$snapshot_data"]["data"]) for chunk in chunks)
+    assert json.loads(SNAPSHOT_CODECS[ZSTD_BASE64].decompress(data)) == [
+        raw_snapshot_events[0]["properties"]["$snapshot_data"],
+        raw_snapshot_events[1]["properties"]["$snapshot_data"],
+    ]
+
+
+def test_compression_defaults_to_setting(raw_snapshot_events, settings):
+    settings.SESSION_RECORDING_SNAPSHOT_COMPRESSION = ZSTD_BASE64
+    chunks = list(compress_and_chunk_snapshots(raw_snapshot_events))
+    assert chunks[0]["properties"]["$snapshot_data"]["compression"] == ZSTD_BASE64
+
+
 def test_has_full_snapshot_property(raw_snapshot_events):
     compressed = list(compress_and_chunk_snapshots(raw_snapshot_events))
     assert len(compressed) == 1
@@ -236,6 +270,72 @@ def test_paginate_decompression(chunked_and_compressed_snapshot_events):
     assert len(paginated_events["snapshot_data_by_window_id"][None]) == 2
 
 
+@pytest.mark.parametrize("compression", [GZIP_BASE64, ZSTD_BASE64])
+def test_stream_decompression_results_in_same_data(raw_snapshot_events, compression):
+    snapshot_list = [
+        SnapshotDataTaggedWithWindowId(window_id="abc123", snapshot_data=event["properties"]["$snapshot_data"])
+        for event in compress_and_chunk_snapshots(raw_snapshot_events, 10, compression=compression)
+    ]
+
+    streamed = stream_chunked_snapshot_data(2, "someid", snapshot_list, max_bytes=1_000_000)
+
+    assert streamed["has_next"] is False
+    assert list(streamed["snapshot_data_by_window_id"]["abc123"]) == [
+        raw_snapshot_events[0]["properties"]["$snapshot_data"],
+        raw_snapshot_events[1]["properties"]["$snapshot_data"],
+    ]
+
+
+def test_stream_decompression_paginates_by_bytes(chunked_and_compressed_snapshot_events):
+    snapshot_data = [
+        SnapshotDataTaggedWithWindowId(
+            snapshot_data=event["properties"]["$snapshot_data"], window_id=event["properties"].get("$window_id")
+        )
+        for event in chunked_and_compressed_snapshot_events
+    ]
+
+    # A page holds at least one chunk group, even if it goes over the budget
+    streamed = stream_chunked_snapshot_data(1, "someid", snapshot_data, max_bytes=1)
+    assert streamed["has_next"] is True
+    assert streamed["next_offset"] == 1
+    assert [event["type"] for event in streamed["snapshot_data_by_window_id"][None]] == [4, 2]
+
+    streamed = stream_chunked_snapshot_data(1, "someid", snapshot_data, max_bytes=1, offset=1)
+    assert streamed["has_next"] is False
+    assert [event["type"] for event in streamed["snapshot_data_by_window_id"]["1"]] == [3, 3]
+
+    streamed = stream_chunked_snapshot_data(1, "someid", snapshot_data, max_bytes=1_000_000)
+    assert streamed["has_next"] is False
+    assert streamed["next_offset"] == 2
+    assert set(streamed["snapshot_data_by_window_id"].keys()) == {None, "1"}
+
+
+def test_stream_decompression_skips_chunk_groups_that_fail_to_decode(chunked_and_compressed_snapshot_events):
+    snapshot_data = [
+        SnapshotDataTaggedWithWindowId(
+            snapshot_data=event["properties"]["$snapshot_data"], window_id=event["properties"].get("$window_id")
+        )
+        for event in chunked_and_compressed_snapshot_events
+    ]
+    # Corrupt the compressed data of the first chunk group only
+    corrupted_chunk = snapshot_data[0]["snapshot_data"]
+    snapshot_data[0] = SnapshotDataTaggedWithWindowId(
+        window_id=snapshot_data[0]["window_id"],
+        snapshot_data={**corrupted_chunk, "data": base64.b64encode(b"not gzipped").decode("utf-8")},
+    )
+
+    streamed = stream_chunked_snapshot_data(1, "someid", snapshot_data, max_bytes=1_000_000)
+
+    assert list(streamed["snapshot_data_by_window_id"][None]) == []
+    assert [event["type"] for event in streamed["snapshot_data_by_window_id"]["1"]] == [3, 3]
+
+
+def test_paginate_list_by_size():
+    assert paginate_list_by_size([3, 3, 3], 6, 0, lambda x: x) == PaginatedList(has_next=True, paginated_list=[3, 3])
+    assert paginate_list_by_size([3, 3, 3], 6, 2, lambda x: x) == PaginatedList(has_next=False, paginated_list=[3])
+    assert paginate_list_by_size([10, 1], 6, 0, lambda x: x) == PaginatedList(has_next=True, paginated_list=[10])
+
+
 def test_decompress_empty_list(chunked_and_compressed_snapshot_events):
     paginated_events = decompress_chunked_snapshot_data(1, "someid", [])
     assert paginated_events["has_next"] is False
@@ -575,9 +675,10 @@ def chunked_and_compressed_snapshot_events():
     return list(compress_and_chunk_snapshots(chunk_1_events)) + list(compress_and_chunk_snapshots(chunk_2_events))
 
 
-def compress_decompress_and_extract(events, chunk_size):
+def compress_decompress_and_extract(events, chunk_size, compression=None):
     snapshot_data_list = [
-        event["properties"]["$snapshot_data"] for event in compress_and_chunk_snapshots(events, chunk_size)
+        event["properties"]["$snapshot_data"]
+        for event in compress_and_chunk_snapshots(events, chunk_size, compression=compression)
     ]
     window_id = "abc123"
     snapshot_list = []
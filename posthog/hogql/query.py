@@ -1,7 +1,13 @@
-from typing import Dict, List, Optional, Union, cast
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Union, cast
 
+from django.conf import settings as app_settings
 from pydantic import BaseModel, Extra
 
+from posthog.cache_utils import TTLCache
 from posthog.clickhouse.client.connection import Workload
 from posthog.hogql import ast
 from posthog.hogql.constants import DEFAULT_RETURNED_ROWS, HogQLSettings
@@ -23,9 +29,34 @@ class HogQLQueryResponse(BaseModel):
     hogql: Optional[str] = None
     query: Optional[str] = None
     results: Optional[List] = None
+    timings: Optional[Dict[str, float]] = None
     types: Optional[List] = None
 
 
+@dataclass
+class CompiledHogQLQuery:
+    hogql: str
+    clickhouse: str
+    # Values of the placeholders in the ClickHouse SQL, copy before mutating
+    values: Dict
+    columns: List
+
+
+# Parsing a query only depends on its text, so parsed queries never expire. Cached ASTs are cloned before use,
+# as resolving them mutates them.
+_parsed_query_cache = TTLCache(
+    None, ttl=math.inf, max_size=app_settings.HOGQL_QUERY_CACHE_SIZE, name="hogql_parsed_query"
+)
+# Printing a query also depends on the team, and on property definitions that aren't part of the key,
+# hence the expiry.
+_compiled_query_cache = TTLCache(
+    None,
+    ttl=app_settings.HOGQL_COMPILED_QUERY_CACHE_TTL,
+    max_size=app_settings.HOGQL_QUERY_CACHE_SIZE,
+    name="hogql_compiled_query",
+)
+
+
 def execute_hogql_query(
     query: Union[str, ast.SelectQuery],
     team: Team,
@@ -34,59 +65,148 @@ def execute_hogql_query(
     workload: Workload = Workload.ONLINE,
     settings: Optional[HogQLSettings] = None,
 ) -> HogQLQueryResponse:
+    timings: Dict[str, float] = {}
+
     if isinstance(query, ast.SelectQuery):
-        select_query = query
+        select_query: Union[str, ast.SelectQuery] = query
         query = None
     else:
-        select_query = parse_select(str(query))
+        select_query = str(query)
+
+    if query is not None and not placeholders and app_settings.HOGQL_QUERY_CACHE_ENABLED:
+        cache_key = (
+            query,
+            team.pk,
+            team.person_on_events_mode,
+            _database_schema_version(team),
+            (settings or HogQLSettings()).json(),
+        )
+        compiled = _compiled_query_cache.get(
+            cache_key, lambda: compile_hogql_query(select_query, team, placeholders, settings, timings)
+        )
+    else:
+        compiled = compile_hogql_query(select_query, team, placeholders, settings, timings)
+
+    with _timed(timings, "execute"):
+        results, types = insight_sync_execute(
+            compiled.clickhouse,
+            dict(compiled.values),
+            with_column_types=True,
+            query_type=query_type,
+            workload=workload,
+        )
+
+    return HogQLQueryResponse(
+        query=query,
+        hogql=compiled.hogql,
+        clickhouse=compiled.clickhouse,
+        results=results,
+        columns=compiled.columns,
+        types=types,
+        timings=timings,
+    )
+
+
+def compile_hogql_query(
+    query: Union[str, ast.SelectQuery],
+    team: Team,
+    placeholders: Optional[Dict[str, ast.Expr]] = None,
+    settings: Optional[HogQLSettings] = None,
+    timings: Optional[Dict[str, float]] = None,
+    limit_top_select: bool = True,
+) -> CompiledHogQLQuery:
+    """
+    Parse, resolve and print a HogQL query, adding the time spent in each stage to `timings`.
+
+    With `limit_top_select=False` the query returns as many rows as its own LIMIT allows, for callers that stream
+    results rather than load them into memory.
+    """
+    timings = timings if timings is not None else {}
+
+    if isinstance(query, ast.SelectQuery):
+        select_query = query
+    else:
+        with _timed(timings, "parse"):
+            select_query = _parse_select(query)
 
     if placeholders:
         select_query = replace_placeholders(select_query, placeholders)
     else:
         assert_no_placeholders(select_query)
 
-    if select_query.limit is None:
+    if select_query.limit is None and limit_top_select:
         select_query.limit = ast.Constant(value=DEFAULT_RETURNED_ROWS)
 
     # Get printed HogQL query, and returned columns. Using a cloned query.
     hogql_query_context = HogQLContext(
-        team_id=team.pk, enable_select_queries=True, person_on_events_mode=team.person_on_events_mode
-    )
-    select_query_hogql = cast(
-        ast.SelectQuery,
-        prepare_ast_for_printing(node=clone_expr(select_query, True), context=hogql_query_context, dialect="hogql"),
+        team_id=team.pk,
+        enable_select_queries=True,
+        person_on_events_mode=team.person_on_events_mode,
+        limit_top_select=limit_top_select,
     )
-    hogql = print_prepared_ast(select_query_hogql, hogql_query_context, "hogql")
-    print_columns = []
-    for node in select_query_hogql.select:
-        if isinstance(node, ast.Alias):
-            print_columns.append(node.alias)
-        else:
-            print_columns.append(
-                print_ast(node=node, context=hogql_query_context, dialect="hogql", stack=[select_query_hogql])
-            )
+    with _timed(timings, "resolve"):
+        select_query_hogql = cast(
+            ast.SelectQuery,
+            prepare_ast_for_printing(node=clone_expr(select_query, True), context=hogql_query_context, dialect="hogql"),
+        )
+    with _timed(timings, "print"):
+        hogql = print_prepared_ast(select_query_hogql, hogql_query_context, "hogql")
+        print_columns = []
+        for node in select_query_hogql.select:
+            if isinstance(node, ast.Alias):
+                print_columns.append(node.alias)
+            else:
+                print_columns.append(
+                    print_ast(node=node, context=hogql_query_context, dialect="hogql", stack=[select_query_hogql])
+                )
 
     # Print the ClickHouse SQL query
     clickhouse_context = HogQLContext(
-        team_id=team.pk, enable_select_queries=True, person_on_events_mode=team.person_on_events_mode
-    )
-    clickhouse = print_ast(
-        select_query, context=clickhouse_context, dialect="clickhouse", settings=settings or HogQLSettings()
+        team_id=team.pk,
+        enable_select_queries=True,
+        person_on_events_mode=team.person_on_events_mode,
+        limit_top_select=limit_top_select,
     )
+    with _timed(timings, "resolve"):
+        select_query_clickhouse = prepare_ast_for_printing(
+            node=select_query, context=clickhouse_context, dialect="clickhouse"
+        )
+    with _timed(timings, "print"):
+        clickhouse = print_prepared_ast(
+            select_query_clickhouse,
+            context=clickhouse_context,
+            dialect="clickhouse",
+            settings=settings or HogQLSettings(),
+        )
 
-    results, types = insight_sync_execute(
-        clickhouse,
-        clickhouse_context.values,
-        with_column_types=True,
-        query_type=query_type,
-        workload=workload,
+    return CompiledHogQLQuery(
+        hogql=hogql, clickhouse=clickhouse, values=clickhouse_context.values, columns=print_columns
     )
 
-    return HogQLQueryResponse(
-        query=query,
-        hogql=hogql,
-        clickhouse=clickhouse,
-        results=results,
-        columns=print_columns,
-        types=types,
-    )
+
+def _parse_select(query: str) -> ast.SelectQuery:
+    if not app_settings.HOGQL_QUERY_CACHE_ENABLED:
+        return cast(ast.SelectQuery, parse_select(query))
+    return cast(ast.SelectQuery, clone_expr(_parsed_query_cache.get(query, lambda: parse_select(query))))
+
+
+def _database_schema_version(team: Team) -> Hashable:
+    """What the printed ClickHouse SQL of a team's queries depends on, besides the query itself"""
+    try:
+        from ee.clickhouse.materialized_columns.columns import get_materialized_columns
+
+        materialized_columns = tuple(
+            tuple(sorted(get_materialized_columns(table).items())) for table in ("events", "person")
+        )
+    except ModuleNotFoundError:
+        materialized_columns = ()
+    return team.timezone, materialized_columns
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
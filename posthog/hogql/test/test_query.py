@@ -1,3 +1,4 @@
+from unittest.mock import patch
 from uuid import UUID
 
 from django.test import override_settings
@@ -6,9 +7,10 @@ from freezegun import freeze_time
 
 from posthog import datetime
 from posthog.hogql import ast
+from posthog.hogql.parser import parse_select
 from posthog.hogql.property import property_to_expr
 from posthog.hogql.query import execute_hogql_query
-from posthog.models import Cohort
+from posthog.models import Cohort, Team
 from posthog.models.cohort.util import recalculate_cohortpeople
 from posthog.models.utils import UUIDT
 from posthog.session_recordings.test.test_factory import create_snapshot
@@ -668,3 +670,40 @@ class TestQuery(ClickhouseTestMixin, APIBaseTest):
                 response.clickhouse,
                 f"SELECT [1, 2, 3], [10, 11, 12][1] LIMIT 100 SETTINGS readonly=1, max_execution_time=60",
             )
+
+    def test_query_timings(self):
+        with override_settings(PERSON_ON_EVENTS_OVERRIDE=False, HOGQL_QUERY_CACHE_ENABLED=False):
+            response = execute_hogql_query("SELECT 1", team=self.team)
+            self.assertEqual(set((response.timings or {}).keys()), {"parse", "resolve", "print", "execute"})
+
+    @patch("posthog.hogql.query.parse_select", wraps=parse_select)
+    def test_compiled_query_cache(self, parse_select_mock):
+        query = f"SELECT event, properties.random_uuid FROM events WHERE event = '{UUIDT()}'"
+        with override_settings(PERSON_ON_EVENTS_OVERRIDE=False, HOGQL_QUERY_CACHE_ENABLED=True):
+            first_response = execute_hogql_query(query, team=self.team)
+            second_response = execute_hogql_query(query, team=self.team)
+
+            # the query is parsed, resolved and printed once, but runs every time
+            self.assertEqual(parse_select_mock.call_count, 1)
+            self.assertEqual(second_response.clickhouse, first_response.clickhouse)
+            self.assertEqual(second_response.hogql, first_response.hogql)
+            self.assertEqual(second_response.columns, first_response.columns)
+            self.assertEqual(set((second_response.timings or {}).keys()), {"execute"})
+
+            # a different team gets its own team_id guard, from the cached AST
+            other_team = Team.objects.create(organization=self.organization)
+            other_response = execute_hogql_query(query, team=other_team)
+            self.assertEqual(parse_select_mock.call_count, 1)
+            self.assertIn(f"equals(events.team_id, {other_team.pk})", other_response.clickhouse)
+            self.assertNotEqual(other_response.clickhouse, first_response.clickhouse)
+
+    @patch("posthog.hogql.query.parse_select", wraps=parse_select)
+    def test_compiled_query_cache_skipped_with_placeholders(self, parse_select_mock):
+        query = f"SELECT event FROM events WHERE event = {{event}} AND distinct_id = '{UUIDT()}'"
+        with override_settings(PERSON_ON_EVENTS_OVERRIDE=False, HOGQL_QUERY_CACHE_ENABLED=True):
+            for event in ("a", "b"):
+                response = execute_hogql_query(query, team=self.team, placeholders={"event": ast.Constant(value=event)})
+                self.assertEqual(response.hogql.count(f"'{event}'"), 1)
+
+            # the parsed AST is still cached
+            self.assertEqual(parse_select_mock.call_count, 1)
@@ -144,6 +144,22 @@ class _KafkaProducer:
         future.add_callback(self.on_send_success).add_errback(lambda exc: self.on_send_failure(topic=topic, exc=exc))
         return future
 
+    def produce_batch(self, messages: List[Tuple[str, bytes, Optional[str]]]) -> List[FutureRecordMetadata]:
+        """
+        Send a batch of already serialized messages, given as `(topic, value, key)` tuples.
+
+        Futures are returned in the same order as `messages` and are not waited on here,
+        so that callers can wait on all the acks together against a single deadline.
+        """
+        futures = []
+        for topic, value, key in messages:
+            future = self.producer.send(topic, value=value, key=key.encode("utf-8") if key is not None else None)
+            future.add_callback(self.on_send_success).add_errback(
+                lambda exc, topic=topic: self.on_send_failure(topic=topic, exc=exc)
+            )
+            futures.append(future)
+        return futures
+
     def close(self):
         self.producer.flush()
 
@@ -0,0 +1,138 @@
+# Adds the persons of large uploaded lists of distinct_ids to static cohorts.
+#
+# The list is handled in chunks. The distinct_ids of a chunk are streamed into a temporary table with COPY, and a
+# single statement resolves them to persons and adds those that aren't in the cohort yet to it in Postgres. Each
+# chunk's persons are then inserted into ClickHouse on a thread pool, while the next chunk goes through Postgres.
+#
+# Finished chunks are recorded in Redis, so that retrying an interrupted upload of the same list picks up where
+# it left off.
+
+import hashlib
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import List
+
+import structlog
+from django.db import connection, transaction
+
+from posthog.models.cohort.cohort import Cohort
+from posthog.redis import get_client
+
+logger = structlog.get_logger(__name__)
+
+# Lists at least this long are uploaded through here rather than `Cohort.insert_users_by_list`'s batches
+BULK_UPLOAD_THRESHOLD = 10_000
+BULK_UPLOAD_CHUNK_SIZE = 100_000
+BULK_UPLOAD_CLICKHOUSE_WORKERS = 4
+BULK_UPLOAD_PROGRESS_TTL = 24 * 60 * 60
+
+INSERT_COHORT_PEOPLE_FROM_STAGED_DISTINCT_IDS = """
+WITH matched_persons AS (
+    SELECT DISTINCT pdi.person_id
+    FROM static_cohort_upload AS upload
+    JOIN posthog_persondistinctid AS pdi ON pdi.team_id = %(team_id)s AND pdi.distinct_id = upload.distinct_id
+), inserted AS (
+    INSERT INTO posthog_cohortpeople (person_id, cohort_id, version)
+    SELECT person_id, %(cohort_id)s, %(version)s
+    FROM matched_persons
+    WHERE NOT EXISTS (
+        SELECT 1 FROM posthog_cohortpeople
+        WHERE cohort_id = %(cohort_id)s AND person_id = matched_persons.person_id
+    )
+    RETURNING person_id
+)
+SELECT posthog_person.uuid
+FROM matched_persons
+JOIN posthog_person ON posthog_person.id = matched_persons.person_id
+"""
+
+
+def insert_users_by_list_in_bulk(cohort: Cohort, items: List[str]) -> None:
+    """
+    Adds the persons with the given distinct_ids to the static cohort, raising if any chunk fails.
+
+    All persons of a chunk are inserted into ClickHouse, including those already in the cohort, so that a chunk
+    interrupted between its Postgres and ClickHouse writes is complete once retried. Readers of the ClickHouse
+    table already deduplicate persons.
+    """
+    from posthog.models.cohort.util import insert_static_cohort
+
+    progress_key = _bulk_upload_progress_key(cohort, items)
+    chunk_starts = range(0, len(items), BULK_UPLOAD_CHUNK_SIZE)
+    redis_client = get_client()
+    finished_chunks = {int(chunk) for chunk in redis_client.smembers(progress_key)}
+    progress_lock = threading.Lock()
+
+    if finished_chunks:
+        logger.info(
+            "static_cohort_bulk_upload_resumed",
+            cohort_id=cohort.pk,
+            chunks=len(chunk_starts),
+            finished_chunks=len(finished_chunks),
+        )
+
+    def on_chunk_inserted(chunk: int, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        with progress_lock:
+            finished_chunks.add(chunk)
+            pipeline = redis_client.pipeline()
+            pipeline.sadd(progress_key, chunk)
+            pipeline.expire(progress_key, BULK_UPLOAD_PROGRESS_TTL)
+            pipeline.execute()
+            logger.info(
+                "static_cohort_bulk_upload_progress",
+                cohort_id=cohort.pk,
+                chunks=len(chunk_starts),
+                finished_chunks=len(finished_chunks),
+            )
+
+    futures: List[Future] = []
+    with ThreadPoolExecutor(
+        max_workers=BULK_UPLOAD_CLICKHOUSE_WORKERS, thread_name_prefix="static-cohort-upload"
+    ) as executor:
+        for chunk, start in enumerate(chunk_starts):
+            if chunk in finished_chunks:
+                continue
+            person_uuids = _insert_chunk_into_postgres(cohort, items[start : start + BULK_UPLOAD_CHUNK_SIZE])
+            future = executor.submit(insert_static_cohort, person_uuids, cohort.pk, cohort.team)
+            future.add_done_callback(lambda future, chunk=chunk: on_chunk_inserted(chunk, future))
+            futures.append(future)
+
+        wait(futures)
+
+    for future in futures:
+        # Raises the first ClickHouse insert error, if any
+        future.result()
+    redis_client.delete(progress_key)
+
+
+def _insert_chunk_into_postgres(cohort: Cohort, distinct_ids: List[str]) -> List:
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("CREATE TEMPORARY TABLE static_cohort_upload (distinct_id text)")
+        cursor.copy_expert(
+            "COPY static_cohort_upload (distinct_id) FROM STDIN",
+            io.StringIO("".join(f"{_escape_copy_value(distinct_id)}\n" for distinct_id in distinct_ids)),
+        )
+        cursor.execute(
+            INSERT_COHORT_PEOPLE_FROM_STAGED_DISTINCT_IDS,
+            {"team_id": cohort.team_id, "cohort_id": cohort.pk, "version": cohort.version},
+        )
+        person_uuids = [row[0] for row in cursor.fetchall()]
+        # Dropped explicitly rather than on commit, as this may run within an outer transaction
+        cursor.execute("DROP TABLE static_cohort_upload")
+        return person_uuids
+
+
+def _escape_copy_value(value: str) -> str:
+    # Characters with a meaning in COPY's text format
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _bulk_upload_progress_key(cohort: Cohort, items: List[str]) -> str:
+    digest = hashlib.md5()
+    for item in items:
+        digest.update(item.encode("utf-8"))
+        digest.update(b"\n")
+    return f"static_cohort_bulk_upload_{cohort.pk}_{digest.hexdigest()}"
@@ -193,14 +193,31 @@ class Cohort(models.Model):
             "deleted": self.deleted,
         }
 
-    def calculate_people_ch(self, pending_version):
-        from posthog.models.cohort.util import recalculate_cohortpeople
+    def calculate_people_ch(self, pending_version, incremental: bool = False):
+        """
+        Recalculates the cohort's membership as `pending_version`, or with `incremental` updates the membership of
+        persons that changed since the last calculation in place, in which case `pending_version` is the current one.
+        """
+        from posthog.models.cohort.util import (
+            recalculate_cohortpeople,
+            recalculate_cohortpeople_incrementally,
+            record_cohort_calculation_duration,
+        )
 
-        logger.info("cohort_calculation_started", id=self.pk, current_version=self.version, new_version=pending_version)
+        logger.info(
+            "cohort_calculation_started",
+            id=self.pk,
+            current_version=self.version,
+            new_version=pending_version,
+            incremental=incremental,
+        )
         start_time = time.monotonic()
 
         try:
-            count = recalculate_cohortpeople(self, pending_version)
+            if incremental:
+                count = recalculate_cohortpeople_incrementally(self)
+            else:
+                count = recalculate_cohortpeople(self, pending_version)
             self.count = count
 
             self.last_calculation = timezone.now()
@@ -225,18 +242,20 @@ class Cohort(models.Model):
         )
         self.refresh_from_db()
 
-        logger.info(
-            "cohort_calculation_completed",
-            id=self.pk,
-            version=pending_version,
-            duration=(time.monotonic() - start_time),
-        )
+        duration = time.monotonic() - start_time
+        logger.info("cohort_calculation_completed", id=self.pk, version=pending_version, duration=duration)
+        try:
+            record_cohort_calculation_duration(self.pk, duration)
+        except Exception as err:
+            # The history only informs scheduling, so don't fail the calculation over it
+            capture_exception(err)
 
     def insert_users_by_list(self, items: List[str]) -> None:
         """
         Items can be distinct_id or email
         """
         batchsize = 1000
+        from posthog.models.cohort.bulk_upload import BULK_UPLOAD_THRESHOLD, insert_users_by_list_in_bulk
         from posthog.models.cohort.util import insert_static_cohort
 
         if TEST:
@@ -245,24 +264,28 @@ class Cohort(models.Model):
             # Make sure persons are created in tests before running this
             flush_persons_and_events()
 
+        in_bulk = len(items) >= BULK_UPLOAD_THRESHOLD
         try:
-            cursor = connection.cursor()
-            for i in range(0, len(items), batchsize):
-                batch = items[i : i + batchsize]
-                persons_query = (
-                    Person.objects.filter(team_id=self.team_id)
-                    .filter(Q(persondistinctid__team_id=self.team_id, persondistinctid__distinct_id__in=batch))
-                    .exclude(cohort__id=self.id)
-                )
-                insert_static_cohort([p for p in persons_query.values_list("uuid", flat=True)], self.pk, self.team)
-                sql, params = persons_query.distinct("pk").only("pk").query.sql_with_params()
-                query = UPDATE_QUERY.format(
-                    cohort_id=self.pk,
-                    values_query=sql.replace(
-                        'FROM "posthog_person"', f', {self.pk}, {self.version or "NULL"} FROM "posthog_person"', 1
-                    ),
-                )
-                cursor.execute(query, params)
+            if in_bulk:
+                insert_users_by_list_in_bulk(self, items)
+            else:
+                cursor = connection.cursor()
+                for i in range(0, len(items), batchsize):
+                    batch = items[i : i + batchsize]
+                    persons_query = (
+                        Person.objects.filter(team_id=self.team_id)
+                        .filter(Q(persondistinctid__team_id=self.team_id, persondistinctid__distinct_id__in=batch))
+                        .exclude(cohort__id=self.id)
+                    )
+                    insert_static_cohort([p for p in persons_query.values_list("uuid", flat=True)], self.pk, self.team)
+                    sql, params = persons_query.distinct("pk").only("pk").query.sql_with_params()
+                    query = UPDATE_QUERY.format(
+                        cohort_id=self.pk,
+                        values_query=sql.replace(
+                            'FROM "posthog_person"', f', {self.pk}, {self.version or "NULL"} FROM "posthog_person"', 1
+                        ),
+                    )
+                    cursor.execute(query, params)
             self.is_calculating = False
             self.last_calculation = timezone.now()
             self.errors_calculating = 0
@@ -274,6 +297,9 @@ class Cohort(models.Model):
             self.errors_calculating = F("errors_calculating") + 1
             self.save()
             capture_exception(err)
+            if in_bulk:
+                # Bulk uploads resume from their last finished chunk when retried
+                raise
 
     def insert_users_list_by_uuid(self, items: List[str]) -> None:
         batchsize = 1000
@@ -48,6 +48,35 @@ FROM cohortpeople
 WHERE team_id = %(team_id)s AND cohort_id = %(cohort_id)s AND version < %(new_version)s AND sign = 1
 """
 
+# Only writes the changes in membership of the given persons, as the difference between whether they should be
+# members (at the current version, and at no other) and the sum of their signs, one row per unit of difference.
+# Rerunning it, e.g. by overlapping runs, writes nothing more, and repairs memberships that got counted twice.
+RECALCULATE_COHORT_INCREMENTALLY_BY_ID = """
+INSERT INTO cohortpeople
+SELECT person_id, %(cohort_id)s as cohort_id, %(team_id)s as team_id, if(delta > 0, 1, -1) AS sign, version
+FROM (
+    SELECT person_id, version, toInt64(max(is_member)) - sum(sign) AS delta
+    FROM (
+        SELECT id AS person_id, toUInt64(%(version)s) AS version, toUInt8(1) AS is_member, toInt8(0) AS sign
+        FROM (
+            {cohort_filter}
+        ) as person
+        WHERE id IN ({changed_persons})
+        UNION ALL
+        SELECT person_id, version, toUInt8(0) AS is_member, sign
+        FROM cohortpeople
+        WHERE team_id = %(team_id)s AND cohort_id = %(cohort_id)s AND person_id IN ({changed_persons})
+    )
+    GROUP BY person_id, version
+    HAVING delta != 0
+)
+ARRAY JOIN range(toUInt64(abs(delta))) AS _row
+"""
+
+CHANGED_PERSONS_SINCE = """
+SELECT DISTINCT id FROM person WHERE team_id = %(team_id)s AND _timestamp >= %(changed_since)s
+"""
+
 # NOTE: Group by version id to ensure that signs are summed between corresponding rows.
 # Version filtering is not necessary as only positive rows of the latest version will be selected by sum(sign) > 0
 
@@ -1,12 +1,15 @@
+import hashlib
+import json
 import uuid
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import structlog
 from dateutil import parser
 from django.conf import settings
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
+from sentry_sdk import capture_exception
 
 from posthog.client import sync_execute
 from posthog.constants import PropertyOperatorType
@@ -17,11 +20,13 @@ from posthog.models.async_deletion import AsyncDeletion, DeletionType
 from posthog.models.cohort.cohort import Cohort
 from posthog.models.cohort.sql import (
     CALCULATE_COHORT_PEOPLE_SQL,
+    CHANGED_PERSONS_SINCE,
     GET_COHORT_SIZE_SQL,
     GET_COHORTS_BY_PERSON_UUID,
     GET_PERSON_ID_BY_PRECALCULATED_COHORT_ID,
     GET_STATIC_COHORTPEOPLE_BY_PERSON_UUID,
     RECALCULATE_COHORT_BY_ID,
+    RECALCULATE_COHORT_INCREMENTALLY_BY_ID,
     STALE_COHORTPEOPLE,
 )
 from posthog.models.person.sql import (
@@ -33,12 +38,21 @@ from posthog.models.person.sql import (
 from posthog.models.property import Property, PropertyGroup
 from posthog.queries.insight import insight_sync_execute
 from posthog.queries.person_distinct_id_query import get_team_distinct_ids_query
+from posthog.redis import get_client
 
 # temporary marker to denote when cohortpeople table started being populated
 TEMP_PRECALCULATED_MARKER = parser.parse("2021-06-07T15:00:00+00:00")
 
 logger = structlog.get_logger(__name__)
 
+# How many of its latest calculation durations are kept per cohort, used to estimate the cost of recalculating it
+COHORT_CALCULATION_HISTORY_LENGTH = 10
+COHORT_CALCULATION_HISTORY_TTL = 7 * 24 * 60 * 60
+
+# Incremental recalculations also recheck persons that changed a while before the last calculation, as that took
+# time and persons can reach ClickHouse late
+INCREMENTAL_RECALCULATION_OVERLAP = timedelta(hours=1)
+
 
 def format_person_query(cohort: Cohort, index: int, hogql_context: HogQLContext) -> Tuple[str, Dict[str, Any]]:
     if cohort.is_static:
@@ -265,9 +279,78 @@ def recalculate_cohortpeople(cohort: Cohort, pending_version: int) -> Optional[i
             size=count,
         )
 
+    try:
+        get_client().set(
+            _cohort_full_recalculation_key(cohort.pk),
+            _cohort_filters_hash(cohort),
+            ex=settings.COHORT_FULL_RECALCULATION_INTERVAL_HOURS * 60 * 60,
+        )
+    except Exception as err:
+        # Without the marker the next recalculation is a full one too
+        capture_exception(err)
+
     return count
 
 
+def can_recalculate_cohortpeople_incrementally(cohort: Cohort) -> bool:
+    """
+    Whether the cohort's membership can be brought up to date by rechecking only the persons that changed.
+
+    That's the case for cohorts filtering only on person properties, as the membership of others also changes
+    with time (e.g. "performed event in the last 30 days") or with other cohorts, and only if a full
+    recalculation with the current filters ran recently.
+    """
+    if not settings.RECALCULATE_COHORTS_INCREMENTALLY or cohort.is_static:
+        return False
+    if not cohort.version or not cohort.last_calculation:
+        return False
+    if not cohort.properties.values or any(prop.type != "person" for prop in cohort.properties.flat):
+        return False
+
+    try:
+        filters_hash = get_client().get(_cohort_full_recalculation_key(cohort.pk))
+    except Exception:
+        return False
+    return filters_hash is not None and filters_hash.decode() == _cohort_filters_hash(cohort)
+
+
+def recalculate_cohortpeople_incrementally(cohort: Cohort) -> Optional[int]:
+    """Writes only the membership changes of persons changed since the cohort's last calculation, at its version"""
+    hogql_context = HogQLContext(within_non_hogql_query=True, team_id=cohort.team_id)
+    cohort_query, cohort_params = format_person_query(cohort, 0, hogql_context)
+
+    sync_execute(
+        RECALCULATE_COHORT_INCREMENTALLY_BY_ID.format(
+            cohort_filter=cohort_query, changed_persons=CHANGED_PERSONS_SINCE
+        ),
+        {
+            **cohort_params,
+            **hogql_context.values,
+            "cohort_id": cohort.pk,
+            "team_id": cohort.team_id,
+            "version": cohort.version,
+            "changed_since": (cohort.last_calculation - INCREMENTAL_RECALCULATION_OVERLAP).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+        },
+        settings={"optimize_on_insert": 0},
+    )
+
+    count = get_cohort_size(cohort.pk, cohort.team_id)
+    logger.info(
+        "Recalculating cohortpeople incrementally done", team_id=cohort.team_id, cohort_id=cohort.pk, size=count
+    )
+    return count
+
+
+def _cohort_full_recalculation_key(cohort_id: int) -> str:
+    return f"cohort_full_recalculation_{cohort_id}"
+
+
+def _cohort_filters_hash(cohort: Cohort) -> str:
+    return hashlib.md5(json.dumps(cohort.properties.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()
+
+
 def clear_stale_cohortpeople(cohort: Cohort, current_version: int) -> None:
 
     if cohort.version and cohort.version > 0:
@@ -383,3 +466,41 @@ def get_dependent_cohorts(cohort: Cohort) -> List[Cohort]:
             continue
 
     return cohorts
+
+
+def get_cohort_dependency_ids(cohort: Cohort) -> Set[int]:
+    """Ids of the cohorts that `cohort` directly references in its filters, without querying them"""
+    dependency_ids = set()
+    for prop in cohort.properties.flat:
+        if prop.type == "cohort":
+            try:
+                dependency_ids.add(int(prop.value))
+            except (TypeError, ValueError):
+                continue
+    dependency_ids.discard(cohort.pk)
+    return dependency_ids
+
+
+def record_cohort_calculation_duration(cohort_id: int, duration: float) -> None:
+    key = _cohort_calculation_history_key(cohort_id)
+    pipeline = get_client().pipeline()
+    pipeline.lpush(key, duration)
+    pipeline.ltrim(key, 0, COHORT_CALCULATION_HISTORY_LENGTH - 1)
+    pipeline.expire(key, COHORT_CALCULATION_HISTORY_TTL)
+    pipeline.execute()
+
+
+def get_cohort_calculation_durations(cohort_ids: Iterable[int]) -> Dict[int, List[float]]:
+    """Latest calculation durations of the given cohorts in seconds, most recent first"""
+    cohort_ids = list(cohort_ids)
+    pipeline = get_client().pipeline()
+    for cohort_id in cohort_ids:
+        pipeline.lrange(_cohort_calculation_history_key(cohort_id), 0, -1)
+    return {
+        cohort_id: [float(duration) for duration in durations]
+        for cohort_id, durations in zip(cohort_ids, pipeline.execute())
+    }
+
+
+def _cohort_calculation_history_key(cohort_id: int) -> str:
+    return f"cohort_calculation_durations_{cohort_id}"
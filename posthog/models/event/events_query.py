@@ -42,13 +42,31 @@ def run_events_query(
 ) -> EventsQueryResponse:
     # Note: This code is inefficient and problematic, see https://github.com/PostHog/posthog/issues/13485 for details.
 
-    # limit & offset
     # adding +1 to the limit to check if there's a "next page" after the requested results
     limit = min(QUERY_MAXIMUM_LIMIT, QUERY_DEFAULT_LIMIT if query.limit is None else query.limit) + 1
+    stmt = build_events_query(team, query, limit)
+
+    query_result = execute_hogql_query(query=stmt, team=team, workload=Workload.OFFLINE, query_type="EventsQuery")
+    query_result.results = expand_events_query_results(team, query, query_result.results)
+
+    received_extra_row = len(query_result.results) == limit  # limit was +=1'd above
+    return EventsQueryResponse(
+        results=query_result.results[: limit - 1] if received_extra_row else query_result.results,
+        columns=get_events_query_columns(query),
+        types=[type for _, type in query_result.types],
+        hasMore=received_extra_row,
+    )
+
+
+def get_events_query_columns(query: EventsQuery) -> List[str]:
+    return ["*"] if len(query.select) == 0 else query.select
+
+
+def build_events_query(team: Team, query: EventsQuery, limit: int) -> ast.SelectQuery:
     offset = 0 if query.offset is None else query.offset
 
     # columns & group_by
-    select_input_raw = ["*"] if len(query.select) == 0 else query.select
+    select_input_raw = get_events_query_columns(query)
     select_input: List[str] = []
     for col in select_input_raw:
         # Selecting a "*" expands the list of columns, resulting in a table that's not what we asked for.
@@ -125,7 +143,7 @@ def run_events_query(
     else:
         order_by = []
 
-    stmt = ast.SelectQuery(
+    return ast.SelectQuery(
         select=select,
         select_from=ast.JoinExpr(table=ast.Field(chain=["events"])),
         where=where,
@@ -136,13 +154,20 @@ def run_events_query(
         offset=ast.Constant(value=offset),
     )
 
-    query_result = execute_hogql_query(query=stmt, team=team, workload=Workload.OFFLINE, query_type="EventsQuery")
+
+def expand_events_query_results(team: Team, query: EventsQuery, results: List) -> List:
+    """
+    Turns the "*" and "person" columns of a page of `build_events_query` results into dicts. Persons are loaded
+    from Postgres, one query per page.
+    """
+    select_input_raw = get_events_query_columns(query)
+    results = list(results)
 
     # Convert star field from tuple to dict in each result
     if "*" in select_input_raw:
         star_idx = select_input_raw.index("*")
-        for index, result in enumerate(query_result.results):
-            query_result.results[index] = list(result)
+        for index, result in enumerate(results):
+            results[index] = list(result)
             select = result[star_idx]
             new_result = dict(zip(SELECT_STAR_FROM_EVENTS_FIELDS, select))
             new_result["properties"] = json.loads(new_result["properties"])
@@ -150,12 +175,12 @@ def run_events_query(
                 new_result["elements"] = ElementSerializer(
                     chain_to_elements(new_result["elements_chain"]), many=True
                 ).data
-            query_result.results[index][star_idx] = new_result
+            results[index][star_idx] = new_result
 
-    if "person" in select_input_raw and len(query_result.results) > 0:
+    if "person" in select_input_raw and len(results) > 0:
         # Make a query into postgres to fetch person
         person_idx = select_input_raw.index("person")
-        distinct_ids = list(set(event[person_idx] for event in query_result.results))
+        distinct_ids = list(set(event[person_idx] for event in results))
         persons = get_persons_by_distinct_ids(team.pk, distinct_ids)
         persons = persons.prefetch_related(Prefetch("persondistinctid_set", to_attr="distinct_ids_cache"))
         distinct_to_person: Dict[str, Person] = {}
@@ -168,26 +193,20 @@ def run_events_query(
         for column_index, column in enumerate(select_input_raw):
             if column != "person":
                 continue
-            for index, result in enumerate(query_result.results):
+            for index, result in enumerate(results):
                 distinct_id: str = result[column_index]
-                query_result.results[index] = list(result)
+                results[index] = list(result)
                 if distinct_to_person.get(distinct_id):
                     person = distinct_to_person[distinct_id]
-                    query_result.results[index][column_index] = {
+                    results[index][column_index] = {
                         "uuid": person.uuid,
                         "created_at": person.created_at,
                         "properties": person.properties or {},
                         "distinct_id": distinct_id,
                     }
                 else:
-                    query_result.results[index][column_index] = {
+                    results[index][column_index] = {
                         "distinct_id": distinct_id,
                     }
 
-    received_extra_row = len(query_result.results) == limit  # limit was +=1'd above
-    return EventsQueryResponse(
-        results=query_result.results[: limit - 1] if received_extra_row else query_result.results,
-        columns=select_input_raw,
-        types=[type for _, type in query_result.types],
-        hasMore=received_extra_row,
-    )
+    return results
@@ -1,6 +1,6 @@
 import secrets
 from datetime import timedelta
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
 import structlog
 from django.conf import settings
@@ -137,6 +137,27 @@ def save_content_to_exported_asset(exported_asset: ExportedAsset, content: bytes
 
 
 def save_content_to_object_storage(exported_asset: ExportedAsset, content: bytes) -> None:
+    object_path = _object_storage_path(exported_asset)
+    object_storage.write(object_path, content)
+    exported_asset.content_location = object_path
+    exported_asset.save(update_fields=["content_location"])
+
+
+def save_content_stream(exported_asset: ExportedAsset, chunks: Iterable[bytes]) -> None:
+    """
+    Like `save_content`, for content produced in chunks. With object storage the chunks are uploaded as they come,
+    without keeping them in memory. As they can't be produced again, a failed upload isn't retried in Postgres.
+    """
+    if settings.OBJECT_STORAGE_ENABLED:
+        object_path = _object_storage_path(exported_asset)
+        object_storage.write_stream(object_path, chunks)
+        exported_asset.content_location = object_path
+        exported_asset.save(update_fields=["content_location"])
+    else:
+        save_content_to_exported_asset(exported_asset, b"".join(chunks))
+
+
+def _object_storage_path(exported_asset: ExportedAsset) -> str:
     path_parts: List[str] = [
         settings.OBJECT_STORAGE_EXPORTS_FOLDER,
         exported_asset.export_format.split("/")[1],
@@ -144,7 +165,4 @@ def save_content_to_object_storage(exported_asset: ExportedAsset, content: bytes
         f"task-{exported_asset.id}",
         str(UUIDT()),
     ]
-    object_path = f'/{"/".join(path_parts)}'
-    object_storage.write(object_path, content)
-    exported_asset.content_location = object_path
-    exported_asset.save(update_fields=["content_location"])
+    return f'/{"/".join(path_parts)}'
@@ -1,4 +1,14 @@
-from .feature_flag import FeatureFlag, get_feature_flags_for_team_in_cache, set_feature_flags_for_team_in_cache
-from .flag_matching import FeatureFlagMatcher, get_all_feature_flags
+from .feature_flag import (
+    FeatureFlag,
+    get_compiled_feature_flags_for_team,
+    get_feature_flags_for_team_in_cache,
+    set_feature_flags_for_team_in_cache,
+)
+from .flag_matching import (
+    FeatureFlagEvaluationTarget,
+    FeatureFlagMatcher,
+    get_all_feature_flags,
+    get_all_feature_flags_for_distinct_ids,
+)
 from .permissions import can_user_edit_feature_flag
 from .user_blast_radius import get_user_blast_radius
@@ -1,12 +1,16 @@
 import json
-from typing import Dict, List, Optional, cast
+import math
+import time
+from typing import Dict, List, Optional, Tuple, cast
 
+from django.conf import settings
 from django.core.cache import cache
 from django.db import models
 from django.db.models.signals import post_delete, post_save, pre_delete
 from django.utils import timezone
 from sentry_sdk.api import capture_exception
 
+from posthog.cache_utils import TTLCache, instance_memoize
 from posthog.constants import PropertyOperatorType
 from posthog.models.cohort import Cohort
 from posthog.models.experiment import Experiment
@@ -86,6 +90,52 @@ class FeatureFlag(models.Model):
                 return variants
         return []
 
+    @instance_memoize
+    def get_sorted_conditions(self) -> List[Tuple[int, Dict]]:
+        """
+        Conditions with variant overrides first, each with its index in `conditions`. Stable, so that overrides are
+        evaluated first and applied to the first matching condition, and otherwise the order is kept.
+        """
+        return sorted(
+            enumerate(self.conditions), key=lambda condition_tuple: 0 if condition_tuple[1].get("variant") else 1
+        )
+
+    @instance_memoize
+    def get_condition_properties(self, condition_index: int) -> List[Property]:
+        from posthog.models.filters import Filter
+
+        return Filter(data=self.conditions[condition_index]).property_groups.flat
+
+    @instance_memoize
+    def get_variant_lookup_table(self) -> List[Dict]:
+        """
+        Contiguous sub-domains of [0, 1], one per variant. Looking up a random hash value gives the associated
+        variant key, e.g. the first of two variants with 50% rollout percentage will have value_max: 0.5 and the
+        second will have value_min: 0.5 and value_max: 1.0
+        """
+        lookup_table = []
+        value_min = 0
+        for variant in self.variants:
+            value_max = value_min + variant["rollout_percentage"] / 100
+            lookup_table.append({"value_min": value_min, "value_max": value_max, "key": variant["key"]})
+            value_min = value_max
+        return lookup_table
+
+    @instance_memoize
+    def get_variant_boundaries(self) -> List[float]:
+        "The value_max of each variant in the lookup table, to bisect a hash value with."
+        return [variant["value_max"] for variant in self.get_variant_lookup_table()]
+
+    def compile_for_matching(self) -> "FeatureFlag":
+        "Computes everything FeatureFlagMatcher needs up front, so that instances can be shared between requests."
+        self.get_sorted_conditions()
+        self.get_variant_lookup_table()
+        self.get_variant_boundaries()
+        for index, condition in enumerate(self.conditions):
+            if len(condition.get("properties", [])) > 0:
+                self.get_condition_properties(index)
+        return self
+
     def get_filters(self):
         if "groups" in self.filters:
             return self.filters
@@ -286,6 +336,9 @@ def set_feature_flags_for_team_in_cache(
     serialized_flags = MinimalFeatureFlagSerializer(all_feature_flags, many=True).data
 
     cache.set(f"team_feature_flags_{team_id}", json.dumps(serialized_flags), FIVE_DAYS)
+    # :TRICKY: Bump the version only after the new flags are stored, so that workers reading the new version
+    # never read the old flags.
+    _bump_feature_flags_version(team_id)
 
     return all_feature_flags
 
@@ -306,3 +359,58 @@ def get_feature_flags_for_team_in_cache(team_id: int) -> Optional[List[FeatureFl
             return None
 
     return None
+
+
+# Flags deserialized from the cache above and compiled for matching, keyed by team and the version of its flags.
+# Entries of outdated versions are never read again and get evicted as the least recently used.
+_compiled_feature_flags_cache = TTLCache(
+    None, ttl=math.inf, max_size=settings.FLAG_DEFINITIONS_LOCAL_CACHE_SIZE, name="compiled_feature_flags"
+)
+
+
+def get_compiled_feature_flags_for_team(team_id: int) -> List[FeatureFlag]:
+    """
+    Returns the team's active flags, ready for matching. They're kept in memory for as long as the version of
+    the team's flags in redis doesn't change, so that only that version is read from redis on every call.
+
+    The flags returned are shared between callers, don't modify them.
+    """
+    version = get_feature_flags_version(team_id)
+    if version is None:
+        return _load_compiled_feature_flags(team_id)
+
+    return _compiled_feature_flags_cache.get((team_id, version), lambda: _load_compiled_feature_flags(team_id))
+
+
+def get_feature_flags_version(team_id: int) -> Optional[int]:
+    key = _feature_flags_version_key(team_id)
+    try:
+        version = cache.get(key)
+        if version is None:
+            # Start at the current time rather than at 1, so that a version lost from redis isn't reused
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        return version
+    except Exception:
+        # redis is unavailable
+        return None
+
+
+def _bump_feature_flags_version(team_id: int) -> None:
+    key = _feature_flags_version_key(team_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No version yet
+        cache.add(key, time.time_ns(), None)
+
+
+def _feature_flags_version_key(team_id: int) -> str:
+    return f"team_feature_flags_version_{team_id}"
+
+
+def _load_compiled_feature_flags(team_id: int) -> List[FeatureFlag]:
+    feature_flags = get_feature_flags_for_team_in_cache(team_id)
+    if feature_flags is None:
+        feature_flags = set_feature_flags_for_team_in_cache(team_id)
+    return [feature_flag.compile_for_matching() for feature_flag in feature_flags]
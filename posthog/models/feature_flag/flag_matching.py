@@ -1,17 +1,18 @@
 import hashlib
-from dataclasses import dataclass
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from enum import Enum
 import time
 import structlog
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union, cast
 
 from django.db import DatabaseError, IntegrityError
+from django.db.models import Q
 from django.db.models.expressions import ExpressionWrapper, RawSQL
 from django.db.models.fields import BooleanField
 from django.db.models.query import QuerySet
 from sentry_sdk.api import capture_exception
 
-from posthog.models.filters import Filter
 from posthog.models.filters.mixins.utils import cached_property
 from posthog.models.group import Group
 from posthog.models.group_type_mapping import GroupTypeMapping
@@ -21,18 +22,15 @@ from posthog.models.property.property import Property
 from posthog.models.utils import execute_with_timeout
 from posthog.queries.base import match_property, properties_to_Q
 
-from .feature_flag import (
-    FeatureFlag,
-    FeatureFlagHashKeyOverride,
-    get_feature_flags_for_team_in_cache,
-    set_feature_flags_for_team_in_cache,
-)
+from .feature_flag import FeatureFlag, FeatureFlagHashKeyOverride, get_compiled_feature_flags_for_team
 
 logger = structlog.get_logger(__name__)
 
 __LONG_SCALE__ = float(0xFFFFFFFFFFFFFFF)
 
 FLAG_MATCHING_QUERY_TIMEOUT_MS = 1 * 1000  # 1 second. Any longer and we'll just error out.
+# Queries for a whole batch of distinct_ids at once, see get_all_feature_flags_for_distinct_ids
+BULK_FLAG_MATCHING_QUERY_TIMEOUT_MS = 10 * 1000
 
 
 class FeatureFlagMatchReason(str, Enum):
@@ -69,6 +67,16 @@ class FeatureFlagMatch:
     payload: Optional[object] = None
 
 
+@dataclass(frozen=True)
+class FeatureFlagEvaluationTarget:
+    "One of the distinct_ids to evaluate flags for with get_all_feature_flags_for_distinct_ids."
+
+    distinct_id: str
+    groups: Dict[GroupTypeName, str] = field(default_factory=dict)
+    property_value_overrides: Dict[str, Union[str, int]] = field(default_factory=dict)
+    group_property_value_overrides: Dict[str, Dict[str, Union[str, int]]] = field(default_factory=dict)
+
+
 class FlagsMatcherCache:
     def __init__(self, team_id: int):
         self.team_id = team_id
@@ -114,6 +122,8 @@ class FeatureFlagMatcher:
         self.property_value_overrides = property_value_overrides
         self.group_property_value_overrides = group_property_value_overrides
         self.skip_experience_continuity_flags = skip_experience_continuity_flags
+        self._local_condition_matches: Dict[Tuple[str, int], Optional[bool]] = {}
+        self._hashes: Dict[Tuple[str, Optional[str], str], float] = {}
 
     def get_match(self, feature_flag: FeatureFlag) -> FeatureFlagMatch:
         # If aggregating flag by groups and relevant group type is not passed - flag is off!
@@ -122,18 +132,12 @@ class FeatureFlagMatcher:
 
         highest_priority_evaluation_reason = FeatureFlagMatchReason.NO_CONDITION_MATCH
         highest_priority_index = 0
-        # Stable sort conditions with variant overrides to the top. This ensures that if overrides are present, they are
-        # evaluated first, and the variant override is applied to the first matching condition.
-        # :TRICKY: We need to include the enumeration index before the sort so the flag evaluation reason gets the right condition index.
-        sorted_flag_conditions = sorted(
-            enumerate(feature_flag.conditions),
-            key=lambda condition_tuple: 0 if condition_tuple[1].get("variant") else 1,
-        )
-        for index, condition in sorted_flag_conditions:
+        # Conditions with variant overrides come first, see FeatureFlag.get_sorted_conditions
+        for index, condition in feature_flag.get_sorted_conditions():
             is_match, evaluation_reason = self.is_condition_match(feature_flag, condition, index)
             if is_match:
                 variant_override = condition.get("variant")
-                if variant_override in [variant["key"] for variant in feature_flag.variants]:
+                if variant_override in [variant["key"] for variant in feature_flag.get_variant_lookup_table()]:
                     variant = variant_override
                 else:
                     variant = self.get_matching_variant(feature_flag)
@@ -161,7 +165,7 @@ class FeatureFlagMatcher:
         faced_error_computing_flags = False
         flag_payloads = {}
         for feature_flag in self.feature_flags:
-            if self.skip_experience_continuity_flags and feature_flag.ensure_experience_continuity:
+            if self._is_skipped(feature_flag):
                 faced_error_computing_flags = True
                 continue
             try:
@@ -185,12 +189,11 @@ class FeatureFlagMatcher:
         return flag_values, flag_evaluation_reasons, flag_payloads, faced_error_computing_flags
 
     def get_matching_variant(self, feature_flag: FeatureFlag) -> Optional[str]:
-        for variant in self.variant_lookup_table(feature_flag):
-            if (
-                self.get_hash(feature_flag, salt="variant") >= variant["value_min"]
-                and self.get_hash(feature_flag, salt="variant") < variant["value_max"]
-            ):
-                return variant["key"]
+        # The variant whose [value_min, value_max) holds the hash is the first one ending after it
+        boundaries = feature_flag.get_variant_boundaries()
+        index = bisect_right(boundaries, self.get_hash(feature_flag, salt="variant"))
+        if index < len(boundaries):
+            return feature_flag.get_variant_lookup_table()[index]["key"]
         return None
 
     def get_matching_payload(
@@ -209,18 +212,11 @@ class FeatureFlagMatcher:
     ) -> Tuple[bool, FeatureFlagMatchReason]:
         rollout_percentage = condition.get("rollout_percentage")
         if len(condition.get("properties", [])) > 0:
-            properties = Filter(data=condition).property_groups.flat
-            if self.can_compute_locally(properties, feature_flag.aggregation_group_type_index):
-                # :TRICKY: If overrides are enough to determine if a condition is a match,
-                # we can skip checking the query.
-                # This ensures match even if the person hasn't been ingested yet.
-                target_properties = self.property_value_overrides
-                if feature_flag.aggregation_group_type_index is not None:
-                    target_properties = self.group_property_value_overrides.get(
-                        self.cache.group_type_index_to_name[feature_flag.aggregation_group_type_index], {}
-                    )
-                condition_match = all(match_property(property, target_properties) for property in properties)
-            else:
+            # :TRICKY: If overrides are enough to determine if a condition is a match,
+            # we can skip checking the query.
+            # This ensures match even if the person hasn't been ingested yet.
+            condition_match = self.match_condition_locally(feature_flag, condition_index)
+            if condition_match is None:
                 condition_match = self._condition_matches(feature_flag, condition_index)
 
             if not condition_match:
@@ -233,23 +229,34 @@ class FeatureFlagMatcher:
 
         return True, FeatureFlagMatchReason.CONDITION_MATCH
 
+    def match_condition_locally(self, feature_flag: FeatureFlag, condition_index: int) -> Optional[bool]:
+        """
+        Matches the properties of a condition against the property overrides. Returns None if that's not enough to
+        tell, in which case the condition has to be matched against the person or group in postgres.
+
+        A single property that's overridden and doesn't match is enough to tell the condition doesn't match,
+        as a condition's properties are AND-ed together.
+        """
+        cache_key = (feature_flag.key, condition_index)
+        if cache_key not in self._local_condition_matches:
+            target_properties = self._get_target_properties(feature_flag.aggregation_group_type_index)
+            condition_match: Optional[bool] = True
+            for property in feature_flag.get_condition_properties(condition_index):
+                if not self._can_match_property_locally(property, target_properties):
+                    condition_match = None
+                elif not match_property(property, target_properties):
+                    condition_match = False
+                    break
+            self._local_condition_matches[cache_key] = condition_match
+        return self._local_condition_matches[cache_key]
+
     def _condition_matches(self, feature_flag: FeatureFlag, condition_index: int) -> bool:
         if self.failed_to_fetch_conditions:
             raise DatabaseError("Failed to fetch conditions for feature flag previously, not trying again.")
         return self.query_conditions.get(f"flag_{feature_flag.pk}_condition_{condition_index}", False)
 
-    # Define contiguous sub-domains within [0, 1].
-    # By looking up a random hash value, you can find the associated variant key.
-    # e.g. the first of two variants with 50% rollout percentage will have value_max: 0.5
-    # and the second will have value_min: 0.5 and value_max: 1.0
     def variant_lookup_table(self, feature_flag: FeatureFlag):
-        lookup_table = []
-        value_min = 0
-        for variant in feature_flag.variants:
-            value_max = value_min + variant["rollout_percentage"] / 100
-            lookup_table.append({"value_min": value_min, "value_max": value_max, "key": variant["key"]})
-            value_min = value_max
-        return lookup_table
+        return feature_flag.get_variant_lookup_table()
 
     @cached_property
     def query_conditions(self) -> Dict[str, bool]:
@@ -276,20 +283,25 @@ class FeatureFlagMatcher:
                 person_fields = []
 
                 for feature_flag in self.feature_flags:
+                    if self._is_skipped(feature_flag) or self.hashed_identifier(feature_flag) is None:
+                        continue
                     for index, condition in enumerate(feature_flag.conditions):
+                        # Only query for conditions that can't be matched without postgres, so that no query is
+                        # made at all when the overrides are enough for every flag.
+                        if (
+                            len(condition.get("properties", {})) == 0
+                            or self.match_condition_locally(feature_flag, index) is not None
+                        ):
+                            continue
+
                         key = f"flag_{feature_flag.pk}_condition_{index}"
-                        expr: Any = None
-                        if len(condition.get("properties", {})) > 0:
-                            # Feature Flags don't support OR filtering yet
-                            target_properties = self.property_value_overrides
-                            if feature_flag.aggregation_group_type_index is not None:
-                                target_properties = self.group_property_value_overrides.get(
-                                    self.cache.group_type_index_to_name[feature_flag.aggregation_group_type_index], {}
-                                )
-                            expr = properties_to_Q(
-                                Filter(data=condition).property_groups.flat,
-                                override_property_values=target_properties,
-                            )
+                        # Feature Flags don't support OR filtering yet
+                        expr: Any = properties_to_Q(
+                            feature_flag.get_condition_properties(index),
+                            override_property_values=self._get_target_properties(
+                                feature_flag.aggregation_group_type_index
+                            ),
+                        )
 
                         if feature_flag.aggregation_group_type_index is None:
                             person_query = person_query.annotate(
@@ -327,6 +339,8 @@ class FeatureFlagMatcher:
                         all_conditions = {**person_query[0]}
 
                 for group_query, group_fields in group_query_per_group_type_mapping.values():
+                    if len(group_fields) == 0:
+                        continue
                     group_query = group_query.values(*group_fields)
                     if len(group_query) > 0:
                         assert len(group_query) == 1, f"Expected 1 group query result, got {len(group_query)}"
@@ -361,25 +375,38 @@ class FeatureFlagMatcher:
     # Given the same identifier and key, it'll always return the same float. These floats are
     # uniformly distributed between 0 and 1, so if we want to show this feature to 20% of traffic
     # we can do _hash(key, identifier) < 0.2
+    # Hashes are memoized per matcher, as a flag's hash is needed once per condition with a rollout percentage.
     def get_hash(self, feature_flag: FeatureFlag, salt="") -> float:
-        hash_key = f"{feature_flag.key}.{self.hashed_identifier(feature_flag)}{salt}"
-        hash_val = int(hashlib.sha1(hash_key.encode("utf-8")).hexdigest()[:15], 16)
-        return hash_val / __LONG_SCALE__
+        identifier = self.hashed_identifier(feature_flag)
+        cache_key = (feature_flag.key, identifier, salt)
+        if cache_key not in self._hashes:
+            hash_key = f"{feature_flag.key}.{identifier}{salt}"
+            hash_val = int(hashlib.sha1(hash_key.encode("utf-8")).hexdigest()[:15], 16)
+            self._hashes[cache_key] = hash_val / __LONG_SCALE__
+        return self._hashes[cache_key]
 
     def can_compute_locally(
         self, properties: List[Property], group_type_index: Optional[GroupTypeIndex] = None
     ) -> bool:
-        target_properties = self.property_value_overrides
-        if group_type_index is not None:
-            target_properties = self.group_property_value_overrides.get(
-                self.cache.group_type_index_to_name[group_type_index], {}
-            )
-        for property in properties:
-            if property.key not in target_properties:
-                return False
-            if property.operator == "is_not_set":
-                return False
-        return True
+        target_properties = self._get_target_properties(group_type_index)
+        return all(self._can_match_property_locally(property, target_properties) for property in properties)
+
+    def _can_match_property_locally(self, property: Property, target_properties: Dict[str, Any]) -> bool:
+        # Cohort filters and negated properties are left to postgres, as match_property doesn't handle them
+        return (
+            property.type != "cohort"
+            and not property.negation
+            and property.key in target_properties
+            and property.operator != "is_not_set"
+        )
+
+    def _get_target_properties(self, group_type_index: Optional[GroupTypeIndex]) -> Dict[str, Any]:
+        if group_type_index is None:
+            return self.property_value_overrides
+        return self.group_property_value_overrides.get(self.cache.group_type_index_to_name[group_type_index], {})
+
+    def _is_skipped(self, feature_flag: FeatureFlag) -> bool:
+        return self.skip_experience_continuity_flags and feature_flag.ensure_experience_continuity
 
     def get_highest_priority_match_evaluation(
         self,
@@ -394,6 +421,48 @@ class FeatureFlagMatcher:
         return current_match, current_index
 
 
+class _PrefetchedFeatureFlagMatcher(FeatureFlagMatcher):
+    """
+    Matches the conditions that need postgres against `property_matches`, which get_all_feature_flags_for_distinct_ids
+    fetches for a whole batch of matchers at once. They hold whether the person or group matches each property on
+    its own, keyed by _property_match_key, as the overrides that decide the other properties differ between matchers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.property_matches: Dict[str, bool] = {}
+
+    def get_properties_to_query(self) -> Iterator[Tuple[FeatureFlag, int, int, Property]]:
+        for feature_flag in self.feature_flags:
+            if self._is_skipped(feature_flag) or self.hashed_identifier(feature_flag) is None:
+                continue
+            target_properties = self._get_target_properties(feature_flag.aggregation_group_type_index)
+            for condition_index, condition in enumerate(feature_flag.conditions):
+                if (
+                    len(condition.get("properties", [])) == 0
+                    or self.match_condition_locally(feature_flag, condition_index) is not None
+                ):
+                    continue
+                for property_index, property in enumerate(feature_flag.get_condition_properties(condition_index)):
+                    if not self._can_match_property_locally(property, target_properties):
+                        yield feature_flag, condition_index, property_index, property
+
+    def _condition_matches(self, feature_flag: FeatureFlag, condition_index: int) -> bool:
+        if self.failed_to_fetch_conditions:
+            raise DatabaseError("Failed to fetch conditions for feature flag previously, not trying again.")
+        # The overridden properties all match, or match_condition_locally would've settled the condition
+        target_properties = self._get_target_properties(feature_flag.aggregation_group_type_index)
+        return all(
+            self.property_matches.get(_property_match_key(feature_flag, condition_index, property_index), False)
+            for property_index, property in enumerate(feature_flag.get_condition_properties(condition_index))
+            if not self._can_match_property_locally(property, target_properties)
+        )
+
+
+def _property_match_key(feature_flag: FeatureFlag, condition_index: int, property_index: int) -> str:
+    return f"flag_{feature_flag.pk}_condition_{condition_index}_property_{property_index}"
+
+
 def get_feature_flag_hash_key_overrides(team_id: int, distinct_ids: List[str]) -> Dict[str, str]:
     feature_flag_to_key_overrides = {}
 
@@ -459,9 +528,7 @@ def get_all_feature_flags(
     group_property_value_overrides: Dict[str, Dict[str, Union[str, int]]] = {},
 ) -> Tuple[Dict[str, Union[str, bool]], Dict[str, dict], Dict[str, object], bool]:
 
-    all_feature_flags = get_feature_flags_for_team_in_cache(team_id)
-    if all_feature_flags is None:
-        all_feature_flags = set_feature_flags_for_team_in_cache(team_id)
+    all_feature_flags = get_compiled_feature_flags_for_team(team_id)
 
     flags_have_experience_continuity_enabled = any(
         feature_flag.ensure_experience_continuity for feature_flag in all_feature_flags
@@ -540,6 +607,134 @@ def get_all_feature_flags(
     )
 
 
+def get_all_feature_flags_for_distinct_ids(
+    team_id: int, targets: List[FeatureFlagEvaluationTarget]
+) -> Dict[str, Tuple[Dict[str, Union[str, bool]], Dict[str, dict], Dict[str, object], bool]]:
+    """
+    Evaluates the team's flags for many distinct_ids at once, returning what get_all_feature_flags would for each.
+
+    Rather than a few queries per distinct_id, this makes a fixed number of queries for the whole batch: one
+    for their persons, one for hash key overrides of experience continuity flags, one for the person properties
+    the overrides don't settle and one per group type for group properties. Hash key overrides are only read here,
+    as there's no $anon_distinct_id to write them for.
+    """
+    all_feature_flags = get_compiled_feature_flags_for_team(team_id)
+    if not all_feature_flags:
+        return {target.distinct_id: ({}, {}, {}, False) for target in targets}
+
+    person_ids: Dict[str, int] = {}
+    hash_key_overrides: Dict[int, Dict[str, str]] = {}
+    failed_to_fetch_persons = False
+    try:
+        with execute_with_timeout(BULK_FLAG_MATCHING_QUERY_TIMEOUT_MS):
+            person_ids = dict(
+                PersonDistinctId.objects.filter(
+                    team_id=team_id, distinct_id__in=[str(target.distinct_id) for target in targets]
+                ).values_list("distinct_id", "person_id")
+            )
+            if any(feature_flag.ensure_experience_continuity for feature_flag in all_feature_flags):
+                for person_id, feature_flag_key, hash_key in FeatureFlagHashKeyOverride.objects.filter(
+                    team_id=team_id, person_id__in=set(person_ids.values())
+                ).values_list("person_id", "feature_flag_key", "hash_key"):
+                    hash_key_overrides.setdefault(person_id, {})[feature_flag_key] = hash_key
+    except Exception as err:
+        # Same as get_all_feature_flags when the database is down: experience continuity flags are skipped,
+        # and flags that need the database error out.
+        capture_exception(err)
+        failed_to_fetch_persons = True
+
+    cache = FlagsMatcherCache(team_id)
+    matchers = [
+        _PrefetchedFeatureFlagMatcher(
+            all_feature_flags,
+            str(target.distinct_id),
+            target.groups,
+            cache,
+            hash_key_overrides.get(person_ids.get(str(target.distinct_id), -1), {}),
+            target.property_value_overrides,
+            target.group_property_value_overrides,
+            skip_experience_continuity_flags=failed_to_fetch_persons,
+        )
+        for target in targets
+    ]
+
+    if failed_to_fetch_persons:
+        for matcher in matchers:
+            matcher.failed_to_fetch_conditions = True
+    else:
+        _prefetch_property_matches(team_id, matchers, person_ids)
+
+    return {matcher.distinct_id: matcher.get_matches() for matcher in matchers}
+
+
+def _prefetch_property_matches(
+    team_id: int, matchers: List[_PrefetchedFeatureFlagMatcher], person_ids: Dict[str, int]
+) -> None:
+    person_expressions: Dict[str, Q] = {}
+    group_expressions: Dict[GroupTypeIndex, Dict[str, Q]] = {}
+    group_keys: Dict[GroupTypeIndex, Set[str]] = {}
+    try:
+        for matcher in matchers:
+            for feature_flag, condition_index, property_index, property in matcher.get_properties_to_query():
+                key = _property_match_key(feature_flag, condition_index, property_index)
+                group_type_index = feature_flag.aggregation_group_type_index
+                if group_type_index is None:
+                    expressions = person_expressions
+                else:
+                    expressions = group_expressions.setdefault(group_type_index, {})
+                    group_keys.setdefault(group_type_index, set()).add(
+                        cast(str, matcher.hashed_identifier(feature_flag))
+                    )
+                if key not in expressions:
+                    expressions[key] = properties_to_Q([property])
+
+        with execute_with_timeout(BULK_FLAG_MATCHING_QUERY_TIMEOUT_MS):
+            person_matches: Dict[int, Dict[str, bool]] = {}
+            if person_expressions and person_ids:
+                person_query = (
+                    Person.objects.filter(team_id=team_id, id__in=set(person_ids.values()))
+                    .annotate(
+                        **{
+                            key: ExpressionWrapper(expr, output_field=BooleanField())
+                            for key, expr in person_expressions.items()
+                        }
+                    )
+                    .values("id", *person_expressions.keys())
+                )
+                for row in person_query:
+                    person_matches[row.pop("id")] = row
+
+            group_matches: Dict[Tuple[GroupTypeIndex, str], Dict[str, bool]] = {}
+            for group_type_index, expressions in group_expressions.items():
+                group_query = (
+                    Group.objects.filter(
+                        team_id=team_id, group_type_index=group_type_index, group_key__in=group_keys[group_type_index]
+                    )
+                    .annotate(
+                        **{
+                            key: ExpressionWrapper(expr, output_field=BooleanField())
+                            for key, expr in expressions.items()
+                        }
+                    )
+                    .values("group_key", *expressions.keys())
+                )
+                for row in group_query:
+                    group_matches[(group_type_index, row.pop("group_key"))] = row
+    except Exception as err:
+        # Flags that need these error out when matched, like when FeatureFlagMatcher.query_conditions fails
+        capture_exception(err)
+        for matcher in matchers:
+            matcher.failed_to_fetch_conditions = True
+        return
+
+    for matcher in matchers:
+        matcher.property_matches = dict(person_matches.get(person_ids.get(matcher.distinct_id, -1), {}))
+        for group_type_index in group_expressions:
+            group_type_name = matcher.cache.group_type_index_to_name.get(group_type_index)
+            group_key = matcher.groups.get(group_type_name)  # type: ignore
+            matcher.property_matches.update(group_matches.get((group_type_index, group_key), {}))  # type: ignore
+
+
 def set_feature_flag_hash_key_overrides(team_id: int, distinct_ids: List[str], hash_key_override: str) -> None:
     # As a product decision, the first override wins, i.e consistency matters for the first walkthrough.
     # Thus, we don't need to do upserts here.
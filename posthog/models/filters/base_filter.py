@@ -1,16 +1,25 @@
-import inspect
 import json
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from rest_framework import request
 
 from posthog.models.filters.mixins.common import BaseParamMixin
 from posthog.models.filters.mixins.hogql import HogQLParamMixin
+from posthog.models.filters.mixins.utils import clear_cached_properties, collect_marked_methods
 from posthog.models.utils import sane_repr
 from posthog.utils import encode_get_request_params
 
 
 class BaseFilter(BaseParamMixin, HogQLParamMixin):
+    # Names of the methods marked with @include_dict and @include_query_tags, collected once per filter class
+    _include_dict_methods: Tuple[str, ...] = ()
+    _include_query_tags_methods: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._include_dict_methods = collect_marked_methods(cls, "include_dict")
+        cls._include_query_tags_methods = collect_marked_methods(cls, "include_query_tags")
+
     def __init__(
         self,
         data: Optional[Dict[str, Any]] = None,
@@ -29,13 +38,14 @@ class BaseFilter(BaseParamMixin, HogQLParamMixin):
         if "team" in kwargs and hasattr(self, "simplify") and not getattr(self, "is_simplified", False):
             simplified_filter = self.simplify(kwargs["team"])  # type: ignore
             self._data = simplified_filter._data
+            # Simplifying computed properties of the data it replaced
+            clear_cached_properties(self)
 
     def to_dict(self) -> Dict[str, Any]:
         ret = {}
 
-        for _, func in inspect.getmembers(self, inspect.ismethod):
-            if hasattr(func, "include_dict"):  # provided by @include_dict decorator
-                ret.update(func())
+        for name in self._include_dict_methods:
+            ret.update(getattr(self, name)())
 
         return ret
 
@@ -43,8 +53,13 @@ class BaseFilter(BaseParamMixin, HogQLParamMixin):
         return encode_get_request_params(data=self.to_dict())
 
     def toJSON(self):
+        # The hashes of this are persisted, e.g. as `Insight.filters_hash`, so its formatting mustn't change
         return json.dumps(self.to_dict(), default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
+    def to_canonical_json(self) -> str:
+        "Compact, key-sorted JSON of the filter, for cache keys that aren't persisted anywhere"
+        return json.dumps(self.to_dict(), default=lambda o: o.__dict__, sort_keys=True, separators=(",", ":"))
+
     def shallow_clone(self, overrides: Dict[str, Any]):
         "Clone the filter's data while sharing the HogQL context"
         return type(self)(data={**self._data, **overrides}, **{**self.kwargs, "hogql_context": self.hogql_context})
@@ -52,10 +67,13 @@ class BaseFilter(BaseParamMixin, HogQLParamMixin):
     def query_tags(self) -> Dict[str, Any]:
         ret = {}
 
-        for _, func in inspect.getmembers(self, inspect.ismethod):
-            if hasattr(func, "include_query_tags"):  # provided by @include_query_tags decorator
-                ret.update(func())
+        for name in self._include_query_tags_methods:
+            ret.update(getattr(self, name)())
 
         return ret
 
     __repr__ = sane_repr("_data", "kwargs", include_id=False)
+
+
+BaseFilter._include_dict_methods = collect_marked_methods(BaseFilter, "include_dict")
+BaseFilter._include_query_tags_methods = collect_marked_methods(BaseFilter, "include_query_tags")
@@ -49,6 +49,7 @@ from posthog.models.filters.mixins.groups import GroupsAggregationMixin
 from posthog.models.filters.mixins.interval import IntervalMixin
 from posthog.models.filters.mixins.property import PropertyMixin
 from posthog.models.filters.mixins.simplify import SimplifyFilterMixin
+from posthog.models.filters.mixins.utils import clear_cached_properties
 
 
 class Filter(
@@ -131,3 +132,5 @@ class Filter(
             if not self.is_simplified:
                 simplified_filter = self.simplify(kwargs["team"])
                 self._data = simplified_filter._data
+                # Simplifying computed properties of the data it replaced
+                clear_cached_properties(self)
@@ -1,10 +1,10 @@
-from typing import TYPE_CHECKING, Any, Dict, List, Literal, TypeVar, cast
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, TypeVar, cast
 
 from posthog.constants import PropertyOperatorType
 from posthog.models.property import GroupTypeIndex, PropertyGroup
 
 if TYPE_CHECKING:  # Avoid circular import
-    from posthog.models import Property, Team
+    from posthog.models import Cohort, Property, Team
 
 T = TypeVar("T")
 
@@ -23,37 +23,42 @@ class SimplifyFilterMixin:
         if self._data.get("is_simplified"):  # type: ignore
             return self
 
-        # :TRICKY: Make a copy to avoid caching issues
-        result: Any = self.shallow_clone({"is_simplified": True})  # type: ignore
+        overrides: Dict[str, Any] = {"is_simplified": True}
+        property_groups: PropertyGroup = self.property_groups  # type: ignore
 
-        if getattr(result, "filter_test_accounts", False):
+        if getattr(self, "filter_test_accounts", False):
             new_group = {"type": "AND", "values": team.test_account_filters}
             prop_group = (
-                {"type": "AND", "values": [new_group, result.property_groups.to_dict()]}
-                if result.property_groups.to_dict()
+                {"type": "AND", "values": [new_group, property_groups.to_dict()]}
+                if property_groups.to_dict()
                 else new_group
             )
-            result = result.shallow_clone({"properties": prop_group, "filter_test_accounts": False})
+            property_groups = self._parse_property_group(prop_group)  # type: ignore
+            overrides["filter_test_accounts"] = False
 
-        updated_entities = {}
-        if hasattr(result, "entities_to_dict"):
-            for entity_type, entities in result.entities_to_dict().items():
-                updated_entities[entity_type] = [self._simplify_entity(team, entity_type, entity, **kwargs) for entity in entities]  # type: ignore
+        entities = self.entities_to_dict() if hasattr(self, "entities_to_dict") else {}  # type: ignore
+        # Cohorts referred to anywhere in the filter are loaded in one go, rather than one query per property
+        if "cohorts" not in kwargs:
+            kwargs["cohorts"] = self._load_cohorts(team, property_groups, entities)
+
+        for entity_type, entity_list in entities.items():
+            overrides[entity_type] = [self._simplify_entity(team, entity_type, entity, **kwargs) for entity in entity_list]  # type: ignore
 
         from posthog.models.property.util import clear_excess_levels
 
-        prop_group = clear_excess_levels(self._simplify_property_group(team, result.property_groups, **kwargs), skip=True)  # type: ignore
+        prop_group = clear_excess_levels(self._simplify_property_group(team, property_groups, **kwargs), skip=True)  # type: ignore
         prop_group = prop_group.to_dict()  # type: ignore
 
         new_group_props = []
-        if getattr(result, "aggregation_group_type_index", None) is not None:
-            new_group_props.append(self._group_set_property(cast(int, result.aggregation_group_type_index)).to_dict())  # type: ignore
+        if getattr(self, "aggregation_group_type_index", None) is not None:
+            new_group_props.append(self._group_set_property(cast(int, self.aggregation_group_type_index)).to_dict())  # type: ignore
 
         if new_group_props:
             new_group = {"type": "AND", "values": new_group_props}
             prop_group = {"type": "AND", "values": [new_group, prop_group]} if prop_group else new_group
 
-        return result.shallow_clone({**updated_entities, "properties": prop_group})
+        # :TRICKY: Clone rather than modify this filter, which may be cached
+        return self.shallow_clone({**overrides, "properties": prop_group})  # type: ignore
 
     def _simplify_entity(
         self, team: "Team", entity_type: Literal["events", "actions", "exclusions"], entity_params: Dict, **kwargs
@@ -82,21 +87,27 @@ class SimplifyFilterMixin:
         new_groups = []
         for group in prop_group.values:
             if isinstance(group, PropertyGroup):
-                new_groups.append(self._simplify_property_group(team, group))
+                new_groups.append(self._simplify_property_group(team, group, **kwargs))
             elif isinstance(group, Property):
-                new_groups.append(self._simplify_property(team, group))
+                new_groups.append(self._simplify_property(team, group, **kwargs))
 
-        prop_group.values = new_groups
-        return prop_group
+        # A new group rather than updating `prop_group`, which belongs to the filter being simplified
+        return PropertyGroup(type=prop_group.type, values=new_groups)
 
-    def _simplify_property(self, team: "Team", property: "Property", **kwargs) -> "PropertyGroup":
+    def _simplify_property(
+        self, team: "Team", property: "Property", cohorts: Optional[Dict[int, "Cohort"]] = None, **kwargs
+    ) -> "PropertyGroup":
         if property.type == "cohort":
             from posthog.models import Cohort
             from posthog.models.cohort.util import simplified_cohort_filter_properties
 
+            cohort_id = _cohort_id(property.value)
             try:
-                cohort = Cohort.objects.get(pk=property.value, team_id=team.pk)
-            except Cohort.DoesNotExist:
+                if cohorts is not None and cohort_id is not None:
+                    cohort = cohorts[cohort_id]
+                else:
+                    cohort = Cohort.objects.get(pk=property.value, team_id=team.pk)
+            except (KeyError, Cohort.DoesNotExist):
                 # :TODO: Handle non-existing resource in-query instead
                 return PropertyGroup(type=PropertyOperatorType.AND, values=[property])
 
@@ -105,6 +116,22 @@ class SimplifyFilterMixin:
         # PropertyOperatorType doesn't really matter here, since only one value.
         return PropertyGroup(type=PropertyOperatorType.AND, values=[property])
 
+    def _load_cohorts(
+        self, team: "Team", property_groups: "PropertyGroup", entities: Dict[str, List[Dict]]
+    ) -> Dict[int, "Cohort"]:
+        from posthog.models import Cohort
+        from posthog.models.entity import Entity
+
+        properties = list(property_groups.flat)
+        for entity_list in entities.values():
+            for entity_params in entity_list:
+                properties.extend(Entity(entity_params).property_groups.flat)
+
+        cohort_ids = {_cohort_id(prop.value) for prop in properties if prop.type == "cohort"} - {None}
+        if not cohort_ids:
+            return {}
+        return {cohort.pk: cohort for cohort in Cohort.objects.filter(pk__in=cohort_ids, team_id=team.pk)}
+
     def _group_set_property(self, group_type_index: GroupTypeIndex) -> "Property":
         from posthog.models.property import Property
 
@@ -113,3 +140,10 @@ class SimplifyFilterMixin:
     @property
     def is_simplified(self) -> bool:
         return self._data.get("is_simplified", False)  # type: ignore
+
+
+def _cohort_id(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,79 @@
+import threading
+from unittest.mock import patch
+
+from posthog.models import Filter
+from posthog.models.filters.mixins.property import PropertyMixin
+from posthog.models.filters.mixins.utils import cached_property, clear_cached_properties
+
+
+class Counted:
+    computed = 0
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    @cached_property
+    def doubled(self) -> int:
+        Counted.computed += 1
+        return self.value * 2
+
+
+def test_cached_property_is_computed_once_per_instance():
+    Counted.computed = 0
+    first, second = Counted(1), Counted(2)
+
+    # Alternating between instances used to evict the single cached value
+    for _ in range(3):
+        assert first.doubled == 2
+        assert second.doubled == 4
+
+    assert Counted.computed == 2
+
+
+def test_cached_property_is_accessible_on_the_class():
+    assert isinstance(Counted.doubled, cached_property)
+    assert Counted.doubled.attrname == "doubled"
+
+
+def test_clear_cached_properties():
+    instance = Counted(1)
+    assert instance.doubled == 2
+
+    instance.value = 5
+    clear_cached_properties(instance)
+
+    assert instance.doubled == 10
+
+
+def test_cached_property_returns_the_first_stored_value_to_all_threads():
+    computing = threading.Barrier(2)
+
+    class Slow:
+        @cached_property
+        def value(self) -> object:
+            computing.wait(timeout=5)
+            return object()
+
+    instance = Slow()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(instance.value)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results[0] is results[1] is instance.value
+
+
+def test_filter_property_groups_are_parsed_once_per_filter():
+    filter = Filter(data={"properties": {"type": "AND", "values": [{"key": "$browser", "value": "Chrome"}]}})
+    clone = filter.shallow_clone({"properties": {"type": "AND", "values": [{"key": "$browser", "value": "Safari"}]}})
+
+    with patch.object(
+        PropertyMixin, "_parse_property_group", autospec=True, side_effect=PropertyMixin._parse_property_group
+    ) as parse_property_group:
+        for _ in range(3):
+            assert filter.property_groups.values[0].value == "Chrome"
+            assert clone.property_groups.values[0].value == "Safari"
+
+    assert parse_property_group.call_count == 2
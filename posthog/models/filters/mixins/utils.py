@@ -1,13 +1,51 @@
-from functools import lru_cache
-from typing import Callable, Optional, TypeVar, Union
+import inspect
+from typing import Any, Callable, Generic, Optional, Tuple, TypeVar, Union, overload
 
 from posthog.utils import str_to_bool
 
 T = TypeVar("T")
 
-# can't use cached_property directly from functools because of 3.7 compatibilty
-def cached_property(func: Callable[..., T]) -> T:
-    return property(lru_cache(maxsize=1)(func))  # type: ignore
+
+class cached_property(Generic[T]):
+    """
+    Computes a property once per instance, storing the value in the instance's `__dict__` where it shadows the
+    property from then on. Like `functools.cached_property`, which before Python 3.12 serializes computing the
+    property across all instances of a class behind a single lock.
+
+    Threads accessing the property of the same instance concurrently for the first time may each compute it, but
+    all of them get the value stored first. Clones, e.g. from `shallow_clone`, are new instances and so compute
+    their own values. Use `clear_cached_properties` after changing what the properties of an instance depend on.
+    """
+
+    def __init__(self, func: Callable[[Any], T]) -> None:
+        self.func = func
+        self.attrname = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.attrname = name
+
+    @overload
+    def __get__(self, instance: None, owner: Optional[type] = None) -> "cached_property[T]":
+        ...
+
+    @overload
+    def __get__(self, instance: object, owner: Optional[type] = None) -> T:
+        ...
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = self.func(instance)
+        return instance.__dict__.setdefault(self.attrname, value)
+
+
+def clear_cached_properties(instance: object) -> None:
+    """Drops the values of `instance`'s cached properties, for them to be computed again when next accessed"""
+    for klass in type(instance).__mro__:
+        for name, attribute in vars(klass).items():
+            if isinstance(attribute, cached_property):
+                instance.__dict__.pop(name, None)
 
 
 def include_dict(f):
@@ -26,6 +64,18 @@ def include_query_tags(f):
     return f
 
 
+def collect_marked_methods(cls: type, marker: str) -> Tuple[str, ...]:
+    """
+    Names of the methods of `cls` marked with `marker` by `include_dict` or `include_query_tags`, sorted by name like
+    `inspect.getmembers` returns them. Looked up statically, so that no property of an instance is evaluated.
+    """
+    return tuple(
+        name
+        for name in sorted(dir(cls))
+        if inspect.isfunction(function := inspect.getattr_static(cls, name)) and getattr(function, marker, False)
+    )
+
+
 def process_bool(bool_to_test: Optional[Union[str, bool]]) -> bool:
     if isinstance(bool_to_test, bool):
         return bool_to_test
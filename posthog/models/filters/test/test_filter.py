@@ -1,4 +1,5 @@
 import datetime
+import inspect
 import json
 from typing import Any, Callable, Dict, List, Optional, cast
 
@@ -6,6 +7,9 @@ from django.db.models import Q
 
 from posthog.constants import FILTER_TEST_ACCOUNTS
 from posthog.models import Cohort, Filter, Person, Team
+from posthog.models.filters.path_filter import PathFilter
+from posthog.models.filters.retention_filter import RetentionFilter
+from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.property import Property
 from posthog.queries.base import properties_to_Q, property_group_to_Q
 from posthog.test.base import (
@@ -58,6 +62,26 @@ class TestFilter(BaseTest):
             ],
         )
 
+    def test_to_dict_and_query_tags_use_all_marked_methods(self):
+        for filter_class in (Filter, RetentionFilter, PathFilter, StickinessFilter):
+            methods = inspect.getmembers(filter_class, inspect.isfunction)
+
+            self.assertEqual(
+                list(filter_class._include_dict_methods),
+                [name for name, method in methods if hasattr(method, "include_dict")],
+            )
+            self.assertEqual(
+                list(filter_class._include_query_tags_methods),
+                [name for name, method in methods if hasattr(method, "include_query_tags")],
+            )
+
+    def test_to_canonical_json(self):
+        filter = Filter(data={"events": [{"id": "$pageview"}], "date_from": "-7d", "interval": "day"})
+
+        self.assertEqual(json.loads(filter.to_canonical_json()), json.loads(filter.toJSON()))
+        self.assertNotIn(" ", filter.to_canonical_json())
+        self.assertIn('\n    "date_from": "-7d",\n', filter.toJSON())
+
     def test_simplify_test_accounts(self):
         self.team.test_account_filters = [
             {"key": "email", "value": "@posthog.com", "operator": "not_icontains", "type": "person"}
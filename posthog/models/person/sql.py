@@ -291,6 +291,38 @@ GROUP BY distinct_id
 HAVING argMax(is_deleted, version) = 0
 """
 
+# Latest properties and distinct_ids of the given persons. Distinct_ids are looked up only among those that ever
+# pointed to one of the persons, rather than among all of the team's
+GET_PERSONS_WITH_DISTINCT_IDS_BY_UUIDS = """
+SELECT person.id, person.created_at, person.properties, person.is_identified, pdi.distinct_ids
+FROM (
+    SELECT
+        id,
+        argMax(created_at, version) AS created_at,
+        argMax(properties, version) AS properties,
+        argMax(is_identified, version) AS is_identified
+    FROM person
+    WHERE team_id = %(team_id)s AND id IN %(person_ids)s
+    GROUP BY id
+    HAVING argMax(is_deleted, version) = 0
+) AS person
+LEFT JOIN (
+    -- Ordered by when each distinct_id was first seen, like Postgres orders them by id
+    SELECT person_id, arrayMap(x -> x.2, arraySort(groupArray((first_seen, distinct_id)))) AS distinct_ids
+    FROM (
+        SELECT distinct_id, argMax(person_id, version) AS person_id, min(_timestamp) AS first_seen
+        FROM person_distinct_id2
+        WHERE team_id = %(team_id)s AND distinct_id IN (
+            SELECT distinct_id FROM person_distinct_id2 WHERE team_id = %(team_id)s AND person_id IN %(person_ids)s
+        )
+        GROUP BY distinct_id
+        HAVING argMax(is_deleted, version) = 0
+    )
+    WHERE person_id IN %(person_ids)s
+    GROUP BY person_id
+) AS pdi ON pdi.person_id = person.id
+"""
+
 GET_PERSON_IDS_BY_FILTER = """
 SELECT DISTINCT p.id
 FROM ({latest_person_sql}) AS p
@@ -20,7 +20,7 @@ from posthog.models.signals import mutable_receiver
 from posthog.models.team import Team
 from posthog.plugins.access import can_configure_plugins, can_install_plugins
 from posthog.plugins.reload import reload_plugins_on_workers
-from posthog.plugins.site import get_decide_site_apps
+from posthog.plugins.site import clear_decide_site_apps_cache, get_decide_site_apps
 from posthog.plugins.utils import (
     download_plugin_archive,
     extract_plugin_code,
@@ -463,6 +463,7 @@ def plugin_config_reload_needed(sender, instance, created=None, **kwargs):
     except Team.DoesNotExist:
         team = None
     if team is not None:
+        clear_decide_site_apps_cache(team.pk)
         sync_team_inject_web_apps(instance.team)
 
 
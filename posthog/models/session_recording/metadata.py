@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Dict, List, Optional, TypedDict, Union
+from typing import Any, Dict, Iterator, List, Optional, TypedDict, Union
 
 SnapshotData = Dict
 WindowId = Optional[str]
@@ -47,6 +47,13 @@ class DecompressedRecordingData(TypedDict):
     snapshot_data_by_window_id: Dict[WindowId, List[Union[SnapshotData, SessionRecordingEventSummary]]]
 
 
+class StreamedRecordingData(TypedDict):
+    has_next: bool
+    next_offset: int
+    # Events are decoded lazily, as each iterator is consumed
+    snapshot_data_by_window_id: Dict[WindowId, Iterator[SnapshotData]]
+
+
 class RecordingMetadata(TypedDict):
     distinct_id: str
     segments: List[RecordingSegment]
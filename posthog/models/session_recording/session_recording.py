@@ -1,5 +1,6 @@
 from typing import Any, List, Optional
 
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Count
 from django.dispatch import receiver
@@ -11,6 +12,7 @@ from posthog.models.session_recording.metadata import (
     DecompressedRecordingData,
     RecordingMatchingEvents,
     RecordingMetadata,
+    StreamedRecordingData,
 )
 from posthog.models.session_recording_event.session_recording_event import SessionRecordingViewed
 from posthog.models.team.team import Team
@@ -100,6 +102,30 @@ class SessionRecording(UUIDModel):
 
             self._snapshots = snapshots
 
+    def stream_snapshots(self, max_bytes: int, offset: int = 0) -> Optional[StreamedRecordingData]:
+        """
+        Lazily decoded snapshots, paginated by stored bytes. Recordings persisted to object storage are
+        already loaded in one go, so they are returned as a single page.
+        """
+        from posthog.queries.session_recordings.session_recording_events import SessionRecordingEvents
+
+        if self.object_storage_path:
+            self.load_object_data()
+            if not self._snapshots:
+                return None
+            return {
+                "has_next": False,
+                "next_offset": 0,
+                "snapshot_data_by_window_id": {
+                    window_id: iter(snapshot_data)
+                    for window_id, snapshot_data in self._snapshots["snapshot_data_by_window_id"].items()
+                },
+            }
+
+        return SessionRecordingEvents(
+            team=self.team, session_recording_id=self.session_id, recording_start_time=self.start_time
+        ).stream_snapshots(max_bytes, offset)
+
     def load_object_data(self) -> None:
         try:
             from ee.models.session_recording_extensions import load_persisted_recording
@@ -223,3 +249,14 @@ class SessionRecording(UUIDModel):
 def attempt_persist_recording(sender, instance: SessionRecording, created: bool, **kwargs):
     if created:
         ee_persist_single_recording.delay(instance.session_id, instance.team_id)
+
+
+@receiver(models.signals.post_save, sender=SessionRecording)
+def clear_recording_existence_cache(sender, instance: SessionRecording, **kwargs):
+    if instance.deleted:
+        cache.delete(session_recording_exists_cache_key(instance.team_id, instance.session_id))
+
+
+def session_recording_exists_cache_key(team_id: int, session_id: str) -> str:
+    """Key of whether the session has a recording that isn't deleted, see `ActorBaseQuery`"""
+    return f"session_recording_exists_{team_id}_{session_id}"
@@ -2,9 +2,19 @@ from dataclasses import asdict, dataclass
 from hashlib import md5
 from typing import TYPE_CHECKING, List, Optional
 
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import Counter
+
 if TYPE_CHECKING:
     from posthog.models import Team
 
+DECIDE_SITE_APPS_CACHE_COUNTER = Counter(
+    "decide_site_apps_cache",
+    "Lookups of a team's site apps in the cache used by /decide, per result (hit or miss).",
+    labelnames=["result"],
+)
+
 
 @dataclass
 class WebJsSource:
@@ -42,7 +52,18 @@ def get_transpiled_site_source(id: int, token: str) -> Optional[WebJsSource]:
     return WebJsSource(*(list(response)))  # type: ignore
 
 
-def get_decide_site_apps(team: "Team") -> List[dict]:
+def get_decide_site_apps(team: "Team", use_cache: bool = False) -> List[dict]:
+    if use_cache:
+        cache_key = _decide_site_apps_cache_key(team.pk)
+        site_apps = cache.get(cache_key)
+        if site_apps is not None:
+            DECIDE_SITE_APPS_CACHE_COUNTER.labels(result="hit").inc()
+            return site_apps
+        DECIDE_SITE_APPS_CACHE_COUNTER.labels(result="miss").inc()
+        site_apps = get_decide_site_apps(team)
+        cache.set(cache_key, site_apps, settings.SITE_APPS_CACHE_TTL)
+        return site_apps
+
     from posthog.models import PluginConfig, PluginSourceFile
 
     sources = (
@@ -63,6 +84,14 @@ def get_decide_site_apps(team: "Team") -> List[dict]:
     return [asdict(WebJsUrl(source[0], site_app_url(source))) for source in sources]
 
 
+def clear_decide_site_apps_cache(team_id: int) -> None:
+    cache.delete(_decide_site_apps_cache_key(team_id))
+
+
+def _decide_site_apps_cache_key(team_id: int) -> str:
+    return f"team_decide_site_apps_{team_id}"
+
+
 def get_site_config_from_schema(config_schema: Optional[List[dict]], config: Optional[dict]):
     if not config or not config_schema:
         return {}
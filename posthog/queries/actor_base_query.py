@@ -1,8 +1,10 @@
+import json
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import (
     Any,
     Dict,
+    Iterable,
     List,
     Literal,
     Optional,
@@ -13,6 +15,8 @@ from typing import (
     cast,
 )
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import OuterRef, Subquery
 from django.db.models.query import Prefetch, QuerySet
 
@@ -23,8 +27,15 @@ from posthog.models.filters.retention_filter import RetentionFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.group import Group
 from posthog.models.person import Person
+from posthog.models.person.sql import GET_PERSONS_WITH_DISTINCT_IDS_BY_UUIDS
+from posthog.models.session_recording.session_recording import session_recording_exists_cache_key
 from posthog.queries.insight import insight_sync_execute
 
+# How long whether a session has a recording is cached for. Sessions without one can still get it as recordings are
+# ingested, so that's only cached briefly
+SESSION_RECORDING_EXISTS_CACHE_TTL = 24 * 60 * 60
+SESSION_RECORDING_MISSING_CACHE_TTL = 5 * 60
+
 
 class EventInfoForRecording(TypedDict):
     uuid: uuid.UUID
@@ -94,6 +105,11 @@ class ActorBaseQuery:
     def is_aggregating_by_groups(self) -> bool:
         return self.aggregation_group_type_index is not None
 
+    @property
+    def hydrates_actors_from_clickhouse(self) -> bool:
+        """Whether persons are loaded from ClickHouse rather than Postgres, and recordings checked through a cache"""
+        return settings.ACTORS_FROM_CLICKHOUSE and not self.is_aggregating_by_groups
+
     def get_actors(
         self,
     ) -> Tuple[Union[QuerySet[Person], QuerySet[Group]], Union[List[SerializedGroup], List[SerializedPerson]], int]:
@@ -102,7 +118,10 @@ class ActorBaseQuery:
         raw_result = insight_sync_execute(
             query, {**params, **self._filter.hogql_context.values}, query_type=self.QUERY_TYPE, filter=self._filter
         )
-        actors, serialized_actors = self.get_actors_from_result(raw_result)
+        if self.hydrates_actors_from_clickhouse:
+            actors, serialized_actors = self.get_actors_from_clickhouse_result(raw_result)
+        else:
+            actors, serialized_actors = self.get_actors_from_result(raw_result)
 
         if hasattr(self._filter, "include_recordings") and self._filter.include_recordings and self._filter.insight in [INSIGHT_PATHS, INSIGHT_TRENDS, INSIGHT_FUNNELS]:  # type: ignore
             serialized_actors = self.add_matched_recordings_to_serialized_actors(serialized_actors, raw_result)
@@ -125,6 +144,36 @@ class ActorBaseQuery:
         )
         return {row[0] for row in raw_result}
 
+    def get_session_ids_with_recordings(self, session_ids: Set[str]) -> Set[str]:
+        session_ids_with_all_recordings = self.query_for_session_ids_with_recordings(session_ids)
+
+        # Prune out deleted recordings
+        session_ids_with_deleted_recordings = set(
+            SessionRecording.objects.filter(
+                team=self._team, session_id__in=session_ids_with_all_recordings, deleted=True
+            ).values_list("session_id", flat=True)
+        )
+        return session_ids_with_all_recordings.difference(session_ids_with_deleted_recordings)
+
+    def get_cached_session_ids_with_recordings(self, session_ids: Set[str]) -> Set[str]:
+        """Like `get_session_ids_with_recordings`, only querying sessions that weren't looked up recently"""
+        keys = {session_id: session_recording_exists_cache_key(self._team.pk, session_id) for session_id in session_ids}
+        cached = cache.get_many(list(keys.values()))
+        session_ids_with_recordings = {session_id for session_id, key in keys.items() if cached.get(key)}
+
+        uncached_session_ids = {session_id for session_id, key in keys.items() if key not in cached}
+        if uncached_session_ids:
+            found_session_ids = self.get_session_ids_with_recordings(uncached_session_ids)
+            session_ids_with_recordings |= found_session_ids
+            cache.set_many(
+                {keys[session_id]: True for session_id in found_session_ids}, SESSION_RECORDING_EXISTS_CACHE_TTL
+            )
+            cache.set_many(
+                {keys[session_id]: False for session_id in uncached_session_ids - found_session_ids},
+                SESSION_RECORDING_MISSING_CACHE_TTL,
+            )
+        return session_ids_with_recordings
+
     def add_matched_recordings_to_serialized_actors(
         self, serialized_actors: Union[List[SerializedGroup], List[SerializedPerson]], raw_result
     ) -> Union[List[SerializedGroup], List[SerializedPerson]]:
@@ -137,15 +186,10 @@ class ActorBaseQuery:
                     if event[2]:
                         all_session_ids.add(event[2])
 
-        session_ids_with_all_recordings = self.query_for_session_ids_with_recordings(all_session_ids)
-
-        # Prune out deleted recordings
-        session_ids_with_deleted_recordings = set(
-            SessionRecording.objects.filter(
-                team=self._team, session_id__in=session_ids_with_all_recordings, deleted=True
-            ).values_list("session_id", flat=True)
-        )
-        session_ids_with_recordings = session_ids_with_all_recordings.difference(session_ids_with_deleted_recordings)
+        if self.hydrates_actors_from_clickhouse:
+            session_ids_with_recordings = self.get_cached_session_ids_with_recordings(all_session_ids)
+        else:
+            session_ids_with_recordings = self.get_session_ids_with_recordings(all_session_ids)
 
         matched_recordings_by_actor_id: Dict[Union[uuid.UUID, str], List[MatchedRecording]] = {}
         for row in raw_result:
@@ -197,6 +241,12 @@ class ActorBaseQuery:
 
         return actors, serialized_actors
 
+    def get_actors_from_clickhouse_result(self, raw_result) -> Tuple[QuerySet[Person], List[SerializedPerson]]:
+        """Like `get_actors_from_result` for persons, but loading them from ClickHouse and keeping the query's order"""
+        actor_ids = [row[0] for row in raw_result]
+        value_per_actor_id = {str(row[0]): row[1] for row in raw_result} if self.ACTOR_VALUES_INCLUDED else None
+        return get_people_from_clickhouse(self._team.pk, actor_ids, value_per_actor_id)
+
 
 def get_groups(
     team_id: int, group_type_index: int, group_ids: List[Any], value_per_actor_id: Optional[Dict[str, float]] = None
@@ -232,7 +282,40 @@ def get_people(
     return persons, serialize_people(persons, value_per_actor_id)
 
 
-def serialize_people(data: QuerySet[Person], value_per_actor_id: Optional[Dict[str, float]]) -> List[SerializedPerson]:
+def get_people_from_clickhouse(
+    team_id: int, people_ids: List[Any], value_per_actor_id: Optional[Dict[str, float]] = None
+) -> Tuple[QuerySet[Person], List[SerializedPerson]]:
+    """
+    Get people from raw SQL results in data model and dict formats, with the dicts built from the ClickHouse person
+    tables in the order of `people_ids`. The queryset isn't evaluated here, it's only there for callers that need it.
+    """
+    persons: QuerySet[Person] = Person.objects.filter(team_id=team_id, uuid__in=people_ids)
+    if not people_ids:
+        return persons, []
+
+    rows = insight_sync_execute(
+        GET_PERSONS_WITH_DISTINCT_IDS_BY_UUIDS,
+        {"team_id": team_id, "person_ids": [str(person_id) for person_id in people_ids]},
+        query_type="actors_from_clickhouse",
+    )
+    person_by_uuid: Dict[str, Person] = {}
+    for person_uuid, created_at, properties, is_identified, distinct_ids in rows:
+        person = Person(
+            team_id=team_id,
+            uuid=person_uuid,
+            created_at=created_at.replace(tzinfo=timezone.utc),
+            properties=json.loads(properties),
+            is_identified=bool(is_identified),
+        )
+        person.distinct_ids_cache = [PersonDistinctId(distinct_id=distinct_id) for distinct_id in distinct_ids]
+        person_by_uuid[str(person_uuid)] = person
+
+    # Persons that aren't in ClickHouse yet are left out, as they are when they're not in Postgres
+    ordered_people = [person_by_uuid[str(person_id)] for person_id in people_ids if str(person_id) in person_by_uuid]
+    return persons, serialize_people(ordered_people, value_per_actor_id)
+
+
+def serialize_people(data: Iterable[Person], value_per_actor_id: Optional[Dict[str, float]]) -> List[SerializedPerson]:
     from posthog.api.person import get_person_name
 
     return [
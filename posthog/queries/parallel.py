@@ -0,0 +1,213 @@
+# Runs the independent queries of an insight (e.g. one per series) on a shared, bounded thread pool.
+#
+# The pool is shared by every request handled by the process, so a dashboard full of many-series
+# insights can't open an unbounded number of ClickHouse queries. Each team is additionally capped in how
+# many of the pool's workers it can hold at once, so one team can't starve the others.
+
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, Generic, List, Optional, Sequence, TypeVar
+
+from django.conf import settings
+from django.db import close_old_connections
+from prometheus_client import Counter, Histogram
+
+from posthog.clickhouse.query_tagging import get_query_tags, reset_query_tags, tag_queries
+
+T = TypeVar("T")
+
+PARALLEL_QUERY_QUEUE_WAIT_HISTOGRAM = Histogram(
+    "insight_parallel_query_queue_wait_seconds",
+    "Time a parallel insight query waited for a team slot and a pool worker before starting.",
+    labelnames=["kind"],
+)
+PARALLEL_QUERY_EXECUTION_HISTOGRAM = Histogram(
+    "insight_parallel_query_execution_seconds",
+    "Time a parallel insight query ran for once it got a pool worker.",
+    labelnames=["kind"],
+)
+PARALLEL_QUERY_OUTCOME_COUNTER = Counter(
+    "insight_parallel_query_outcome",
+    "Parallel insight queries by outcome, one of success, error or cancelled.",
+    labelnames=["kind", "outcome"],
+)
+
+
+class ParallelQueryCancelled(Exception):
+    pass
+
+
+@dataclass
+class ParallelResult(Generic[T]):
+    value: Optional[T] = None
+    error: Optional[BaseException] = None
+
+    def get(self) -> T:
+        if self.error is not None:
+            raise self.error
+        return self.value  # type: ignore
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+# Number of queries each team currently has submitted to the pool. Teams are removed once they have
+# none in flight so this doesn't grow with the number of teams a long-lived worker has served.
+_team_in_flight: Dict[int, int] = {}
+_team_condition = threading.Condition()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Threads don't survive a fork, so a pool inherited from e.g. a celery parent process is unusable
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INSIGHT_PARALLEL_QUERY_WORKERS, thread_name_prefix="insight-query"
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def run_in_parallel(
+    team_id: int,
+    tasks: Sequence[Callable[[], T]],
+    *,
+    kind: str,
+    timeout: Optional[float] = None,
+    fail_fast: bool = False,
+) -> List[ParallelResult[T]]:
+    """
+    Run `tasks` on the shared pool, returning their results in the same order.
+
+    A failing task doesn't affect the others, its exception is returned in its `ParallelResult`. With
+    `fail_fast`, the tasks that haven't started yet are cancelled as soon as one fails, for callers that
+    can't use partial results anyway. An exception raised while waiting in the calling thread, such as a
+    worker timeout, cancels the tasks that haven't started yet too. Query tags of the calling thread are
+    carried over to the tasks.
+
+    Tasks mustn't call `run_in_parallel` themselves, as they would hold a worker while waiting for another.
+    """
+    aborted = threading.Event()
+    is_cancelled = aborted.is_set
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    query_tags = get_query_tags().copy()
+    executor = get_executor()
+
+    futures: List[Optional[Future]] = []
+    try:
+        for task in tasks:
+            enqueued_at = time.perf_counter()
+            if not _acquire_team_slot(team_id, deadline, is_cancelled):
+                futures.append(None)
+                continue
+            try:
+                future = executor.submit(_run_task, task, kind, query_tags, enqueued_at, is_cancelled)
+            except BaseException:
+                _release_team_slot(team_id)
+                raise
+            future.add_done_callback(partial(_on_task_done, team_id, aborted if fail_fast else None))
+            futures.append(future)
+
+        results: List[ParallelResult[T]] = []
+        for future in futures:
+            results.append(_collect(future, kind, deadline, aborted, fail_fast))
+        return results
+    finally:
+        aborted.set()
+        for future in futures:
+            if future is not None:
+                future.cancel()
+
+
+def get_values(results: Sequence[ParallelResult[T]]) -> List[T]:
+    """
+    Values of `results`, raising the first error if any failed. Errors other than cancellations go first, as with
+    `fail_fast` the cancellation of a task is only the consequence of another one failing.
+    """
+    errors = [result.error for result in results if result.error is not None]
+    if errors:
+        raise next((error for error in errors if not isinstance(error, ParallelQueryCancelled)), errors[0])
+    return [result.value for result in results]  # type: ignore
+
+
+def _collect(
+    future: Optional[Future], kind: str, deadline: Optional[float], aborted: threading.Event, fail_fast: bool
+) -> ParallelResult:
+    if future is None:
+        PARALLEL_QUERY_OUTCOME_COUNTER.labels(kind=kind, outcome="cancelled").inc()
+        return ParallelResult(error=ParallelQueryCancelled())
+
+    try:
+        remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+        value = future.result(timeout=remaining)
+    except (CancelledError, ParallelQueryCancelled, FutureTimeoutError):
+        aborted.set()
+        PARALLEL_QUERY_OUTCOME_COUNTER.labels(kind=kind, outcome="cancelled").inc()
+        return ParallelResult(error=ParallelQueryCancelled())
+    except Exception as err:
+        if fail_fast:
+            aborted.set()
+        PARALLEL_QUERY_OUTCOME_COUNTER.labels(kind=kind, outcome="error").inc()
+        return ParallelResult(error=err)
+
+    PARALLEL_QUERY_OUTCOME_COUNTER.labels(kind=kind, outcome="success").inc()
+    return ParallelResult(value=value)
+
+
+def _run_task(
+    task: Callable[[], T], kind: str, query_tags: Dict, enqueued_at: float, is_cancelled: Callable[[], bool]
+) -> T:
+    started_at = time.perf_counter()
+    PARALLEL_QUERY_QUEUE_WAIT_HISTOGRAM.labels(kind=kind).observe(started_at - enqueued_at)
+    if is_cancelled():
+        raise ParallelQueryCancelled()
+
+    # Pool threads are reused across requests, so tags must not leak from one task to the next
+    reset_query_tags()
+    tag_queries(**query_tags)
+    try:
+        return task()
+    finally:
+        PARALLEL_QUERY_EXECUTION_HISTOGRAM.labels(kind=kind).observe(time.perf_counter() - started_at)
+        reset_query_tags()
+        close_old_connections()
+
+
+def _on_task_done(team_id: int, abort_on_error: Optional[threading.Event], future: Future) -> None:
+    _release_team_slot(team_id)
+    # Checked here rather than when collecting results so that tasks not submitted yet are skipped too
+    if abort_on_error is not None and not future.cancelled() and future.exception() is not None:
+        abort_on_error.set()
+
+
+def _acquire_team_slot(team_id: int, deadline: Optional[float], is_cancelled: Callable[[], bool]) -> bool:
+    with _team_condition:
+        while _team_in_flight.get(team_id, 0) >= settings.INSIGHT_PARALLEL_QUERY_TEAM_LIMIT:
+            if is_cancelled():
+                return False
+            wait_for = 1.0
+            if deadline is not None:
+                wait_for = min(deadline - time.monotonic(), wait_for)
+                if wait_for <= 0:
+                    return False
+            # Woken up when a slot is released, the timeout is only there to notice cancellation
+            _team_condition.wait(timeout=wait_for)
+        _team_in_flight[team_id] = _team_in_flight.get(team_id, 0) + 1
+        return True
+
+
+def _release_team_slot(team_id: int) -> None:
+    with _team_condition:
+        remaining = _team_in_flight.get(team_id, 0) - 1
+        if remaining > 0:
+            _team_in_flight[team_id] = remaining
+        else:
+            _team_in_flight.pop(team_id, None)
+        _team_condition.notify_all()
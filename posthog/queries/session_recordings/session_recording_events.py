@@ -13,6 +13,7 @@ from posthog.models.session_recording.metadata import (
     SessionRecordingEvent,
     SessionRecordingEventSummary,
     SnapshotDataTaggedWithWindowId,
+    StreamedRecordingData,
     WindowId,
 )
 from posthog.session_recordings.session_recording_helpers import (
@@ -20,6 +21,7 @@ from posthog.session_recordings.session_recording_helpers import (
     generate_inactive_segments_for_range,
     get_active_segments_from_event_list,
     parse_snapshot_timestamp,
+    stream_chunked_snapshot_data,
 )
 from posthog.utils import flatten
 
@@ -109,6 +111,21 @@ class SessionRecordingEvents:
             return None
         return decompressed
 
+    def stream_snapshots(self, max_bytes: int, offset: int) -> Optional[StreamedRecordingData]:
+        all_snapshots = [
+            SnapshotDataTaggedWithWindowId(
+                window_id=recording_snapshot["window_id"], snapshot_data=recording_snapshot["snapshot_data"]
+            )
+            for recording_snapshot in self._query_recording_snapshots(include_snapshots=True)
+        ]
+        streamed = stream_chunked_snapshot_data(
+            self._team.pk, self._session_recording_id, all_snapshots, max_bytes, offset
+        )
+
+        if streamed["snapshot_data_by_window_id"] == {}:
+            return None
+        return streamed
+
     def get_metadata(self) -> Optional[RecordingMetadata]:
         snapshots = self._query_recording_snapshots(include_snapshots=False)
 
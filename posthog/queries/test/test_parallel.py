@@ -0,0 +1,109 @@
+import threading
+import time
+
+from django.test import TestCase, override_settings
+
+from posthog.clickhouse.query_tagging import get_query_tags, reset_query_tags, tag_queries
+from posthog.queries import parallel
+from posthog.queries.parallel import ParallelQueryCancelled, ParallelResult, get_values, run_in_parallel
+
+
+class TestRunInParallel(TestCase):
+    def tearDown(self):
+        reset_query_tags()
+        super().tearDown()
+
+    def test_returns_results_in_task_order(self):
+        def task(index):
+            # Finish in reverse order of submission
+            time.sleep((5 - index) * 0.01)
+            return index
+
+        results = run_in_parallel(1, [lambda index=index: task(index) for index in range(5)], kind="test")
+
+        self.assertEqual([result.get() for result in results], [0, 1, 2, 3, 4])
+
+    def test_failures_are_isolated(self):
+        def fail():
+            raise ValueError("boom")
+
+        results = run_in_parallel(1, [lambda: 1, fail, lambda: 3], kind="test")
+
+        self.assertEqual(results[0].get(), 1)
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertEqual(results[2].get(), 3)
+        with self.assertRaises(ValueError):
+            results[1].get()
+
+    def test_fail_fast_cancels_tasks_not_started_yet(self):
+        started = []
+
+        def fail():
+            raise ValueError("boom")
+
+        def task(index):
+            started.append(index)
+            return index
+
+        with override_settings(INSIGHT_PARALLEL_QUERY_TEAM_LIMIT=1):
+            results = run_in_parallel(
+                1, [fail] + [lambda index=index: task(index) for index in range(5)], kind="test", fail_fast=True
+            )
+
+        self.assertIsInstance(results[0].error, ValueError)
+        self.assertTrue(any(isinstance(result.error, ParallelQueryCancelled) for result in results[1:]))
+        self.assertLess(len(started), 5)
+
+    def test_get_values_raises_the_failure_rather_than_the_cancellations_it_caused(self):
+        results = [
+            ParallelResult(error=ParallelQueryCancelled()),
+            ParallelResult(value=1),
+            ParallelResult(error=ValueError("boom")),
+        ]
+
+        with self.assertRaises(ValueError):
+            get_values(results)
+        with self.assertRaises(ParallelQueryCancelled):
+            get_values(results[:2])
+        self.assertEqual(get_values([ParallelResult(value=1), ParallelResult(value=2)]), [1, 2])
+
+    def test_timeout_cancels_slow_tasks(self):
+        results = run_in_parallel(1, [lambda: time.sleep(1), lambda: 2], kind="test", timeout=0.05)
+
+        self.assertIsInstance(results[0].error, ParallelQueryCancelled)
+
+    def test_limits_concurrency_per_team(self):
+        lock = threading.Lock()
+        running = {1: 0, 2: 0}
+        max_running = {1: 0, 2: 0}
+
+        def task(team_id):
+            with lock:
+                running[team_id] += 1
+                max_running[team_id] = max(max_running[team_id], running[team_id])
+            time.sleep(0.02)
+            with lock:
+                running[team_id] -= 1
+
+        def run_for_team(team_id):
+            run_in_parallel(team_id, [lambda: task(team_id) for _ in range(8)], kind="test")
+
+        with override_settings(INSIGHT_PARALLEL_QUERY_TEAM_LIMIT=2):
+            threads = [threading.Thread(target=run_for_team, args=(team_id,)) for team_id in (1, 2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(max_running, {1: 2, 2: 2})
+        self.assertEqual(parallel._team_in_flight, {})
+
+    def test_carries_query_tags_over_without_leaking_them(self):
+        tag_queries(kind="request", id="/api/insight")
+
+        results = run_in_parallel(1, [lambda: get_query_tags().copy()], kind="test")
+        self.assertEqual(results[0].get(), {"kind": "request", "id": "/api/insight"})
+
+        reset_query_tags()
+        results = run_in_parallel(1, [lambda: get_query_tags().copy()], kind="test")
+        self.assertEqual(results[0].get(), {})
@@ -1,13 +1,18 @@
+from unittest.mock import patch
 from uuid import UUID
 
 from dateutil.relativedelta import relativedelta
+from django.test import override_settings
 from django.utils import timezone
 from freezegun.api import freeze_time
 
+from posthog.client import sync_execute
 from posthog.models.entity import Entity
 from posthog.models.filters import Filter
 from posthog.models.group.util import create_group
 from posthog.models.group_type_mapping import GroupTypeMapping
+from posthog.models.person.person import PersonDistinctId
+from posthog.models.person.sql import BULK_INSERT_PERSON_DISTINCT_ID2
 from posthog.queries.trends.trends_actors import TrendsActors
 from posthog.session_recordings.test.test_factory import create_session_recording_events
 from posthog.test.base import (
@@ -85,6 +90,73 @@ class TestPerson(ClickhouseTestMixin, APIBaseTest):
             ],
         )
 
+    @freeze_time("2021-01-21T20:00:00.000Z")
+    def test_persons_from_clickhouse_match_persons_from_postgres(self):
+        _create_person(team_id=self.team.pk, distinct_ids=["u1"], properties={"email": "bla"})
+        person = _create_person(team_id=self.team.pk, distinct_ids=["u2"], properties={"plan": "free"})
+        # Added later, so the name comes from "u2" even though "anonymous" sorts first
+        PersonDistinctId.objects.bulk_create(
+            [PersonDistinctId(person=person, distinct_id="anonymous", team_id=self.team.pk)]
+        )
+        sync_execute(
+            BULK_INSERT_PERSON_DISTINCT_ID2
+            + "(%(distinct_id)s, %(person_id)s, %(team_id)s, 0, 0, now() + INTERVAL 1 MINUTE, 0, 0)",
+            {"distinct_id": "anonymous", "person_id": str(person.uuid), "team_id": self.team.pk},
+        )
+        for distinct_id in ["u1", "u2", "u2"]:
+            _create_event(event="pageview", distinct_id=distinct_id, team=self.team, timestamp=timezone.now())
+
+        event = {"id": "pageview", "name": "pageview", "type": "events", "order": 0}
+        filter = Filter(
+            data={"date_from": "2021-01-21T00:00:00Z", "date_to": "2021-01-21T23:59:59Z", "events": [event]}
+        )
+        _, actors_from_postgres, _ = TrendsActors(self.team, Entity(event), filter).get_actors()
+        with override_settings(ACTORS_FROM_CLICKHOUSE=True):
+            _, actors_from_clickhouse, _ = TrendsActors(self.team, Entity(event), filter).get_actors()
+
+        def comparable(actors):
+            return sorted(
+                (str(actor["uuid"]), actor["name"], actor["distinct_ids"], actor["properties"]) for actor in actors
+            )
+
+        self.assertEqual(len(actors_from_clickhouse), 2)
+        self.assertEqual(sorted(actor["name"] for actor in actors_from_clickhouse), ["bla", "u2"])
+        self.assertEqual(comparable(actors_from_clickhouse), comparable(actors_from_postgres))
+
+    @freeze_time("2021-01-21T20:00:00.000Z")
+    @override_settings(ACTORS_FROM_CLICKHOUSE=True)
+    def test_recording_existence_is_cached_for_persons_from_clickhouse(self):
+        _create_person(team_id=self.team.pk, distinct_ids=["u1"], properties={"email": "bla"})
+        create_session_recording_events(self.team.pk, timezone.now(), "u1", "s1")
+        for session_id in ["s1", "s2"]:
+            _create_event(
+                event="pageview",
+                distinct_id="u1",
+                team=self.team,
+                timestamp=timezone.now(),
+                properties={"$session_id": session_id, "$window_id": "w1"},
+            )
+
+        event = {"id": "pageview", "name": "pageview", "type": "events", "order": 0}
+        filter = Filter(
+            data={
+                "date_from": "2021-01-21T00:00:00Z",
+                "date_to": "2021-01-21T23:59:59Z",
+                "events": [event],
+                "include_recordings": "true",
+            }
+        )
+        with patch.object(
+            TrendsActors, "query_for_session_ids_with_recordings", autospec=True, return_value={"s1"}
+        ) as query_for_session_ids_with_recordings:
+            for _ in range(2):
+                _, serialized_actors, _ = TrendsActors(self.team, Entity(event), filter).get_actors()
+                self.assertEqual(
+                    [recording["session_id"] for recording in serialized_actors[0]["matched_recordings"]], ["s1"]
+                )
+
+        query_for_session_ids_with_recordings.assert_called_once()
+
     @snapshot_clickhouse_queries
     @freeze_time("2021-01-21T20:00:00.000Z")
     def test_person_query_does_not_include_recording_events_if_flag_not_set(self):
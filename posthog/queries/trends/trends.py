@@ -1,6 +1,6 @@
 import copy
-import threading
 from datetime import datetime, timedelta
+from functools import partial
 from itertools import accumulate
 from typing import Any, Callable, Dict, List, Optional, Tuple, cast
 
@@ -9,7 +9,6 @@ from dateutil import parser
 from django.db.models.query import Prefetch
 from sentry_sdk import push_scope
 
-from posthog.clickhouse.query_tagging import get_query_tags, tag_queries
 from posthog.constants import (
     NON_BREAKDOWN_DISPLAY_TYPES,
     TREND_FILTER_TYPE_ACTIONS,
@@ -24,6 +23,7 @@ from posthog.models.filters import Filter
 from posthog.models.team import Team
 from posthog.queries.base import handle_compare
 from posthog.queries.insight import insight_sync_execute
+from posthog.queries.parallel import get_values, run_in_parallel
 from posthog.queries.trends.breakdown import TrendsBreakdown
 from posthog.queries.trends.formula import TrendsFormula
 from posthog.queries.trends.lifecycle import Lifecycle
@@ -147,40 +147,30 @@ class Trends(TrendsTotalVolume, Lifecycle, TrendsFormula):
 
         return merged_results
 
-    def _run_query_for_threading(
-        self, result: List, index: int, query_type, sql, params, query_tags: Dict, filter: Filter
-    ):
-        tag_queries(**query_tags)
+    def _run_query_for_parallel(self, query_type, sql, params, filter: Filter):
         with push_scope() as scope:
             scope.set_context("query", {"sql": sql, "params": params})
-            result[index] = insight_sync_execute(sql, params, query_type=query_type, filter=filter)
+            return insight_sync_execute(sql, params, query_type=query_type, filter=filter)
 
     def _run_parallel(self, filter: Filter, team: Team) -> List[Dict[str, Any]]:
         result: List[Optional[List[Dict[str, Any]]]] = [None] * len(filter.entities)
         parse_functions: List[Optional[Callable]] = [None] * len(filter.entities)
         sql_statements_with_params: List[Tuple[Optional[str], Dict]] = [(None, {})] * len(filter.entities)
-        cached_result = None
-        jobs = []
+        tasks: List[Callable[[], Any]] = []
 
+        adjusted_filter, cached_result = self.adjusted_filter(filter, team)
         for entity in filter.entities:
-            adjusted_filter, cached_result = self.adjusted_filter(filter, team)
             query_type, sql, params, parse_function = self._get_sql_for_entity(adjusted_filter, team, entity)
             parse_functions[entity.index] = parse_function
             query_params = {**params, **adjusted_filter.hogql_context.values}
             sql_statements_with_params[entity.index] = (sql, query_params)
-            thread = threading.Thread(
-                target=self._run_query_for_threading,
-                args=(result, entity.index, query_type, sql, query_params, get_query_tags(), adjusted_filter),
-            )
-            jobs.append(thread)
+            tasks.append(partial(self._run_query_for_parallel, query_type, sql, query_params, adjusted_filter))
 
-        # Start the threads (i.e. calculate the random number lists)
-        for j in jobs:
-            j.start()
-
-        # Ensure all of the threads have finished
-        for j in jobs:
-            j.join()
+        # The insight can't be shown with a series missing, so stop early if any of the queries fails
+        for entity, entity_result in zip(
+            filter.entities, get_values(run_in_parallel(team.pk, tasks, kind="trends", fail_fast=True))
+        ):
+            result[entity.index] = entity_result
 
         # Parse results for each thread
         with push_scope() as scope:
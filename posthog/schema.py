@@ -262,6 +262,10 @@ class HogQLQueryResponse(BaseModel):
     hogql: Optional[str] = None
     query: Optional[str] = None
     results: Optional[List] = None
+    timings: Optional[Dict[str, float]] = Field(
+        None,
+        description="Seconds spent in each stage of running the query (parse, resolve, print, execute). Stages skipped thanks to caching are left out.",
+    )
     types: Optional[List] = None
 
 
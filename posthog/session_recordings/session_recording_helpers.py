@@ -1,11 +1,16 @@
 import base64
+import codecs
 import dataclasses
 import gzip
+import itertools
 import json
+import zlib
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import Any, DefaultDict, Dict, Generator, List, Optional
+from typing import Any, Callable, DefaultDict, Dict, Generator, Iterable, List, Optional, Tuple
 
+import zstandard
+from django.conf import settings
 from sentry_sdk.api import capture_exception, capture_message
 
 from posthog.models import utils
@@ -15,8 +20,10 @@ from posthog.models.session_recording.metadata import (
     SessionRecordingEventSummary,
     SnapshotData,
     SnapshotDataTaggedWithWindowId,
+    StreamedRecordingData,
     WindowId,
 )
+from posthog.utils import StreamingJSONReader
 
 FULL_SNAPSHOT = 2
 
@@ -90,32 +97,52 @@ Event = Dict[str, Any]
 
 
 def preprocess_session_recording_events_for_clickhouse(events: List[Event]) -> List[Event]:
-    result = []
-    snapshots_by_session_and_window_id = defaultdict(list)
+    return list(iter_preprocess_session_recording_events(events))
+
+
+def iter_preprocess_session_recording_events(
+    events: Iterable[Event], max_buffered_snapshots: Optional[int] = None
+) -> Generator[Event, None, None]:
+    """
+    Lazy version of `preprocess_session_recording_events_for_clickhouse`.
+
+    Events other than snapshots are yielded as they come, while snapshots are buffered per
+    session and window and yielded as compressed chunks at the end. If `max_buffered_snapshots`
+    is set, a buffer is compressed as soon as it reaches that many snapshots, which bounds the
+    memory used by large payloads at the cost of more, smaller chunk groups.
+    """
+    snapshots_by_session_and_window_id: DefaultDict[Tuple[str, Optional[str]], List[Event]] = defaultdict(list)
     for event in events:
         if is_unchunked_snapshot(event):
             session_id = event["properties"]["$session_id"]
             window_id = event["properties"].get("$window_id")
-            snapshots_by_session_and_window_id[(session_id, window_id)].append(event)
+            snapshots = snapshots_by_session_and_window_id[(session_id, window_id)]
+            snapshots.append(event)
+            if max_buffered_snapshots is not None and len(snapshots) >= max_buffered_snapshots:
+                yield from compress_and_chunk_snapshots(snapshots)
+                del snapshots_by_session_and_window_id[(session_id, window_id)]
         else:
-            result.append(event)
+            yield event
 
     for _, snapshots in snapshots_by_session_and_window_id.items():
-        result.extend(list(compress_and_chunk_snapshots(snapshots)))
+        yield from compress_and_chunk_snapshots(snapshots)
 
-    return result
 
-
-def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) -> Generator[Event, None, None]:
+def compress_and_chunk_snapshots(
+    events: List[Event], chunk_size=512 * 1024, compression: Optional[str] = None
+) -> Generator[Event, None, None]:
     data_list = [event["properties"]["$snapshot_data"] for event in events]
     session_id = events[0]["properties"]["$session_id"]
     has_full_snapshot = any(snapshot_data["type"] == RRWEB_MAP_EVENT_TYPE.FullSnapshot for snapshot_data in data_list)
     window_id = events[0]["properties"].get("$window_id")
+    compression = compression or settings.SESSION_RECORDING_SNAPSHOT_COMPRESSION
 
-    compressed_data = compress_to_string(json.dumps(data_list))
+    if compression == GZIP_BASE64:
+        chunks = chunk_string(compress_to_string(json.dumps(data_list)), chunk_size)
+    else:
+        chunks = chunk_bytes_to_base64(SNAPSHOT_CODECS[compression].compress(json.dumps(data_list)), chunk_size)
 
     id = str(utils.UUIDT())
-    chunks = chunk_string(compressed_data, chunk_size)
 
     for index, chunk in enumerate(chunks):
         yield {
@@ -130,7 +157,7 @@ def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) ->
                     "chunk_index": index,
                     "chunk_count": len(chunks),
                     "data": chunk,
-                    "compression": "gzip-base64",
+                    "compression": compression,
                     "has_full_snapshot": has_full_snapshot,
                     # We only store this field on the first chunk as it contains all events, not just this chunk
                     "events_summary": get_events_summary_from_snapshot_data(data_list) if index == 0 else None,
@@ -144,6 +171,20 @@ def chunk_string(string: str, chunk_length: int) -> List[str]:
     return [string[0 + offset : chunk_length + offset] for offset in range(0, len(string), chunk_length)]
 
 
+def chunk_bytes_to_base64(data: bytes, chunk_length: int) -> List[str]:
+    """
+    Split bytes into base64 encoded chunks of at most chunk_length characters.
+
+    Each chunk holds a multiple of 3 bytes, so chunks can be decoded on their own and their
+    concatenation is also the base64 encoding of the whole data.
+    """
+    bytes_per_chunk = max(chunk_length // 4, 1) * 3
+    return [
+        base64.b64encode(data[offset : offset + bytes_per_chunk]).decode("ascii")
+        for offset in range(0, len(data), bytes_per_chunk)
+    ] or [""]
+
+
 def is_unchunked_snapshot(event: Dict) -> bool:
     try:
         is_snapshot = event["event"] == "$snapshot"
@@ -158,14 +199,53 @@ def is_unchunked_snapshot(event: Dict) -> bool:
         raise ValueError('$snapshot events must contain property "$snapshot_data"!')
 
 
+@dataclasses.dataclass(frozen=True)
+class SnapshotCodec:
+    """
+    How snapshot data is turned into bytes before being base64 encoded and chunked, keyed
+    by the `compression` value stored alongside each chunk.
+    """
+
+    compress: Callable[[str], bytes]
+    # Returns an incremental decompressor, i.e. an object with a `decompress(bytes) -> bytes` method
+    decompressobj: Callable[[], Any]
+    # The text encoding the JSON is in once decompressed
+    encoding: str
+
+    def decompress(self, data: bytes) -> str:
+        return self.decompressobj().decompress(data).decode(self.encoding, "surrogatepass")
+
+
+# Original format. The JSON is encoded as UTF-16 before being gzipped, which doubles its size
+# and the work done by gzip, and the whole result is base64 encoded before being chunked.
+GZIP_BASE64 = "gzip-base64"
+# UTF-8 encoded JSON compressed with zstd. Compressed bytes are chunked first, then each chunk is
+# base64 encoded on its own (see `chunk_bytes_to_base64`).
+ZSTD_BASE64 = "zstd-base64"
+
+SNAPSHOT_CODECS: Dict[str, SnapshotCodec] = {
+    GZIP_BASE64: SnapshotCodec(
+        compress=lambda json_string: gzip.compress(json_string.encode("utf-16", "surrogatepass")),
+        decompressobj=lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+        encoding="utf-16",
+    ),
+    ZSTD_BASE64: SnapshotCodec(
+        compress=lambda json_string: zstandard.ZstdCompressor(level=3).compress(
+            json_string.encode("utf-8", "surrogatepass")
+        ),
+        decompressobj=lambda: zstandard.ZstdDecompressor().decompressobj(),
+        encoding="utf-8",
+    ),
+}
+
+
 def compress_to_string(json_string: str) -> str:
     compressed_data = gzip.compress(json_string.encode("utf-16", "surrogatepass"))
     return base64.b64encode(compressed_data).decode("utf-8")
 
 
-def decompress(base64data: str) -> str:
-    compressed_bytes = base64.b64decode(base64data)
-    return gzip.decompress(compressed_bytes).decode("utf-16", "surrogatepass")
+def decompress(base64data: str, compression: str = GZIP_BASE64) -> str:
+    return SNAPSHOT_CODECS[compression].decompress(base64.b64decode(base64data))
 
 
 def decompress_chunked_snapshot_data(
@@ -185,7 +265,8 @@ def decompress_chunked_snapshot_data(
 
     Depending on the size of the recording, this function can return a lot of data. To decrease the
     memory used, you should either use the pagination parameters or pass in 'return_only_activity_data' which
-    drastically reduces the size of the data returned if you only want the activity data (used for metadata calculation)
+    drastically reduces the size of the data returned if you only want the activity data (used for metadata calculation).
+    See `stream_chunked_snapshot_data` to avoid materializing the events altogether.
     """
 
     if len(all_recording_events) == 0:
@@ -206,35 +287,23 @@ def decompress_chunked_snapshot_data(
             has_next=paginated_list.has_next, snapshot_data_by_window_id=snapshot_data_by_window_id
         )
 
-    # Split decompressed recording events into their chunks
-    chunks_collector: DefaultDict[str, List[SnapshotDataTaggedWithWindowId]] = defaultdict(list)
-    for event in all_recording_events:
-        chunks_collector[event["snapshot_data"]["chunk_id"]].append(event)
-
     # Paginate the list of chunks
-    paginated_chunk_list = paginate_list(list(chunks_collector.values()), limit, offset)
+    paginated_chunk_list = paginate_list(group_snapshot_chunks(all_recording_events), limit, offset)
 
     has_next = paginated_chunk_list.has_next
     chunk_list: List[List[SnapshotDataTaggedWithWindowId]] = paginated_chunk_list.paginated_list
 
     # Decompress the chunks and split the resulting events by window_id
     for chunks in chunk_list:
-        if len(chunks) != chunks[0]["snapshot_data"]["chunk_count"]:
-            capture_message(
-                "Did not find all session recording chunks! Team: {}, Session: {}, Chunk-id: {}. Found {} of {} expected chunks".format(
-                    team_id,
-                    session_recording_id,
-                    chunks[0]["snapshot_data"]["chunk_id"],
-                    len(chunks),
-                    chunks[0]["snapshot_data"]["chunk_count"],
-                )
-            )
+        if not is_complete_chunk_group(team_id, session_recording_id, chunks):
             continue
 
         b64_compressed_data = "".join(
             chunk["snapshot_data"]["data"] for chunk in sorted(chunks, key=lambda c: c["snapshot_data"]["chunk_index"])
         )
-        decompressed_data = json.loads(decompress(b64_compressed_data))
+        decompressed_data = json.loads(
+            decompress(b64_compressed_data, chunks[0]["snapshot_data"].get("compression") or GZIP_BASE64)
+        )
 
         # Decompressed data can be large, and in metadata calculations, we only care if the event is "active"
         # This pares down the data returned, so we're not passing around a massive object
@@ -246,6 +315,142 @@ def decompress_chunked_snapshot_data(
     return DecompressedRecordingData(has_next=has_next, snapshot_data_by_window_id=snapshot_data_by_window_id)
 
 
+def stream_chunked_snapshot_data(
+    team_id: int,
+    session_recording_id: str,
+    all_recording_events: List[SnapshotDataTaggedWithWindowId],
+    max_bytes: int,
+    offset: int = 0,
+) -> StreamedRecordingData:
+    """
+    Lazy counterpart of `decompress_chunked_snapshot_data`.
+
+    Pages are made of whole chunk groups, as many as fit in `max_bytes` of stored (compressed) data,
+    and at least one. `offset` counts chunk groups, and the offset of the next page is returned
+    as `next_offset`. Each window's events are decoded one chunk group at a time, only when its
+    iterator is consumed. Chunk groups that fail to decode are skipped.
+    """
+    if len(all_recording_events) == 0:
+        return StreamedRecordingData(has_next=False, next_offset=offset, snapshot_data_by_window_id={})
+
+    # Unchunked snapshots are stored uncompressed, so there is nothing to stream
+    if "chunk_id" not in all_recording_events[0]["snapshot_data"]:
+        page = paginate_list_by_size(all_recording_events, max_bytes, offset, lambda event: len(str(event)))
+        events_by_window_id: DefaultDict[WindowId, List[SnapshotData]] = defaultdict(list)
+        for event in page.paginated_list:
+            events_by_window_id[event["window_id"]].append(event["snapshot_data"])
+        return StreamedRecordingData(
+            has_next=page.has_next,
+            next_offset=offset + len(page.paginated_list),
+            snapshot_data_by_window_id={window_id: iter(events) for window_id, events in events_by_window_id.items()},
+        )
+
+    page = paginate_list_by_size(
+        group_snapshot_chunks(all_recording_events),
+        max_bytes,
+        offset,
+        lambda chunks: sum(len(chunk["snapshot_data"]["data"]) for chunk in chunks),
+    )
+
+    chunk_groups_by_window_id: DefaultDict[WindowId, List[List[SnapshotDataTaggedWithWindowId]]] = defaultdict(list)
+    for chunks in page.paginated_list:
+        if is_complete_chunk_group(team_id, session_recording_id, chunks):
+            chunk_groups_by_window_id[chunks[0]["window_id"]].append(chunks)
+
+    return StreamedRecordingData(
+        has_next=page.has_next,
+        next_offset=offset + len(page.paginated_list),
+        snapshot_data_by_window_id={
+            window_id: itertools.chain.from_iterable(
+                iter_decompressed_chunk_group(team_id, session_recording_id, chunks) for chunks in chunk_groups
+            )
+            for window_id, chunk_groups in chunk_groups_by_window_id.items()
+        },
+    )
+
+
+def group_snapshot_chunks(
+    all_recording_events: List[SnapshotDataTaggedWithWindowId],
+) -> List[List[SnapshotDataTaggedWithWindowId]]:
+    """Split recording events into their chunk groups, in the order each group was first seen."""
+    chunks_collector: DefaultDict[str, List[SnapshotDataTaggedWithWindowId]] = defaultdict(list)
+    for event in all_recording_events:
+        chunks_collector[event["snapshot_data"]["chunk_id"]].append(event)
+    return list(chunks_collector.values())
+
+
+def is_complete_chunk_group(
+    team_id: int, session_recording_id: str, chunks: List[SnapshotDataTaggedWithWindowId]
+) -> bool:
+    if len(chunks) != chunks[0]["snapshot_data"]["chunk_count"]:
+        capture_message(
+            "Did not find all session recording chunks! Team: {}, Session: {}, Chunk-id: {}. Found {} of {} expected chunks".format(
+                team_id,
+                session_recording_id,
+                chunks[0]["snapshot_data"]["chunk_id"],
+                len(chunks),
+                chunks[0]["snapshot_data"]["chunk_count"],
+            )
+        )
+        return False
+
+    # Chunks stored before the `compression` field was used for anything are all gzip-base64
+    compression = chunks[0]["snapshot_data"].get("compression") or GZIP_BASE64
+    if compression not in SNAPSHOT_CODECS:
+        capture_message(
+            "Unknown session recording compression! Team: {}, Session: {}, Chunk-id: {}, Compression: {}".format(
+                team_id, session_recording_id, chunks[0]["snapshot_data"]["chunk_id"], compression
+            )
+        )
+        return False
+
+    return True
+
+
+def iter_decompressed_chunk_group(
+    team_id: int, session_recording_id: str, chunks: List[SnapshotDataTaggedWithWindowId]
+) -> Generator[SnapshotData, None, None]:
+    """
+    Decode the rrweb events of a complete chunk group, feeding the chunks through an incremental
+    base64 decoder, decompressor and JSON reader, so that neither the joined chunks nor the
+    decompressed JSON are held in memory in full.
+
+    The whole group is decoded before its first event is yielded, as the events end up in a response
+    that has already started. A group that fails to decode is reported and skipped, instead of
+    truncating that response.
+    """
+    codec = SNAPSHOT_CODECS[chunks[0]["snapshot_data"].get("compression") or GZIP_BASE64]
+
+    def iter_decompressed_bytes() -> Generator[bytes, None, None]:
+        decompressor = codec.decompressobj()
+        # Chunks are split on base64 characters, so leftovers that don't form a full quantum are carried over
+        remainder = ""
+        for chunk in sorted(chunks, key=lambda c: c["snapshot_data"]["chunk_index"]):
+            data = remainder + chunk["snapshot_data"]["data"]
+            cutoff = len(data) - len(data) % 4
+            remainder = data[cutoff:]
+            yield decompressor.decompress(base64.b64decode(data[:cutoff]))
+        if remainder:
+            yield decompressor.decompress(base64.b64decode(remainder + "==="))
+
+    try:
+        reader = StreamingJSONReader(codecs.iterdecode(iter_decompressed_bytes(), codec.encoding, "surrogatepass"))
+        events = list(reader.iter_array())
+        reader.end()
+    except Exception as error:
+        capture_exception(
+            error,
+            extras={
+                "team_id": team_id,
+                "session_recording_id": session_recording_id,
+                "chunk_id": chunks[0]["snapshot_data"]["chunk_id"],
+            },
+        )
+        return
+
+    yield from events
+
+
 def is_active_event(event: SessionRecordingEventSummary) -> bool:
     """
     Determines which rr-web events are "active" - meaning user generated
@@ -409,6 +614,20 @@ class PaginatedList:
     paginated_list: List
 
 
+def paginate_list_by_size(
+    list_to_paginate: List, max_size: int, offset: int, get_size: Callable[[Any], int]
+) -> PaginatedList:
+    """Like `paginate_list`, but pages hold as many items as fit in `max_size`, and always at least one."""
+    paginated_list = []
+    size = 0
+    for item in list_to_paginate[offset:]:
+        size += get_size(item)
+        if paginated_list and size > max_size:
+            return PaginatedList(has_next=True, paginated_list=paginated_list)
+        paginated_list.append(item)
+    return PaginatedList(has_next=False, paginated_list=paginated_list)
+
+
 def paginate_list(list_to_paginate: List, limit: Optional[int], offset: int) -> PaginatedList:
     if not limit:
         has_next = False
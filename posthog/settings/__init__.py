@@ -65,6 +65,10 @@ PLUGINS_PREINSTALLED_URLS: List[str] = (
     else []
 )
 PLUGINS_RELOAD_PUBSUB_CHANNEL = os.getenv("PLUGINS_RELOAD_PUBSUB_CHANNEL", "reload-plugins")
+# How long /decide caches a team's site apps for, see get_decide_site_apps in posthog/plugins/site.py. Saving a
+# plugin config clears its team's entry right away, this only bounds changes made outside of Django, e.g. when
+# the plugin server transpiles a site app.
+SITE_APPS_CACHE_TTL = get_from_env("SITE_APPS_CACHE_TTL", 60, type_cast=int)
 
 # Tokens used when installing plugins, for example to get the latest commit SHA or to download private repositories.
 # Used mainly to get around API limits and only if no ?private_token=TOKEN found in the plugin URL.
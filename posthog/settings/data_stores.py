@@ -97,6 +97,27 @@ CLICKHOUSE_ENABLE_STORAGE_POLICY = get_from_env("CLICKHOUSE_ENABLE_STORAGE_POLIC
 
 CLICKHOUSE_CONN_POOL_MIN = get_from_env("CLICKHOUSE_CONN_POOL_MIN", 20, type_cast=int)
 CLICKHOUSE_CONN_POOL_MAX = get_from_env("CLICKHOUSE_CONN_POOL_MAX", 1000, type_cast=int)
+# Queries wait in line for one of the CLICKHOUSE_CONN_POOL_MAX connections, ONLINE ones first, see ConnectionLimiter
+# in posthog/clickhouse/client/connection.py. These cap how many connections a single team and OFFLINE queries as
+# a whole can hold, and how many queries can wait and for how long (in seconds).
+CLICKHOUSE_CONN_POOL_TEAM_LIMIT = get_from_env("CLICKHOUSE_CONN_POOL_TEAM_LIMIT", 100, type_cast=int)
+CLICKHOUSE_CONN_POOL_OFFLINE_LIMIT = get_from_env("CLICKHOUSE_CONN_POOL_OFFLINE_LIMIT", 500, type_cast=int)
+CLICKHOUSE_CONN_POOL_MAX_WAITING = get_from_env("CLICKHOUSE_CONN_POOL_MAX_WAITING", 1000, type_cast=int)
+CLICKHOUSE_CONN_POOL_WAIT_TIMEOUT = get_from_env("CLICKHOUSE_CONN_POOL_WAIT_TIMEOUT", 30, type_cast=float)
+
+# Size of the process-wide pool the per-series queries of insights run on, see posthog/queries/parallel.py,
+# and how many of its workers a single team can hold at once
+INSIGHT_PARALLEL_QUERY_WORKERS = get_from_env("INSIGHT_PARALLEL_QUERY_WORKERS", 16, type_cast=int)
+INSIGHT_PARALLEL_QUERY_TEAM_LIMIT = get_from_env("INSIGHT_PARALLEL_QUERY_TEAM_LIMIT", 4, type_cast=int)
+# Whether persons modals load persons from ClickHouse rather than Postgres, see get_people_from_clickhouse in
+# posthog/queries/actor_base_query.py. Persons in ClickHouse can lag behind Postgres by the ingestion delay.
+ACTORS_FROM_CLICKHOUSE = get_from_env("ACTORS_FROM_CLICKHOUSE", False, type_cast=str_to_bool)
+
+# In-process caches of parsed HogQL queries and of the ClickHouse SQL they're printed to, see posthog/hogql/query.py.
+# Printed queries expire so that they pick up changes to property definitions.
+HOGQL_QUERY_CACHE_ENABLED = get_from_env("HOGQL_QUERY_CACHE_ENABLED", not TEST, type_cast=str_to_bool)
+HOGQL_QUERY_CACHE_SIZE = get_from_env("HOGQL_QUERY_CACHE_SIZE", 1000, type_cast=int)
+HOGQL_COMPILED_QUERY_CACHE_TTL = get_from_env("HOGQL_COMPILED_QUERY_CACHE_TTL", 60, type_cast=int)
 
 CLICKHOUSE_STABLE_HOST = get_from_env("CLICKHOUSE_STABLE_HOST", CLICKHOUSE_HOST)
 # If enabled, some queries will use system.cluster table to query each shard
@@ -1,6 +1,6 @@
 import os
 
-from posthog.settings.utils import get_list
+from posthog.settings.utils import get_from_env, get_list
 
 # These flags will be force-enabled on the frontend
 # The features here are released, but the flags are just not yet removed from the code
@@ -10,3 +10,7 @@ PERSISTED_FEATURE_FLAGS = get_list(os.getenv("PERSISTED_FEATURE_FLAGS", "")) + [
     "ingestion-warnings-enabled",
     "role-based-access",
 ]
+
+# How many teams' flag definitions each worker keeps deserialized and ready for matching, see
+# get_compiled_feature_flags_for_team in posthog/models/feature_flag/feature_flag.py
+FLAG_DEFINITIONS_LOCAL_CACHE_SIZE = get_from_env("FLAG_DEFINITIONS_LOCAL_CACHE_SIZE", 1000, type_cast=int)
@@ -1,5 +1,11 @@
 import os
 
-from posthog.settings.base_variables import BASE_DIR
+from posthog.settings.base_variables import BASE_DIR, TEST
+from posthog.settings.utils import get_from_env, str_to_bool
 
 GEOIP_PATH = os.path.join(BASE_DIR, "share")
+
+# In-process LRU of GeoIP lookups by IP address, see posthog/api/geoip.py. Lookups never expire, as the database
+# only changes on deploys.
+GEOIP_CACHE_ENABLED = get_from_env("GEOIP_CACHE_ENABLED", not TEST, type_cast=str_to_bool)
+GEOIP_CACHE_SIZE = get_from_env("GEOIP_CACHE_SIZE", 10000, type_cast=int)
@@ -17,6 +17,23 @@ EVENT_PARTITION_KEYS_TO_OVERRIDE = get_list(os.getenv("EVENT_PARTITION_KEYS_TO_O
 # Keep in sync with plugin-server
 EVENTS_DEAD_LETTER_QUEUE_STATSD_METRIC = "events_added_to_dead_letter_queue"
 
+# When enabled, capture serializes all the events of a request in a single pass and hands them
+# to the Kafka producer as one batch, rather than producing event by event.
+CAPTURE_BATCHED_PRODUCE_ENABLED = get_from_env("CAPTURE_BATCHED_PRODUCE_ENABLED", False, type_cast=str_to_bool)
+
+# When enabled, capture reads, decompresses and decodes request bodies incrementally, processing
+# events as they are decoded instead of materializing the whole payload first.
+CAPTURE_STREAMING_DECODE_ENABLED = get_from_env("CAPTURE_STREAMING_DECODE_ENABLED", False, type_cast=str_to_bool)
+# Caps the decompressed size of a request body when streaming, the compressed size being capped by
+# DATA_UPLOAD_MAX_MEMORY_SIZE as usual.
+CAPTURE_STREAMING_MAX_DECODED_BYTES = get_from_env(
+    "CAPTURE_STREAMING_MAX_DECODED_BYTES", 100 * 1024 * 1024, type_cast=int
+)
+
+# How session recording snapshots are compressed at ingestion, see `SNAPSHOT_CODECS` in
+# posthog/session_recordings/session_recording_helpers.py. Playback reads every known format.
+SESSION_RECORDING_SNAPSHOT_COMPRESSION = os.getenv("SESSION_RECORDING_SNAPSHOT_COMPRESSION", "gzip-base64")
+
 QUOTA_LIMITING_ENABLED = get_from_env("QUOTA_LIMITING_ENABLED", False, type_cast=str_to_bool)
 
 PARTITION_KEY_AUTOMATIC_OVERRIDE_ENABLED = get_from_env(
@@ -3,6 +3,10 @@ from posthog.settings.utils import get_from_env, str_to_bool
 
 USE_PRECALCULATED_CH_COHORT_PEOPLE = not TEST
 CALCULATE_X_COHORTS_PARALLEL = get_from_env("CALCULATE_X_COHORTS_PARALLEL", 5, type_cast=int)
+# Cohorts filtering only on person properties are recalculated for just the persons that changed since their last
+# calculation, with a full recalculation at least this often to catch anything incremental runs missed. Opt-in for now
+RECALCULATE_COHORTS_INCREMENTALLY = get_from_env("RECALCULATE_COHORTS_INCREMENTALLY", False, type_cast=str_to_bool)
+COHORT_FULL_RECALCULATION_INTERVAL_HOURS = get_from_env("COHORT_FULL_RECALCULATION_INTERVAL_HOURS", 24, type_cast=int)
 
 ACTION_EVENT_MAPPING_INTERVAL_SECONDS = get_from_env("ACTION_EVENT_MAPPING_INTERVAL_SECONDS", 300, type_cast=int)
 
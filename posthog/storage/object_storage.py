@@ -1,14 +1,18 @@
 import abc
-from typing import Optional, Union
+from typing import Iterable, List, Optional, Union
 
 import structlog
 from boto3 import client
 from botocore.client import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from django.conf import settings
 from sentry_sdk import capture_exception
 
 logger = structlog.get_logger(__name__)
 
+# S3 requires all parts of a multipart upload but the last to be at least 5MB
+MULTIPART_UPLOAD_PART_SIZE = 8 * 1024 * 1024
+
 
 class ObjectStorageError(Exception):
     pass
@@ -33,6 +37,10 @@ class ObjectStorageClient(metaclass=abc.ABCMeta):
     def write(self, bucket: str, key: str, content: Union[str, bytes]) -> None:
         pass
 
+    @abc.abstractmethod
+    def write_stream(self, bucket: str, key: str, chunks: Iterable[bytes]) -> None:
+        pass
+
 
 class UnavailableStorage(ObjectStorageClient):
     def head_bucket(self, bucket: str):
@@ -47,6 +55,9 @@ class UnavailableStorage(ObjectStorageClient):
     def write(self, bucket: str, key: str, content: Union[str, bytes]) -> None:
         pass
 
+    def write_stream(self, bucket: str, key: str, chunks: Iterable[bytes]) -> None:
+        pass
+
 
 class ObjectStorage(ObjectStorageClient):
     def __init__(self, aws_client) -> None:
@@ -85,6 +96,53 @@ class ObjectStorage(ObjectStorageClient):
             capture_exception(e)
             raise ObjectStorageError("write failed") from e
 
+    def write_stream(self, bucket: str, key: str, chunks: Iterable[bytes]) -> None:
+        """
+        Writes the chunks as they are produced, in a multipart upload of parts of `MULTIPART_UPLOAD_PART_SIZE`, so
+        that the whole content is never held in memory. Content smaller than a part is written in one go.
+        """
+        upload_id: Optional[str] = None
+        parts: List[dict] = []
+        buffer = bytearray()
+
+        def upload_part(body: bytes) -> None:
+            nonlocal upload_id
+            if upload_id is None:
+                upload_id = self.aws_client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+            part_number = len(parts) + 1
+            s3_response = self.aws_client.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+            )
+            parts.append({"ETag": s3_response["ETag"], "PartNumber": part_number})
+
+        try:
+            for chunk in chunks:
+                buffer.extend(chunk)
+                if len(buffer) >= MULTIPART_UPLOAD_PART_SIZE:
+                    upload_part(bytes(buffer))
+                    buffer.clear()
+
+            if upload_id is None:
+                self.aws_client.put_object(Bucket=bucket, Body=bytes(buffer), Key=key)
+                return
+            if buffer:
+                upload_part(bytes(buffer))
+            self.aws_client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except Exception as e:
+            if upload_id is not None:
+                try:
+                    self.aws_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+                except Exception as abort_error:
+                    logger.error("object_storage.abort_multipart_upload_failed", bucket=bucket, error=abort_error)
+            if not isinstance(e, (BotoCoreError, ClientError)):
+                # Producing the chunks failed rather than writing them
+                raise
+            logger.error("object_storage.write_stream_failed", bucket=bucket, file_name=key, parts=len(parts), error=e)
+            capture_exception(e)
+            raise ObjectStorageError("write failed") from e
+
 
 _client: ObjectStorageClient = UnavailableStorage()
 
@@ -113,6 +171,10 @@ def write(file_name: str, content: Union[str, bytes]) -> None:
     return object_storage_client().write(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name, content=content)
 
 
+def write_stream(file_name: str, chunks: Iterable[bytes]) -> None:
+    return object_storage_client().write_stream(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name, chunks=chunks)
+
+
 def read(file_name: str) -> Optional[str]:
     return object_storage_client().read(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name)
 
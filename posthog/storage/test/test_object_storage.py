@@ -1,6 +1,8 @@
 import uuid
 from unittest.mock import patch
 
+import pytest
+
 from boto3 import resource
 from botocore.client import Config
 
@@ -10,7 +12,7 @@ from posthog.settings import (
     OBJECT_STORAGE_ENDPOINT,
     OBJECT_STORAGE_SECRET_ACCESS_KEY,
 )
-from posthog.storage.object_storage import health_check, read, write
+from posthog.storage.object_storage import ObjectStorageError, health_check, read, write, write_stream
 from posthog.test.base import APIBaseTest
 
 TEST_BUCKET = "test_storage_bucket"
@@ -52,3 +54,31 @@ class TestStorage(APIBaseTest):
             file_name = f"{TEST_BUCKET}/test_write_and_read_works_with_known_content/{name}"
             write(file_name, "my content".encode("utf-8"))
             self.assertEqual(read(file_name), "my content")
+
+    def test_write_stream_works_with_small_content(self) -> None:
+        with self.settings(OBJECT_STORAGE_ENABLED=True):
+            file_name = f"{TEST_BUCKET}/test_write_stream_works_with_small_content/{uuid.uuid4()}"
+            write_stream(file_name, [b"my ", b"content"])
+            self.assertEqual(read(file_name), "my content")
+
+    @patch("posthog.storage.object_storage.MULTIPART_UPLOAD_PART_SIZE", 5 * 1024 * 1024)
+    def test_write_stream_works_with_multiple_parts(self) -> None:
+        chunks = [(str(index) * 1024 * 1024).encode("utf-8") for index in range(7)]
+        with self.settings(OBJECT_STORAGE_ENABLED=True):
+            file_name = f"{TEST_BUCKET}/test_write_stream_works_with_multiple_parts/{uuid.uuid4()}"
+            write_stream(file_name, iter(chunks))
+            self.assertEqual(read(file_name), b"".join(chunks).decode("utf-8"))
+
+    @patch("posthog.storage.object_storage.MULTIPART_UPLOAD_PART_SIZE", 5 * 1024 * 1024)
+    def test_write_stream_does_not_write_when_producing_chunks_fails(self) -> None:
+        def chunks():
+            for _ in range(6):
+                yield b"a" * 1024 * 1024
+            raise ValueError("no more chunks")
+
+        with self.settings(OBJECT_STORAGE_ENABLED=True):
+            file_name = f"{TEST_BUCKET}/test_write_stream_does_not_write_when_producing_chunks_fails/{uuid.uuid4()}"
+            with pytest.raises(ValueError, match="no more chunks"):
+                write_stream(file_name, chunks())
+            with pytest.raises(ObjectStorageError):
+                read(file_name)
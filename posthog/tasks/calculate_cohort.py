@@ -1,26 +1,41 @@
+import heapq
+import math
 import time
-from typing import Any, Dict, List
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set
 
 import structlog
 from celery import shared_task
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
-from django.db.models import F
 from django.utils import timezone
 
 from posthog.models import Cohort
 from posthog.models.cohort import get_and_update_pending_version
-from posthog.models.cohort.util import clear_stale_cohortpeople
+from posthog.models.cohort.util import (
+    can_recalculate_cohortpeople_incrementally,
+    clear_stale_cohortpeople,
+    get_cohort_calculation_durations,
+    get_cohort_dependency_ids,
+)
+from posthog.redis import get_client
 
 logger = structlog.get_logger(__name__)
 
 MAX_AGE_MINUTES = 15
 
+# Cost estimates for cohorts without a calculation history, and the floor of all estimates so that cheap cohorts
+# don't get arbitrarily high priorities
+COHORT_CALCULATION_BASE_COST_SECONDS = 1.0
+ESTIMATED_CALCULATION_SECONDS_PER_PERSON = 0.00001
+
+INCREMENTAL_CALCULATION_CLAIM_KEY = "cohort_incremental_calculation_claim:{cohort_id}"
+
 
 def calculate_cohorts() -> None:
     # This task will be run every minute
     # Every minute, grab a few cohorts off the list and execute them
-    for cohort in (
+    due_cohorts = list(
         Cohort.objects.filter(
             deleted=False,
             is_calculating=False,
@@ -28,11 +43,110 @@ def calculate_cohorts() -> None:
             errors_calculating__lte=20,
         )
         .exclude(is_static=True)
-        .order_by(F("last_calculation").asc(nulls_first=True))[0 : settings.CALCULATE_X_COHORTS_PARALLEL]
-    ):
-
+        .only("id", "team_id", "filters", "groups", "count", "last_calculation")
+    )
+    try:
+        durations = get_cohort_calculation_durations(cohort.pk for cohort in due_cohorts)
+    except Exception:
+        logger.warning("cohort_calculation_history_unavailable", exc_info=True)
+        durations = {}
+
+    cohorts_to_calculate = schedule_cohort_calculations(
+        due_cohorts, durations, limit=settings.CALCULATE_X_COHORTS_PARALLEL
+    )
+    logger.info(
+        "cohort_calculations_scheduled",
+        due=len(due_cohorts),
+        scheduled=[cohort.pk for cohort in cohorts_to_calculate],
+    )
+
+    for cohort in cohorts_to_calculate:
         cohort = Cohort.objects.filter(pk=cohort.pk).get()
-        update_cohort(cohort)
+        if can_recalculate_cohortpeople_incrementally(cohort):
+            # Incremental runs don't take a new version, so claim the cohort for this one until it finishes, rather
+            # than dispatching it again every minute while it's queued or running
+            if claim_incremental_calculation(cohort, durations.get(cohort.pk)):
+                calculate_cohort_ch.delay(cohort.id, cohort.version, incremental=True)
+        else:
+            update_cohort(cohort)
+
+
+def claim_incremental_calculation(cohort: Cohort, durations: Optional[List[float]]) -> bool:
+    """
+    Claims the cohort for an incremental run. The claim is released when the run ends, and expires on its own
+    after the time between scheduled runs plus the run's expected duration, in case the run never happens.
+    """
+    ttl = MAX_AGE_MINUTES * 60 + estimate_calculation_cost(cohort, durations)
+    key = INCREMENTAL_CALCULATION_CLAIM_KEY.format(cohort_id=cohort.pk)
+    return bool(get_client().set(key, 1, nx=True, ex=math.ceil(ttl)))
+
+
+def schedule_cohort_calculations(
+    due_cohorts: Sequence[Cohort], durations: Dict[int, List[float]], limit: int
+) -> List[Cohort]:
+    """
+    Picks up to `limit` of the due cohorts to recalculate now.
+
+    Cohorts are visited in topological order of the cohorts they reference, and cohorts that are ready at the
+    same time by priority: how stale they are over how long they're expected to take, so that heavy cohorts
+    don't hold up light ones but still get their turn once stale enough. Cohorts referencing a cohort that is
+    itself due are left for a later run, so that they're calculated against its fresh membership.
+    Reference cycles are broken at their highest priority cohort.
+    """
+    now = timezone.now()
+    cohorts_by_id = {cohort.pk: cohort for cohort in due_cohorts}
+    dependencies = {
+        cohort.pk: {
+            dependency_id for dependency_id in get_cohort_dependency_ids(cohort) if dependency_id in cohorts_by_id
+        }
+        for cohort in due_cohorts
+    }
+    dependents: Dict[int, Set[int]] = {cohort_id: set() for cohort_id in cohorts_by_id}
+    for cohort_id, dependency_ids in dependencies.items():
+        for dependency_id in dependency_ids:
+            dependents[dependency_id].add(cohort_id)
+
+    priorities = {cohort.pk: _calculation_priority(cohort, durations.get(cohort.pk), now) for cohort in due_cohorts}
+    remaining_dependencies = {cohort_id: len(dependency_ids) for cohort_id, dependency_ids in dependencies.items()}
+    ready = [(-priorities[cohort_id], cohort_id) for cohort_id, count in remaining_dependencies.items() if not count]
+    heapq.heapify(ready)
+
+    visited: Set[int] = set()
+    scheduled: List[Cohort] = []
+    while len(visited) < len(cohorts_by_id) and len(scheduled) < limit:
+        if not ready:
+            # Only cohorts in reference cycles, or referencing them, are left
+            cohort_id = max(
+                (cohort_id for cohort_id in cohorts_by_id if cohort_id not in visited), key=priorities.__getitem__
+            )
+        else:
+            _, cohort_id = heapq.heappop(ready)
+            if cohort_id in visited:
+                continue
+
+        visited.add(cohort_id)
+        if not dependencies[cohort_id] & visited:
+            scheduled.append(cohorts_by_id[cohort_id])
+        for dependent_id in dependents[cohort_id]:
+            remaining_dependencies[dependent_id] -= 1
+            if remaining_dependencies[dependent_id] == 0 and dependent_id not in visited:
+                heapq.heappush(ready, (-priorities[dependent_id], dependent_id))
+
+    return scheduled
+
+
+def estimate_calculation_cost(cohort: Cohort, durations: Optional[List[float]]) -> float:
+    """Expected seconds to recalculate the cohort, from its previous calculations or else its size"""
+    if durations:
+        estimate = sum(durations) / len(durations)
+    else:
+        estimate = (cohort.count or 0) * ESTIMATED_CALCULATION_SECONDS_PER_PERSON
+    return max(estimate, COHORT_CALCULATION_BASE_COST_SECONDS)
+
+
+def _calculation_priority(cohort: Cohort, durations: Optional[List[float]], now: datetime) -> float:
+    staleness = max((now - (cohort.last_calculation or now)).total_seconds(), 0.0)
+    return staleness / estimate_calculation_cost(cohort, durations)
 
 
 def update_cohort(cohort: Cohort) -> None:
@@ -48,12 +162,16 @@ def clear_stale_cohort(cohort_id: int, current_version: int) -> None:
 
 
 @shared_task(ignore_result=True, max_retries=2)
-def calculate_cohort_ch(cohort_id: int, pending_version: int) -> None:
+def calculate_cohort_ch(cohort_id: int, pending_version: int, incremental: bool = False) -> None:
     cohort: Cohort = Cohort.objects.get(pk=cohort_id)
-    cohort.calculate_people_ch(pending_version)
+    try:
+        cohort.calculate_people_ch(pending_version, incremental=incremental)
+    finally:
+        if incremental:
+            get_client().delete(INCREMENTAL_CALCULATION_CLAIM_KEY.format(cohort_id=cohort_id))
 
 
-@shared_task(ignore_result=True, max_retries=1)
+@shared_task(ignore_result=True, max_retries=1, autoretry_for=(Exception,), retry_backoff=True)
 def calculate_cohort_from_list(cohort_id: int, items: List[str]) -> None:
     start_time = time.time()
     cohort = Cohort.objects.get(pk=cohort_id)
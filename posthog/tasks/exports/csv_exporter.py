@@ -1,15 +1,27 @@
+import csv
 import datetime
-from typing import Any, Dict, List, Optional, Tuple
+import io
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, cast
 from urllib.parse import parse_qsl, quote, urlencode, urlparse, urlunparse
 
 import requests
 import structlog
+from django.core.serializers.json import DjangoJSONEncoder
+from more_itertools import chunked
 from sentry_sdk import capture_exception, push_scope
 from statshog.defaults.django import statsd
 
+from posthog.clickhouse.client.connection import Workload
+from posthog.clickhouse.client.execute import sync_execute_iter
+from posthog.hogql import ast
+from posthog.hogql.parser import parse_select
+from posthog.hogql.query import compile_hogql_query
 from posthog.jwt import PosthogJwtAudience, encode_jwt
 from posthog.logging.timing import timed
-from posthog.models.exported_asset import ExportedAsset, save_content
+from posthog.models.event.events_query import build_events_query, expand_events_query_results, get_events_query_columns
+from posthog.models.exported_asset import ExportedAsset, save_content, save_content_stream
+from posthog.schema import EventsQuery, HogQLQuery
 from posthog.utils import absolute_uri
 
 from .ordered_csv_renderer import OrderedCsvRenderer
@@ -40,6 +52,15 @@ logger = structlog.get_logger(__name__)
 # 3. We save the response to a chunk in object storage and then load the `next` page of results
 # 4. Repeat until exhausted or limit reached
 # 5. We save the final blob output and update the ExportedAsset
+#
+# Exports of a query (an export context with a "source" query node rather than a "path") skip the API instead:
+# 1. We run the query in-process, reading the rows from ClickHouse a block at a time
+# 2. Each block is rendered to CSV and written to a multipart upload in object storage as it comes
+# so that exports of millions of rows only ever hold a block in memory
+
+# Rows of a query export rendered to CSV at a time, also the ClickHouse block size they are read in
+STREAMING_EXPORT_BLOCK_SIZE = 10_000
+STREAMING_EXPORT_MAX_LIMIT = 10_000_000
 
 
 def add_query_params(url: str, params: Dict[str, str]) -> str:
@@ -210,7 +231,7 @@ def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit:
 
         csv_rows = _convert_response_to_csv_data(data)
 
-        all_csv_rows = all_csv_rows + csv_rows
+        all_csv_rows.extend(csv_rows)
 
         if not data.get("next") or not csv_rows:
             break
@@ -234,6 +255,88 @@ def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit:
     save_content(exported_asset, rendered_csv_content)
 
 
+def _export_query_to_csv(exported_asset: ExportedAsset, max_limit: int) -> None:
+    resource = exported_asset.export_context
+    source: Dict = resource["source"]
+    columns: List[str] = resource.get("columns", [])
+    team = exported_asset.team
+    limit = min(max_limit, STREAMING_EXPORT_MAX_LIMIT)
+
+    column_names: Optional[List[str]] = None
+    expand_rows: Optional[Callable[[List], List]] = None
+    if source.get("kind") == "HogQLQuery":
+        select_query = cast(ast.SelectQuery, parse_select(HogQLQuery.parse_obj(source).query))
+        select_query.limit = _limit_expr(select_query.limit, limit)
+    elif source.get("kind") == "EventsQuery":
+        events_query = EventsQuery.parse_obj(source)
+        select_query = build_events_query(team, events_query, limit)
+        column_names = get_events_query_columns(events_query)
+        expand_rows = lambda rows: expand_events_query_results(team, events_query, rows)
+    else:
+        raise NotImplementedError(f"Export of {source.get('kind')} queries is not supported")
+
+    compiled = compile_hogql_query(select_query, team, limit_top_select=False)
+    rows = sync_execute_iter(
+        compiled.clickhouse,
+        dict(compiled.values),
+        settings={"max_block_size": STREAMING_EXPORT_BLOCK_SIZE},
+        workload=Workload.OFFLINE,
+    )
+
+    blocks: Iterable[List] = chunked(rows, STREAMING_EXPORT_BLOCK_SIZE)
+    if expand_rows is not None:
+        blocks = map(expand_rows, blocks)
+
+    save_content_stream(exported_asset, _render_csv_blocks(blocks, column_names or compiled.columns, columns))
+
+
+def _limit_expr(limit: Optional[ast.Expr], max_limit: int) -> ast.Expr:
+    if limit is None:
+        return ast.Constant(value=max_limit)
+    if isinstance(limit, ast.Constant) and isinstance(limit.value, int):
+        return ast.Constant(value=min(limit.value, max_limit))
+    return ast.Call(name="min2", args=[ast.Constant(value=max_limit), limit])
+
+
+def _render_csv_blocks(blocks: Iterable[List], column_names: List[str], columns: List[str]) -> Iterator[bytes]:
+    """
+    Renders blocks of query result rows to CSV, a block at a time, so that the header is written before the rest is
+    read. Without exported `columns` that's the query's columns, with nested values written as JSON, as they can
+    have keys not seen before in any block.
+
+    Exported `columns` can pick nested values like `OrderedCsvRenderer` names them, e.g. "person.properties.email",
+    and columns of the query with nested values are written as JSON too.
+    """
+    renderer = OrderedCsvRenderer()
+    header: List[str] = columns or column_names
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    for block in blocks:
+        for row in block:
+            values = dict(zip(column_names, row))
+            flattened = renderer.flatten_item(values) if columns else values
+            writer.writerow([_csv_value(flattened[key] if key in flattened else values.get(key)) for key in header])
+
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        # Only the header of an export without results
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _csv_value(value: Any) -> Any:
+    # Formatted like the API would, for exports to look the same whichever way they were made
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+
 def make_api_call(
     access_token: str, body: Any, limit: int, method: str, next_url: Optional[str], path: str
 ) -> requests.models.Response:
@@ -263,7 +366,10 @@ def export_csv(exported_asset: ExportedAsset, limit: Optional[int] = None, max_l
         limit = 1000
 
     try:
-        if exported_asset.export_format == "text/csv":
+        if exported_asset.export_format == "text/csv" and "source" in exported_asset.export_context:
+            _export_query_to_csv(exported_asset, max_limit)
+            statsd.incr("csv_exporter.succeeded", tags={"team_id": exported_asset.team.id})
+        elif exported_asset.export_format == "text/csv":
             _export_to_csv(exported_asset, limit, max_limit)
             statsd.incr("csv_exporter.succeeded", tags={"team_id": exported_asset.team.id})
         else:
@@ -1,3 +1,6 @@
+import csv
+import io
+import json
 from typing import Any, Dict, Optional
 from unittest.mock import MagicMock, Mock, patch
 
@@ -5,6 +8,7 @@ import pytest
 from boto3 import resource
 from botocore.client import Config
 from django.test import override_settings
+from freezegun import freeze_time
 
 from posthog.models import ExportedAsset
 from posthog.settings import (
@@ -17,7 +21,7 @@ from posthog.storage import object_storage
 from posthog.storage.object_storage import ObjectStorageError
 from posthog.tasks.exports import csv_exporter
 from posthog.tasks.exports.csv_exporter import UnexpectedEmptyJsonResponse, add_query_params
-from posthog.test.base import APIBaseTest
+from posthog.test.base import APIBaseTest, ClickhouseTestMixin, _create_event, _create_person
 from posthog.utils import absolute_uri
 
 TEST_BUCKET = "Test-Exports"
@@ -260,3 +264,117 @@ class TestCSVExporter(APIBaseTest):
         first_split_parts = url.split("?")
         assert len(first_split_parts) == 2
         return {bits[0]: bits[1] for bits in [param.split("=") for param in first_split_parts[1].split("&")]}
+
+
+@freeze_time("2023-03-21T12:00:00Z")
+class TestCSVQueryExporter(ClickhouseTestMixin, APIBaseTest):
+    def setUp(self):
+        super().setUp()
+        _create_person(team_id=self.team.pk, distinct_ids=["1"], properties={"email": "one@posthog.com"})
+        for distinct_id, browser in [("1", "Safari"), ("2", "Chrome"), ("1", "Firefox")]:
+            _create_event(
+                team=self.team,
+                event="event_name",
+                distinct_id=distinct_id,
+                properties={"$browser": browser},
+                timestamp="2023-03-21T11:00:00Z",
+            )
+
+    def _create_asset(self, export_context: Dict) -> ExportedAsset:
+        asset = ExportedAsset(
+            team=self.team, export_format=ExportedAsset.ExportFormat.CSV, export_context=export_context
+        )
+        asset.save()
+        return asset
+
+    @patch("posthog.tasks.exports.csv_exporter.STREAMING_EXPORT_BLOCK_SIZE", 2)
+    def test_exports_hogql_query_in_blocks(self) -> None:
+        exported_asset = self._create_asset(
+            {
+                "source": {
+                    "kind": "HogQLQuery",
+                    "query": "select distinct_id, properties.$browser as browser from events order by browser",
+                }
+            }
+        )
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset)
+
+        assert exported_asset.content == b"distinct_id,browser\r\n2,Chrome\r\n1,Firefox\r\n1,Safari\r\n"
+
+    def test_exports_are_limited_to_max_limit(self) -> None:
+        exported_asset = self._create_asset(
+            {
+                "source": {
+                    "kind": "HogQLQuery",
+                    "query": "select properties.$browser as browser from events order by browser limit 100",
+                },
+                "max_limit": 2,
+            }
+        )
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset, max_limit=2)
+
+        assert exported_asset.content == b"browser\r\nChrome\r\nFirefox\r\n"
+
+    def test_exports_events_query_with_persons_and_columns(self) -> None:
+        exported_asset = self._create_asset(
+            {
+                "source": {
+                    "kind": "EventsQuery",
+                    "select": ["event", "person", "properties.$browser"],
+                    "orderBy": ["properties.$browser"],
+                },
+                "columns": ["properties.$browser", "person.distinct_id", "person.properties.email"],
+            }
+        )
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset)
+
+        assert exported_asset.content == (
+            b"properties.$browser,person.distinct_id,person.properties.email\r\n"
+            b"Chrome,2,\r\n"
+            b"Firefox,1,one@posthog.com\r\n"
+            b"Safari,1,one@posthog.com\r\n"
+        )
+
+    @patch("posthog.tasks.exports.csv_exporter.STREAMING_EXPORT_BLOCK_SIZE", 1)
+    def test_exports_nested_values_first_seen_in_later_blocks_as_json(self) -> None:
+        _create_event(
+            team=self.team,
+            event="event_name",
+            distinct_id="1",
+            properties={"$browser": "Zen", "$os": "Mac OS X"},
+            timestamp="2023-03-21T11:00:00Z",
+        )
+        exported_asset = self._create_asset(
+            {"source": {"kind": "EventsQuery", "select": ["event", "*"], "orderBy": ["properties.$browser"]}}
+        )
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset)
+
+        header, *rows = list(csv.reader(io.StringIO(exported_asset.content.decode("utf-8"))))
+        assert header == ["event", "*"]
+        assert [row[0] for row in rows] == ["event_name"] * 4
+        assert [json.loads(row[1])["properties"] for row in rows] == [
+            {"$browser": "Chrome"},
+            {"$browser": "Firefox"},
+            {"$browser": "Safari"},
+            {"$browser": "Zen", "$os": "Mac OS X"},
+        ]
+
+    @patch("posthog.models.exported_asset.UUIDT")
+    def test_exports_query_to_object_storage(self, mocked_uuidt) -> None:
+        mocked_uuidt.return_value = "a-guid"
+        exported_asset = self._create_asset(
+            {"source": {"kind": "HogQLQuery", "query": "select count() as count from events"}}
+        )
+        with self.settings(OBJECT_STORAGE_ENABLED=True, OBJECT_STORAGE_EXPORTS_FOLDER="Test-Exports"):
+            csv_exporter.export_csv(exported_asset)
+
+            assert (
+                exported_asset.content_location
+                == f"/{TEST_BUCKET}/csv/team-{self.team.id}/task-{exported_asset.id}/a-guid"
+            )
+            assert object_storage.read(exported_asset.content_location) == "count\r\n3\r\n"
+            assert exported_asset.content is None
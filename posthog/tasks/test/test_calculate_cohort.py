@@ -1,13 +1,100 @@
-from typing import Callable
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
 from unittest.mock import MagicMock, patch
 
+from django.utils import timezone
 from freezegun import freeze_time
 
 from posthog.models.cohort import Cohort
 from posthog.models.feature_flag import FeatureFlag
 from posthog.models.person import Person
-from posthog.tasks.calculate_cohort import calculate_cohort_from_list, calculate_cohorts
-from posthog.test.base import APIBaseTest
+from posthog.redis import get_client
+from posthog.tasks.calculate_cohort import (
+    INCREMENTAL_CALCULATION_CLAIM_KEY,
+    MAX_AGE_MINUTES,
+    calculate_cohort_ch,
+    calculate_cohort_from_list,
+    calculate_cohorts,
+    schedule_cohort_calculations,
+)
+from posthog.test.base import APIBaseTest, BaseTest
+
+
+def _due_cohort(id: int, minutes_stale: int, references: Optional[List[int]] = None, count: int = 0) -> Cohort:
+    properties = [{"key": "id", "type": "cohort", "value": reference} for reference in references or []]
+    return Cohort(
+        id=id,
+        team_id=1,
+        count=count,
+        last_calculation=timezone.now() - timedelta(minutes=minutes_stale),
+        filters={"properties": {"type": "AND", "values": properties}},
+    )
+
+
+def _scheduled_ids(cohorts: List[Cohort], limit: int = 5, durations: Optional[Dict[int, List[float]]] = None):
+    return [cohort.pk for cohort in schedule_cohort_calculations(cohorts, durations or {}, limit=limit)]
+
+
+@freeze_time("2023-05-01T12:00:00Z")
+class TestScheduleCohortCalculations(BaseTest):
+    def test_stalest_cohorts_go_first(self):
+        cohorts = [_due_cohort(1, 20), _due_cohort(2, 60), _due_cohort(3, 30)]
+
+        self.assertEqual(_scheduled_ids(cohorts, limit=2), [2, 3])
+
+    def test_expensive_cohorts_wait_longer(self):
+        cohorts = [_due_cohort(1, 60), _due_cohort(2, 30), _due_cohort(3, 30, count=10_000_000)]
+
+        self.assertEqual(_scheduled_ids(cohorts, durations={1: [300.0, 500.0]}), [2, 3, 1])
+
+    def test_cohorts_wait_for_the_due_cohorts_they_reference(self):
+        cohorts = [_due_cohort(1, 20, references=[2]), _due_cohort(2, 20, references=[3]), _due_cohort(3, 20)]
+
+        self.assertEqual(_scheduled_ids(cohorts), [3])
+        # References to cohorts that aren't due don't hold anything up
+        self.assertEqual(_scheduled_ids(cohorts[:2]), [2])
+
+    def test_reference_cycles_are_broken(self):
+        cohorts = [_due_cohort(1, 20, references=[2]), _due_cohort(2, 30, references=[1]), _due_cohort(3, 15)]
+
+        self.assertEqual(_scheduled_ids(cohorts), [3, 2])
+
+
+class TestCalculateCohorts(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.cohort = Cohort.objects.create(
+            team=self.team,
+            groups=[{"properties": [{"key": "$some_prop", "value": "a", "type": "person"}]}],
+            last_calculation=timezone.now() - timedelta(hours=1),
+            version=1,
+        )
+        self.claim_key = INCREMENTAL_CALCULATION_CLAIM_KEY.format(cohort_id=self.cohort.pk)
+        get_client().delete(self.claim_key)
+
+    @patch("posthog.tasks.calculate_cohort.calculate_cohort_ch.delay")
+    @patch("posthog.tasks.calculate_cohort.can_recalculate_cohortpeople_incrementally", return_value=True)
+    def test_incremental_recalculations_are_not_dispatched_while_claimed(self, _, calculate_cohort_ch):
+        calculate_cohorts()
+        calculate_cohorts()
+
+        calculate_cohort_ch.assert_called_once_with(self.cohort.pk, 1, incremental=True)
+        # The claim expires on its own if the run never happens
+        self.assertGreaterEqual(get_client().ttl(self.claim_key), MAX_AGE_MINUTES * 60)
+
+        get_client().delete(self.claim_key)
+        calculate_cohorts()
+
+        self.assertEqual(calculate_cohort_ch.call_count, 2)
+
+    @patch("posthog.models.cohort.Cohort.calculate_people_ch")
+    def test_incremental_recalculations_release_their_claim(self, calculate_people_ch):
+        get_client().set(self.claim_key, 1)
+
+        calculate_cohort_ch(self.cohort.pk, 1, incremental=True)
+
+        calculate_people_ch.assert_called_once_with(1, incremental=True)
+        self.assertIsNone(get_client().get(self.claim_key))
 
 
 def calculate_cohort_test_factory(event_factory: Callable, person_factory: Callable):  # type: ignore
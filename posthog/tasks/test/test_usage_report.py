@@ -16,10 +16,16 @@ from posthog.models.dashboard import Dashboard
 from posthog.models.feature_flag import FeatureFlag
 from posthog.models.group.util import create_group
 from posthog.models.group_type_mapping import GroupTypeMapping
+from posthog.models.organization import OrganizationMembership
 from posthog.models.plugin import PluginConfig
 from posthog.models.sharing_configuration import SharingConfiguration
+from posthog.models.user import User
 from posthog.session_recordings.test.test_factory import create_snapshot
-from posthog.tasks.usage_report import send_all_org_usage_reports
+from posthog.tasks.usage_report import (
+    convert_team_usage_rows_to_dict,
+    get_org_user_counts,
+    send_all_org_usage_reports,
+)
 from posthog.test.base import (
     APIBaseTest,
     ClickhouseDestroyTablesMixin,
@@ -585,3 +591,25 @@ class SendUsageNoLicenseTest(APIBaseTest):
         send_all_org_usage_reports()
 
         mock_post.assert_not_called()
+
+
+class UsageReportHelpersTest(APIBaseTest):
+    def test_convert_team_usage_rows_to_dict(self) -> None:
+        self.assertEqual(convert_team_usage_rows_to_dict([(1, 10), (2, 20)]), {1: 10, 2: 20})
+        self.assertEqual(
+            convert_team_usage_rows_to_dict([{"team_id": 1, "total": 10}, {"team_id": 3, "total": 30}]),
+            {1: 10, 3: 30},
+        )
+        self.assertEqual(convert_team_usage_rows_to_dict([]), {})
+
+    def test_get_org_user_counts(self) -> None:
+        other_organization = Organization.objects.create(name="Other org")
+        Organization.objects.create(name="Org without members")
+        for index in range(2):
+            user = User.objects.create(email=f"user-{index}@posthog.com")
+            OrganizationMembership.objects.create(organization=other_organization, user=user)
+
+        self.assertEqual(
+            get_org_user_counts(),
+            {str(self.organization.id): 1, str(other_organization.id): 2},
+        )
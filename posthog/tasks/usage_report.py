@@ -1,10 +1,12 @@
 import dataclasses
 import os
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import (
     Any,
     Dict,
+    Iterable,
     List,
     Optional,
     Sequence,
@@ -41,6 +43,9 @@ from posthog.version import VERSION
 
 logger = structlog.get_logger(__name__)
 
+# The ClickHouse counts of the report are independent of each other, so they are queried concurrently
+USAGE_REPORT_CLICKHOUSE_WORKERS = 4
+
 Period = TypedDict("Period", {"start_inclusive": str, "end_inclusive": str})
 TableSizes = TypedDict("TableSizes", {"posthog_event": int, "posthog_sessionrecordingevent": int})
 
@@ -193,8 +198,11 @@ def get_instance_metadata(period: Tuple[datetime, datetime]) -> InstanceMetadata
     return metadata
 
 
-def get_org_user_count(organization_id: str) -> int:
-    return OrganizationMembership.objects.filter(organization_id=organization_id).count()
+def get_org_user_counts() -> Dict[str, int]:
+    return {
+        str(row["organization_id"]): row["total"]
+        for row in OrganizationMembership.objects.values("organization_id").annotate(total=Count("id")).order_by()
+    }
 
 
 def get_org_owner_or_first_user(organization_id: str) -> Optional[User]:
@@ -375,14 +383,15 @@ def get_teams_with_recording_count_total() -> List[Tuple[int, int]]:
     return result
 
 
-def find_count_for_team_in_rows(team_id: int, rows: list) -> int:
+def convert_team_usage_rows_to_dict(rows: Iterable[Union[dict, Tuple[int, int]]]) -> Dict[int, int]:
+    """Indexes the counts of a query by team_id, from either (team_id, count) rows or {"team_id", "total"} dicts"""
+    team_id_map: Dict[int, int] = {}
     for row in rows:
-        if "team_id" in row:
-            if row["team_id"] == team_id:
-                return row["total"]
-        elif row[0] == team_id:
-            return row[1]
-    return 0
+        if isinstance(row, dict):
+            team_id_map[row["team_id"]] = row["total"]
+        else:
+            team_id_map[row[0]] = row[1]
+    return team_id_map
 
 
 @app.task(ignore_result=True, retries=0)
@@ -406,95 +415,29 @@ def has_non_zero_usage(report: FullUsageReport) -> bool:
     return report.event_count_in_period > 0 or report.recording_count_in_period > 0
 
 
-@app.task(ignore_result=True, retries=3)
-def send_all_org_usage_reports(
-    dry_run: bool = False,
-    at: Optional[str] = None,
-    capture_event_name: Optional[str] = None,
-    skip_capture_event: bool = False,
-    only_organization_id: Optional[str] = None,
-) -> List[dict]:  # Dict[str, OrgReport]:
-    capture_event_name = capture_event_name or "organization usage report"
-
-    at_date = dateutil.parser.parse(at) if at else None
-    period = get_previous_day(at=at_date)
-    period_start, period_end = period
-
-    instance_metadata = get_instance_metadata(period)
-
-    # Clickhouse is good at counting things so we count across all teams rather than doing it one by one
-    all_data = dict(
-        teams_with_event_count_lifetime=get_teams_with_event_count_lifetime(),
-        teams_with_event_count_in_period=get_teams_with_event_count_in_period(period_start, period_end),
-        teams_with_event_count_in_month=get_teams_with_event_count_in_period(period_start.replace(day=1), period_end),
-        teams_with_event_count_with_groups_in_period=get_teams_with_event_count_with_groups_in_period(
-            period_start, period_end
-        ),
-        # teams_with_event_count_by_lib=get_teams_with_event_count_by_lib(period_start, period_end),
-        # teams_with_event_count_by_name=get_teams_with_event_count_by_name(period_start, period_end),
-        teams_with_recording_count_in_period=get_teams_with_recording_count_in_period(period_start, period_end),
-        teams_with_recording_count_total=get_teams_with_recording_count_total(),
-        teams_with_group_types_total=list(
-            GroupTypeMapping.objects.values("team_id").annotate(total=Count("id")).order_by("team_id")
-        ),
-        teams_with_dashboard_count=list(
-            Dashboard.objects.values("team_id").annotate(total=Count("id")).order_by("team_id")
-        ),
-        teams_with_dashboard_template_count=list(
-            Dashboard.objects.filter(creation_mode="template")
-            .values("team_id")
-            .annotate(total=Count("id"))
-            .order_by("team_id")
-        ),
-        teams_with_dashboard_shared_count=list(
-            Dashboard.objects.filter(sharingconfiguration__enabled=True)
-            .values("team_id")
-            .annotate(total=Count("id"))
-            .order_by("team_id")
-        ),
-        teams_with_dashboard_tagged_count=list(
-            Dashboard.objects.filter(tagged_items__isnull=False)
-            .values("team_id")
-            .annotate(total=Count("id"))
-            .order_by("team_id")
-        ),
-        teams_with_ff_count=list(FeatureFlag.objects.values("team_id").annotate(total=Count("id")).order_by("team_id")),
-        teams_with_ff_active_count=list(
-            FeatureFlag.objects.filter(active=True).values("team_id").annotate(total=Count("id")).order_by("team_id")
-        ),
-    )
-
-    teams: Sequence[Team] = list(
-        Team.objects.select_related("organization").exclude(
-            Q(organization__for_internal_metrics=True) | Q(is_demo=True)
-        )
-    )
-
+def build_org_reports(
+    teams: Iterable[Team], all_data: Dict[str, Dict[int, int]], org_user_counts: Dict[str, int], period_start: datetime
+) -> Dict[str, OrgReport]:
+    """Sums up the counts of `all_data`, indexed by team_id, into a report per organization"""
     org_reports: Dict[str, OrgReport] = {}
 
     for team in teams:
         team_report = UsageReportCounters(
-            event_count_lifetime=find_count_for_team_in_rows(team.id, all_data["teams_with_event_count_lifetime"]),
-            event_count_in_period=find_count_for_team_in_rows(team.id, all_data["teams_with_event_count_in_period"]),
-            event_count_in_month=find_count_for_team_in_rows(team.id, all_data["teams_with_event_count_in_month"]),
-            event_count_with_groups_in_period=find_count_for_team_in_rows(
-                team.id, all_data["teams_with_event_count_with_groups_in_period"]
-            ),
-            # event_count_by_lib: Difind_count_for_team_in_rows(team.id, all_data["teams_with_#"]),
-            # event_count_by_name: Difind_count_for_team_in_rows(team.id, all_data["teams_with_#"]),
-            recording_count_in_period=find_count_for_team_in_rows(
-                team.id, all_data["teams_with_recording_count_in_period"]
-            ),
-            recording_count_total=find_count_for_team_in_rows(team.id, all_data["teams_with_recording_count_total"]),
-            group_types_total=find_count_for_team_in_rows(team.id, all_data["teams_with_group_types_total"]),
-            dashboard_count=find_count_for_team_in_rows(team.id, all_data["teams_with_dashboard_count"]),
-            dashboard_template_count=find_count_for_team_in_rows(
-                team.id, all_data["teams_with_dashboard_template_count"]
-            ),
-            dashboard_shared_count=find_count_for_team_in_rows(team.id, all_data["teams_with_dashboard_shared_count"]),
-            dashboard_tagged_count=find_count_for_team_in_rows(team.id, all_data["teams_with_dashboard_tagged_count"]),
-            ff_count=find_count_for_team_in_rows(team.id, all_data["teams_with_ff_count"]),
-            ff_active_count=find_count_for_team_in_rows(team.id, all_data["teams_with_ff_active_count"]),
+            event_count_lifetime=all_data["teams_with_event_count_lifetime"].get(team.id, 0),
+            event_count_in_period=all_data["teams_with_event_count_in_period"].get(team.id, 0),
+            event_count_in_month=all_data["teams_with_event_count_in_month"].get(team.id, 0),
+            event_count_with_groups_in_period=all_data["teams_with_event_count_with_groups_in_period"].get(team.id, 0),
+            # event_count_by_lib: all_data["teams_with_#"].get(team.id, 0),
+            # event_count_by_name: all_data["teams_with_#"].get(team.id, 0),
+            recording_count_in_period=all_data["teams_with_recording_count_in_period"].get(team.id, 0),
+            recording_count_total=all_data["teams_with_recording_count_total"].get(team.id, 0),
+            group_types_total=all_data["teams_with_group_types_total"].get(team.id, 0),
+            dashboard_count=all_data["teams_with_dashboard_count"].get(team.id, 0),
+            dashboard_template_count=all_data["teams_with_dashboard_template_count"].get(team.id, 0),
+            dashboard_shared_count=all_data["teams_with_dashboard_shared_count"].get(team.id, 0),
+            dashboard_tagged_count=all_data["teams_with_dashboard_tagged_count"].get(team.id, 0),
+            ff_count=all_data["teams_with_ff_count"].get(team.id, 0),
+            ff_active_count=all_data["teams_with_ff_active_count"].get(team.id, 0),
         )
 
         org_id = str(team.organization.id)
@@ -505,7 +448,7 @@ def send_all_org_usage_reports(
                 organization_id=org_id,
                 organization_name=team.organization.name,
                 organization_created_at=team.organization.created_at.isoformat(),
-                organization_user_count=get_org_user_count(org_id),
+                organization_user_count=org_user_counts.get(org_id, 0),
                 team_count=1,
                 teams={str(team.id): team_report},
                 **dataclasses.asdict(team_report),  # Clone the team report as the basis
@@ -525,6 +468,85 @@ def send_all_org_usage_reports(
                         getattr(org_report, field.name) + getattr(team_report, field.name),
                     )
 
+    return org_reports
+
+
+@app.task(ignore_result=True, retries=3)
+def send_all_org_usage_reports(
+    dry_run: bool = False,
+    at: Optional[str] = None,
+    capture_event_name: Optional[str] = None,
+    skip_capture_event: bool = False,
+    only_organization_id: Optional[str] = None,
+) -> List[dict]:  # Dict[str, OrgReport]:
+    capture_event_name = capture_event_name or "organization usage report"
+
+    at_date = dateutil.parser.parse(at) if at else None
+    period = get_previous_day(at=at_date)
+    period_start, period_end = period
+
+    # Clickhouse is good at counting things so we count across all teams rather than doing it one by one
+    clickhouse_queries: Dict[str, Tuple[Any, ...]] = dict(
+        teams_with_event_count_lifetime=(get_teams_with_event_count_lifetime,),
+        teams_with_event_count_in_period=(get_teams_with_event_count_in_period, period_start, period_end),
+        teams_with_event_count_in_month=(
+            get_teams_with_event_count_in_period,
+            period_start.replace(day=1),
+            period_end,
+        ),
+        teams_with_event_count_with_groups_in_period=(
+            get_teams_with_event_count_with_groups_in_period,
+            period_start,
+            period_end,
+        ),
+        # teams_with_event_count_by_lib=(get_teams_with_event_count_by_lib, period_start, period_end),
+        # teams_with_event_count_by_name=(get_teams_with_event_count_by_name, period_start, period_end),
+        teams_with_recording_count_in_period=(get_teams_with_recording_count_in_period, period_start, period_end),
+        teams_with_recording_count_total=(get_teams_with_recording_count_total,),
+    )
+
+    postgres_queries: Dict[str, Any] = dict(
+        teams_with_group_types_total=GroupTypeMapping.objects.values("team_id")
+        .annotate(total=Count("id"))
+        .order_by("team_id"),
+        teams_with_dashboard_count=Dashboard.objects.values("team_id").annotate(total=Count("id")).order_by("team_id"),
+        teams_with_dashboard_template_count=Dashboard.objects.filter(creation_mode="template")
+        .values("team_id")
+        .annotate(total=Count("id"))
+        .order_by("team_id"),
+        teams_with_dashboard_shared_count=Dashboard.objects.filter(sharingconfiguration__enabled=True)
+        .values("team_id")
+        .annotate(total=Count("id"))
+        .order_by("team_id"),
+        teams_with_dashboard_tagged_count=Dashboard.objects.filter(tagged_items__isnull=False)
+        .values("team_id")
+        .annotate(total=Count("id"))
+        .order_by("team_id"),
+        teams_with_ff_count=FeatureFlag.objects.values("team_id").annotate(total=Count("id")).order_by("team_id"),
+        teams_with_ff_active_count=FeatureFlag.objects.filter(active=True)
+        .values("team_id")
+        .annotate(total=Count("id"))
+        .order_by("team_id"),
+    )
+
+    with ThreadPoolExecutor(max_workers=USAGE_REPORT_CLICKHOUSE_WORKERS, thread_name_prefix="usage-report") as executor:
+        clickhouse_futures = {key: executor.submit(*query) for key, query in clickhouse_queries.items()}
+
+        # Postgres is queried on this thread in the meantime
+        instance_metadata = get_instance_metadata(period)
+        all_data = {key: convert_team_usage_rows_to_dict(rows) for key, rows in postgres_queries.items()}
+        org_user_counts = get_org_user_counts()
+        teams: Sequence[Team] = list(
+            Team.objects.select_related("organization").exclude(
+                Q(organization__for_internal_metrics=True) | Q(is_demo=True)
+            )
+        )
+
+        for key, future in clickhouse_futures.items():
+            all_data[key] = convert_team_usage_rows_to_dict(future.result())
+
+    org_reports = build_org_reports(teams, all_data, org_user_counts, period_start)
+
     all_reports = []
 
     for org_report in org_reports.values():
@@ -1,4 +1,5 @@
 from datetime import timedelta
+from threading import Thread
 from time import sleep
 from typing import Optional
 from unittest.mock import Mock
@@ -93,3 +94,50 @@ class TestCacheUtils(APIBaseTest):
             "Background task finished",
             "Post refresh call 1",
         ]
+
+    def test_cache_for_evicts_least_recently_used(self) -> None:
+        @cache_for(timedelta(minutes=1), max_size=2)
+        def bounded_fn(number: int) -> int:
+            return mocked_dependency(number)
+
+        bounded_fn(1, use_cache=True)
+        bounded_fn(2, use_cache=True)
+        bounded_fn(1, use_cache=True)
+        bounded_fn(3, use_cache=True)  # evicts 2, the least recently used
+
+        assert len(bounded_fn._cache) == 2
+        assert ((1,), frozenset()) in bounded_fn._cache
+        assert ((2,), frozenset()) not in bounded_fn._cache
+
+        bounded_fn(2, use_cache=True)
+        assert mocked_dependency.call_count == 4
+
+    def test_cache_for_computes_a_key_once_for_concurrent_callers(self) -> None:
+        @cache_for(timedelta(minutes=1))
+        def slow_fn(number: int) -> int:
+            sleep(0.1)
+            return mocked_dependency(number)
+
+        results = []
+        threads = [Thread(target=lambda: results.append(slow_fn(1, use_cache=True))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [1] * 5
+        assert mocked_dependency.call_count == 1
+
+    def test_cache_for_does_not_cache_failures(self) -> None:
+        failing_dependency = Mock(side_effect=[ValueError("boom"), 2])
+
+        @cache_for(timedelta(minutes=1))
+        def failing_fn() -> int:
+            return failing_dependency()
+
+        with self.assertRaises(ValueError):
+            failing_fn(use_cache=True)
+
+        assert 2 == failing_fn(use_cache=True)
+        assert 2 == failing_fn(use_cache=True)
+        assert failing_dependency.call_count == 2
@@ -1,8 +1,12 @@
+from unittest.mock import patch
+
 import pytest
 
 from posthog.client import sync_execute
 from posthog.models import Cohort, Person, Team
+from posthog.models.cohort.bulk_upload import _bulk_upload_progress_key
 from posthog.models.cohort.sql import GET_COHORTPEOPLE_BY_COHORT_ID
+from posthog.redis import get_client
 from posthog.test.base import BaseTest
 
 
@@ -33,6 +37,44 @@ class TestCohort(BaseTest):
         self.assertEqual(cohort.people.count(), 2)
         self.assertEqual(cohort.is_calculating, False)
 
+    @patch("posthog.models.cohort.bulk_upload.BULK_UPLOAD_CHUNK_SIZE", 2)
+    @patch("posthog.models.cohort.bulk_upload.BULK_UPLOAD_THRESHOLD", 1)
+    def test_insert_by_distinct_id_in_bulk(self):
+        Person.objects.create(team=self.team, distinct_ids=["000"])
+        Person.objects.create(team=self.team, distinct_ids=["123", "124"])
+        Person.objects.create(team=self.team, distinct_ids=["tab\tand\\backslash"])
+        # Team leakage
+        team2 = Team.objects.create(organization=self.organization)
+        Person.objects.create(team=team2, distinct_ids=["456"])
+
+        cohort = Cohort.objects.create(team=self.team, groups=[], is_static=True)
+        items = ["a header or something", "123", "000", "124", "456", "tab\tand\\backslash"]
+        cohort.insert_users_by_list(items)
+        cohort = Cohort.objects.get()
+        self.assertEqual(cohort.people.count(), 3)
+        self.assertEqual(cohort.is_calculating, False)
+        self.assertEqual(cohort.errors_calculating, 0)
+        # Finished uploads don't leave their progress behind
+        self.assertFalse(get_client().exists(_bulk_upload_progress_key(cohort, items)))
+
+        # if we add people again, don't increase the number of people in cohort
+        cohort.insert_users_by_list(["124", "000"])
+        self.assertEqual(cohort.people.count(), 3)
+
+    @patch("posthog.models.cohort.bulk_upload.BULK_UPLOAD_CHUNK_SIZE", 1)
+    @patch("posthog.models.cohort.bulk_upload.BULK_UPLOAD_THRESHOLD", 1)
+    def test_bulk_insert_skips_finished_chunks(self):
+        Person.objects.create(team=self.team, distinct_ids=["000"])
+        Person.objects.create(team=self.team, distinct_ids=["123"])
+
+        cohort = Cohort.objects.create(team=self.team, groups=[], is_static=True)
+        items = ["000", "123"]
+        # As if a previous attempt got through the first chunk before being interrupted
+        get_client().sadd(_bulk_upload_progress_key(cohort, items), 0)
+        cohort.insert_users_by_list(items)
+
+        self.assertEqual([person.distinct_ids for person in cohort.people.all()], [["123"]])
+
     @pytest.mark.ee
     def test_calculating_cohort_clickhouse(self):
         cohort = Cohort.objects.create(
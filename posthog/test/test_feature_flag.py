@@ -1,20 +1,25 @@
 import concurrent.futures
+import hashlib
 from typing import cast
+from unittest.mock import patch
 
 from django.core.cache import cache
-from django.db import IntegrityError, connection
+from django.db import DatabaseError, IntegrityError, connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from posthog.models import Cohort, FeatureFlag, GroupTypeMapping, Person
-from posthog.models.feature_flag import get_feature_flags_for_team_in_cache
+from posthog.models.feature_flag import get_compiled_feature_flags_for_team, get_feature_flags_for_team_in_cache
 from posthog.models.feature_flag.flag_matching import (
+    FeatureFlagEvaluationTarget,
     FeatureFlagHashKeyOverride,
     FeatureFlagMatch,
     FeatureFlagMatcher,
     FeatureFlagMatchReason,
     FlagsMatcherCache,
     get_all_feature_flags,
+    get_all_feature_flags_for_distinct_ids,
     get_feature_flag_hash_key_overrides,
     set_feature_flag_hash_key_overrides,
 )
@@ -560,6 +565,69 @@ class TestModelCache(BaseTest):
         assert cached_flags is not None
         self.assertEqual(0, len(cached_flags))
 
+    def test_compiled_flags_are_reused_until_flags_change(self):
+        flag = FeatureFlag.objects.create(
+            team=self.team,
+            name="Beta feature",
+            key="beta-feature",
+            created_by=self.user,
+            filters={
+                "groups": [
+                    {"properties": [{"key": "email", "value": "a@b.com", "type": "person"}]},
+                    {"properties": [], "rollout_percentage": 50, "variant": "second"},
+                ],
+                "multivariate": {
+                    "variants": [
+                        {"key": "first", "rollout_percentage": 25},
+                        {"key": "second", "rollout_percentage": 75},
+                    ]
+                },
+            },
+        )
+
+        with patch(
+            "posthog.models.feature_flag.feature_flag.get_feature_flags_for_team_in_cache",
+            wraps=get_feature_flags_for_team_in_cache,
+        ) as get_flags_mock:
+            compiled_flags = get_compiled_feature_flags_for_team(self.team.pk)
+            self.assertEqual(get_compiled_feature_flags_for_team(self.team.pk), compiled_flags)
+            self.assertIs(get_compiled_feature_flags_for_team(self.team.pk)[0], compiled_flags[0])
+            self.assertEqual(get_flags_mock.call_count, 1)
+
+            self.assertEqual([index for index, _ in compiled_flags[0].get_sorted_conditions()], [1, 0])
+            self.assertEqual(
+                compiled_flags[0].get_variant_lookup_table(),
+                [
+                    {"value_min": 0, "value_max": 0.25, "key": "first"},
+                    {"value_min": 0.25, "value_max": 1.0, "key": "second"},
+                ],
+            )
+            self.assertEqual(compiled_flags[0].get_condition_properties(0)[0].key, "email")
+
+            flag.name = "New name"
+            flag.save()
+
+            compiled_flags = get_compiled_feature_flags_for_team(self.team.pk)
+            self.assertEqual(compiled_flags[0].name, "New name")
+            self.assertEqual(get_flags_mock.call_count, 2)
+
+    def test_compiled_flags_are_reloaded_when_version_is_lost(self):
+        FeatureFlag.objects.create(team=self.team, key="beta-feature", created_by=self.user)
+        self.assertEqual(len(get_compiled_feature_flags_for_team(self.team.pk)), 1)
+
+        cache.clear()
+        FeatureFlag.objects.filter(team=self.team).update(active=False)
+
+        self.assertEqual(get_compiled_feature_flags_for_team(self.team.pk), [])
+
+    def test_compiled_flags_without_redis(self):
+        FeatureFlag.objects.create(team=self.team, key="beta-feature", created_by=self.user)
+
+        with patch("posthog.models.feature_flag.feature_flag.cache.get", side_effect=Exception("redis is down")):
+            compiled_flags = get_compiled_feature_flags_for_team(self.team.pk)
+
+        self.assertEqual([flag.key for flag in compiled_flags], ["beta-feature"])
+
 
 class TestFeatureFlagMatcher(BaseTest, QueryMatchingTest):
     maxDiff = None
@@ -1049,9 +1117,9 @@ class TestFeatureFlagMatcher(BaseTest, QueryMatchingTest):
             key="variant",
         )
 
-        with self.assertNumQueries(10), snapshot_postgres_queries_context(
+        with self.assertNumQueries(9), snapshot_postgres_queries_context(
             self
-        ):  # 1 to fill group cache, 2 to match feature flags with group properties (of each type), 1 to match feature flags with person properties
+        ):  # 1 to fill group cache, 1 to match feature flags with group properties (the other group type has none), 1 to match feature flags with person properties
             matches, reasons, payloads, _ = FeatureFlagMatcher(
                 [
                     feature_flag_one,
@@ -1357,7 +1425,7 @@ class TestFeatureFlagMatcher(BaseTest, QueryMatchingTest):
                 ]
             }
         )
-        with self.assertNumQueries(8):
+        with self.assertNumQueries(4):
             # None in both because all conditions don't match
             # and user doesn't exist yet
             self.assertEqual(
@@ -1366,6 +1434,7 @@ class TestFeatureFlagMatcher(BaseTest, QueryMatchingTest):
                 ).get_match(feature_flag),
                 FeatureFlagMatch(False, None, FeatureFlagMatchReason.NO_CONDITION_MATCH, 0),
             )
+            # can be computed locally, as the email override alone doesn't match
             self.assertEqual(
                 FeatureFlagMatcher([feature_flag], "example_id", property_value_overrides={"email": "bzz"}).get_match(
                     feature_flag
@@ -1417,6 +1486,47 @@ class TestFeatureFlagMatcher(BaseTest, QueryMatchingTest):
                 FeatureFlagMatch(False, None, FeatureFlagMatchReason.NO_CONDITION_MATCH, 0),
             )
 
+    def test_overrides_that_dont_match_skip_the_query_for_every_flag(self):
+        Person.objects.create(team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com"})
+        email_flag = self.create_feature_flag(
+            key="email", filters={"groups": [{"properties": [{"key": "email", "value": "tim@posthog.com"}]}]}
+        )
+        email_and_slow_flag = self.create_feature_flag(
+            key="email-and-slow",
+            filters={
+                "groups": [
+                    {
+                        "properties": [
+                            {"key": "email", "value": "tim@posthog.com"},
+                            {"key": "another_prop", "value": "slow"},
+                        ]
+                    },
+                    {"rollout_percentage": 100},
+                ]
+            },
+        )
+        name_flag = self.create_feature_flag(
+            key="name", filters={"groups": [{"properties": [{"key": "name", "value": "Tim", "type": "person"}]}]}
+        )
+        feature_flags = [email_flag, email_and_slow_flag, name_flag]
+
+        with self.assertNumQueries(0):
+            matches, reasons, _, errors = FeatureFlagMatcher(
+                feature_flags, "example_id", property_value_overrides={"email": "bzz", "name": "Tim"}
+            ).get_matches()
+
+        self.assertEqual(matches, {"email": False, "email-and-slow": True, "name": True})
+        self.assertEqual(reasons["email-and-slow"]["condition_index"], 1)
+        self.assertFalse(errors)
+
+        # The email matches, so only another_prop is left to postgres, which doesn't have it
+        with self.assertNumQueries(4):
+            matches, _, _, _ = FeatureFlagMatcher(
+                feature_flags, "example_id", property_value_overrides={"email": "tim@posthog.com", "name": "Tim"}
+            ).get_matches()
+
+        self.assertEqual(matches, {"email": True, "email-and-slow": True, "name": True})
+
     def test_multi_property_filters_with_override_properties_with_is_not_set(self):
         Person.objects.create(team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com"})
         Person.objects.create(team=self.team, distinct_ids=["another_id"], properties={"email": "example@example.com"})
@@ -1691,6 +1801,38 @@ class TestFeatureFlagMatcher(BaseTest, QueryMatchingTest):
             ),
         )
 
+    def test_hashes_are_memoized_per_matcher(self):
+        feature_flag = self.create_feature_flag(
+            filters={
+                "groups": [{"rollout_percentage": 10}, {"rollout_percentage": 90}],
+                "multivariate": {
+                    "variants": [
+                        {"key": "first-variant", "rollout_percentage": 50},
+                        {"key": "second-variant", "rollout_percentage": 0},
+                        {"key": "third-variant", "rollout_percentage": 50},
+                    ]
+                },
+            }
+        )
+        matcher = FeatureFlagMatcher([feature_flag], "some_id")
+
+        with patch("posthog.models.feature_flag.flag_matching.hashlib.sha1", wraps=hashlib.sha1) as sha1_mock:
+            for _ in range(3):
+                matcher.get_hash(feature_flag)
+                matcher.get_hash(feature_flag, salt="variant")
+            self.assertEqual(sha1_mock.call_count, 2)
+
+            self.assertEqual(
+                matcher.get_match(feature_flag), FeatureFlagMatcher([feature_flag], "some_id").get_match(feature_flag)
+            )
+
+        self.assertEqual(feature_flag.get_variant_boundaries(), [0.5, 0.5, 1.0])
+        variants = {
+            FeatureFlagMatcher([feature_flag], f"distinct_id_{index}").get_matching_variant(feature_flag)
+            for index in range(50)
+        }
+        self.assertEqual(variants, {"first-variant", "third-variant"})
+
     def test_flag_by_groups_with_rollout_100(self):
         self.create_groups()
         feature_flag = self.create_feature_flag(
@@ -1939,6 +2081,150 @@ class TestFeatureFlagHashKeyOverrides(BaseTest, QueryMatchingTest):
         self.assertEqual(payloads, {})
 
 
+class TestBulkFeatureFlagMatching(BaseTest):
+    maxDiff = None
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        GroupTypeMapping.objects.create(team=self.team, group_type="organization", group_type_index=0)
+        Group.objects.create(
+            team=self.team, group_type_index=0, group_key="foo", group_properties={"name": "foo.inc"}, version=1
+        )
+        Group.objects.create(
+            team=self.team, group_type_index=0, group_key="bar", group_properties={"name": "bar.inc"}, version=1
+        )
+        for index in range(6):
+            person = Person.objects.create(
+                team=self.team,
+                distinct_ids=[f"person_{index}"],
+                properties={"email": f"person_{index}@{'posthog.com' if index % 2 else 'example.com'}"},
+            )
+            if index == 0:
+                FeatureFlagHashKeyOverride.objects.create(
+                    team=self.team, person=person, feature_flag_key="continuity", hash_key="other_id"
+                )
+
+        for key, filters, ensure_experience_continuity in [
+            (
+                "email",
+                {"groups": [{"properties": [{"key": "email", "value": "posthog.com", "operator": "icontains"}]}]},
+                False,
+            ),
+            (
+                "email-and-slow",
+                {
+                    "groups": [
+                        {
+                            "properties": [
+                                {"key": "email", "value": "example.com", "operator": "icontains"},
+                                {"key": "slow", "value": "yes"},
+                            ]
+                        }
+                    ]
+                },
+                False,
+            ),
+            (
+                "organization",
+                {
+                    "aggregation_group_type_index": 0,
+                    "groups": [
+                        {"properties": [{"key": "name", "value": "foo.inc", "type": "group", "group_type_index": 0}]}
+                    ],
+                },
+                False,
+            ),
+            (
+                "variant",
+                {
+                    "groups": [{"rollout_percentage": 50}],
+                    "multivariate": {
+                        "variants": [
+                            {"key": "first", "rollout_percentage": 50},
+                            {"key": "second", "rollout_percentage": 50},
+                        ]
+                    },
+                },
+                False,
+            ),
+            ("continuity", {"groups": [{"rollout_percentage": 50}]}, True),
+        ]:
+            FeatureFlag.objects.create(
+                team=self.team,
+                key=key,
+                created_by=self.user,
+                filters=filters,
+                ensure_experience_continuity=ensure_experience_continuity,
+            )
+
+    def test_matches_evaluating_one_distinct_id_at_a_time(self):
+        targets = [
+            FeatureFlagEvaluationTarget(
+                distinct_id=f"person_{index}", groups={"organization": "foo" if index < 3 else "bar"}
+            )
+            for index in range(6)
+        ] + [
+            FeatureFlagEvaluationTarget(distinct_id="not_ingested_yet", groups={"organization": "foo"}),
+            FeatureFlagEvaluationTarget(
+                distinct_id="with_overrides",
+                property_value_overrides={"email": "a@example.com", "slow": "yes"},
+                group_property_value_overrides={"organization": {"name": "foo.inc"}},
+                groups={"organization": "baz"},
+            ),
+        ]
+
+        results = get_all_feature_flags_for_distinct_ids(self.team.pk, targets)
+
+        self.assertEqual(len(results), len(targets))
+        for target in targets:
+            self.assertEqual(
+                results[target.distinct_id],
+                get_all_feature_flags(
+                    self.team.pk,
+                    target.distinct_id,
+                    target.groups,
+                    property_value_overrides=target.property_value_overrides,
+                    group_property_value_overrides=target.group_property_value_overrides,
+                ),
+            )
+        self.assertEqual(results["person_1"][0]["email"], True)
+        self.assertEqual(results["person_0"][0]["email"], False)
+        self.assertEqual(results["with_overrides"][0]["email-and-slow"], True)
+        self.assertEqual(results["with_overrides"][0]["organization"], True)
+
+    def test_number_of_queries_does_not_depend_on_number_of_distinct_ids(self):
+        def count_queries(targets):
+            with CaptureQueriesContext(connection) as context:
+                get_all_feature_flags_for_distinct_ids(self.team.pk, targets)
+            return len(context.captured_queries)
+
+        # Warm up the flag definitions cache
+        get_all_feature_flags_for_distinct_ids(self.team.pk, [FeatureFlagEvaluationTarget(distinct_id="person_0")])
+
+        self.assertEqual(
+            count_queries([FeatureFlagEvaluationTarget(distinct_id="person_0", groups={"organization": "foo"})]),
+            count_queries(
+                [
+                    FeatureFlagEvaluationTarget(distinct_id=f"person_{index}", groups={"organization": "foo"})
+                    for index in range(6)
+                ]
+            ),
+        )
+
+    def test_errors_when_database_is_down(self):
+        with patch("posthog.models.feature_flag.flag_matching.execute_with_timeout", side_effect=DatabaseError):
+            results = get_all_feature_flags_for_distinct_ids(
+                self.team.pk, [FeatureFlagEvaluationTarget(distinct_id="person_1")]
+            )
+
+        flags, _, _, errors = results["person_1"]
+        self.assertTrue(errors)
+        self.assertNotIn("continuity", flags)
+        self.assertNotIn("email", flags)
+        self.assertIn("variant", flags)
+
+
 class TestHashKeyOverridesRaceConditions(TransactionTestCase, QueryMatchingTest):
     def test_hash_key_overrides_with_race_conditions(self):
         org = Organization.objects.create(name="test")
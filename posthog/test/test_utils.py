@@ -1,12 +1,18 @@
+import base64
+import gzip
+import json
 from datetime import datetime
 from unittest.mock import call, patch
 
+import lzstring
 import pytest
+from django.core.exceptions import RequestDataTooBig
 from django.core.handlers.wsgi import WSGIRequest
 from django.http import HttpRequest
 from django.test import TestCase
 from django.test.client import RequestFactory
 from freezegun import freeze_time
+from prometheus_client import REGISTRY
 from rest_framework.request import Request
 
 from posthog.api.test.mock_sentry import mock_sentry_context_for_tagging
@@ -16,11 +22,14 @@ from posthog.settings.utils import get_from_env
 from posthog.test.base import BaseTest
 from posthog.utils import (
     PotentialSecurityProblemException,
+    StreamingJSONReader,
     absolute_uri,
+    decompress,
     format_query_params_absolute_url,
     get_available_timezones_with_offsets,
     get_compare_period_dates,
     get_default_event_name,
+    iter_gunzip,
     load_data_from_request,
     refresh_requested_by_client,
     relative_date_parse,
@@ -303,6 +312,93 @@ class TestLoadDataFromRequest(TestCase):
         self.assertEqual({"what is it": "the decompressed value"}, data)
 
 
+class TestDecompress(TestCase):
+    def _decoded_count(self, encoding: str) -> float:
+        return REGISTRY.get_sample_value("request_decoding_total", labels={"encoding": encoding}) or 0
+
+    def test_decodes_each_encoding(self):
+        data = {"event": "$pageview", "properties": {"distinct_id": "🦔", "count": 1}}
+        encoded = json.dumps(data).encode("utf-8")
+
+        for payload, compression, encoding in [
+            (encoded, "", "json"),
+            (json.dumps(data), "", "json"),
+            (gzip.compress(encoded), "gzip-js", "gzip"),
+            # Gzipped bodies sent without the compression flag
+            (gzip.compress(encoded), "", "gzip"),
+            (base64.b64encode(encoded), "", "legacy"),
+            (lzstring.LZString().compressToBase64(json.dumps(data)), "lz64", "lz64"),
+        ]:
+            decoded_count = self._decoded_count(encoding)
+
+            self.assertEqual(decompress(payload, compression), data)
+            self.assertEqual(self._decoded_count(encoding), decoded_count + 1)
+
+    def test_decodes_short_json_that_looks_like_base64(self):
+        self.assertEqual(decompress(b'{"a":1}', ""), {"a": 1})
+
+    def test_keeps_standard_library_decoding_where_it_differs(self):
+        self.assertEqual(decompress(b'{"a": NaN, "b": Infinity}', ""), {"a": None, "b": None})
+        self.assertEqual(decompress(gzip.compress(b'{"a": NaN}'), "gzip"), {"a": None})
+        self.assertEqual(
+            decompress(b'{"big": 123456789012345678901234567890}', ""), {"big": 123456789012345678901234567890}
+        )
+        self.assertEqual(decompress(b'{"small": -9300000000000000000}', ""), {"small": -9300000000000000000})
+
+    def test_raises_for_invalid_json(self):
+        with self.assertRaises(RequestParsingError) as ctx:
+            decompress(b'{"unterminated', "")
+
+        self.assertEqual("Invalid JSON: Unterminated string starting at: line 1 column 2 (char 1)", str(ctx.exception))
+
+
+class TestStreamingDecoding(TestCase):
+    def _chunks(self, text, size):
+        return [text[i : i + size] for i in range(0, len(text), size)]
+
+    def test_iter_array_across_chunk_boundaries(self):
+        events = [{"event": f"event {i}", "properties": {"count": 1234567890 * i, "text": "🦔" * i}} for i in range(50)]
+        text = json.dumps(events)
+
+        for size in [1, 7, 1024, len(text)]:
+            reader = StreamingJSONReader(self._chunks(text, size))
+            self.assertEqual(list(reader.iter_array()), events)
+            reader.end()
+
+    def test_object_with_streamed_keys(self):
+        data = {"api_key": "token", "batch": [{"event": "a"}, {"event": "b"}], "sent_at": None}
+        reader = StreamingJSONReader(self._chunks(json.dumps(data), 5))
+
+        self.assertEqual(reader.object(stream_keys=("batch",)), data)
+        reader.end()
+
+    def test_nan_is_decoded_as_none(self):
+        reader = StreamingJSONReader(["[NaN, 1]"])
+
+        self.assertEqual(list(reader.iter_array()), [None, 1])
+
+    def test_invalid_json(self):
+        for text in ["[1, 2", "[1 2]", '{"a": 1,}', "[1]extra"]:
+            with self.assertRaises(RequestParsingError):
+                reader = StreamingJSONReader([text])
+                if text.startswith("["):
+                    list(reader.iter_array())
+                else:
+                    reader.object()
+                reader.end()
+
+    def test_iter_gunzip(self):
+        compressed = gzip.compress(b"x" * 100_000)
+
+        self.assertEqual(b"".join(iter_gunzip([compressed[:10], compressed[10:]], max_bytes=100_000)), b"x" * 100_000)
+
+        with self.assertRaises(RequestDataTooBig):
+            b"".join(iter_gunzip([compressed], max_bytes=1000))
+
+        with self.assertRaises(RequestParsingError):
+            b"".join(iter_gunzip([compressed[:-10]], max_bytes=100_000))
+
+
 class TestShouldRefresh(TestCase):
     def test_refresh_requested_by_client_with_refresh_true(self):
         request = HttpRequest()
@@ -20,6 +20,7 @@ from typing import (
     Any,
     Dict,
     Generator,
+    Iterable,
     List,
     Mapping,
     Optional,
@@ -30,6 +31,7 @@ from typing import (
 from urllib.parse import urljoin, urlparse
 
 import lzstring
+import orjson
 import posthoganalytics
 import pytz
 import structlog
@@ -38,10 +40,12 @@ from dateutil import parser
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import RequestDataTooBig
 from django.db.utils import DatabaseError
 from django.http import HttpRequest, HttpResponse
 from django.template.loader import get_template
 from django.utils import timezone
+from prometheus_client import Counter
 from rest_framework.request import Request
 from sentry_sdk import configure_scope
 from sentry_sdk.api import capture_exception
@@ -68,6 +72,16 @@ DEFAULT_DATE_FROM_DAYS = 7
 
 logger = structlog.get_logger(__name__)
 
+# Integers of 19 digits or more may not fit in 64 bits, e.g. negatives below -2**63
+LONG_NUMBER_REGEX = re.compile(r"-?\d{19,}")
+LONG_NUMBER_BYTES_REGEX = re.compile(rb"-?\d{19,}")
+
+REQUEST_DECODING_COUNTER = Counter(
+    "request_decoding_total",
+    "Capture and /decide request payloads decoded by decompress, per encoding detected.",
+    labelnames=["encoding"],
+)
+
 # https://stackoverflow.com/questions/4060221/how-to-reliably-open-a-file-in-the-same-directory-as-a-python-script
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
@@ -590,37 +604,85 @@ def base64_decode(data):
 
 
 def decompress(data: Any, compression: str):
+    """
+    Decodes the payload of a capture or /decide request, detecting its encoding from its content and `compression`.
+
+    JSON, whether sent as is, gzipped or with lz64, is parsed straight from the decompressed bytes with orjson. Other
+    payloads, e.g. base64 encoded JSON from legacy SDKs, and JSON that orjson rejects, like `NaN`, go through the
+    standard library's decoding.
+    """
     if not data:
         return None
 
-    if compression == "gzip" or compression == "gzip-js":
-        if data == b"undefined":
-            raise RequestParsingError(
-                "data being loaded from the request body for decompression is the literal string 'undefined'"
-            )
+    if compression in ("gzip", "gzip-js") or (
+        compression == "" and isinstance(data, bytes) and data.startswith(GZIP_MAGIC_BYTES)
+    ):
+        encoding = "gzip"
+        data = _gunzip(data)
+        compression = "gzip"
+    elif compression == "lz64":
+        encoding = "lz64"
+        data = _lz64_decompress(data)
+    elif _looks_like_json(data):
+        encoding = "json"
+    else:
+        encoding = "legacy"
+    REQUEST_DECODING_COUNTER.labels(encoding=encoding).inc()
 
+    if _looks_like_json(data) and not _may_have_large_integers(data):
         try:
-            data = gzip.decompress(data)
-        except (EOFError, OSError, zlib.error) as error:
-            raise RequestParsingError("Failed to decompress data. %s" % (str(error)))
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
 
-    if compression == "lz64":
-        if not isinstance(data, str):
-            data = data.decode()
-        data = data.replace(" ", "+")
+    return _decode_legacy_payload(data, compression)
 
-        data = lzstring.LZString().decompressFromBase64(data)
 
-        if not data:
-            raise RequestParsingError("Failed to decompress data.")
+def _looks_like_json(data: Union[str, bytes]) -> bool:
+    # Only the start is stripped, to not copy the whole payload
+    start = data[:64].lstrip()[:1]
+    return start in (b"{", b"[") if isinstance(data, bytes) else start in ("{", "[")
 
-        data = data.encode("utf-16", "surrogatepass").decode("utf-16")
 
-    base64_decoded = None
+def _may_have_large_integers(data: Union[str, bytes]) -> bool:
+    # orjson decodes integers that don't fit in 64 bits as floats, losing precision, where the standard library doesn't
+    pattern = LONG_NUMBER_BYTES_REGEX if isinstance(data, bytes) else LONG_NUMBER_REGEX
+    return pattern.search(data) is not None  # type: ignore
+
+
+def _gunzip(data: Union[str, bytes]) -> Union[str, bytes]:
+    if data == b"undefined":
+        raise RequestParsingError(
+            "data being loaded from the request body for decompression is the literal string 'undefined'"
+        )
+
     try:
-        base64_decoded = base64_decode(data)
-    except Exception:
-        pass
+        return gzip.decompress(data)  # type: ignore
+    except (EOFError, OSError, zlib.error) as error:
+        raise RequestParsingError("Failed to decompress data. %s" % (str(error)))
+
+
+def _lz64_decompress(data: Union[str, bytes]) -> str:
+    if not isinstance(data, str):
+        data = data.decode()
+    data = data.replace(" ", "+")
+
+    decompressed = lzstring.LZString().decompressFromBase64(data)
+
+    if not decompressed:
+        raise RequestParsingError("Failed to decompress data.")
+
+    return decompressed.encode("utf-16", "surrogatepass").decode("utf-16")
+
+
+def _decode_legacy_payload(data: Any, compression: str):
+    base64_decoded = None
+    # JSON isn't valid base64, but might decode to garbage as invalid characters are skipped
+    if not _looks_like_json(data):
+        try:
+            base64_decoded = base64_decode(data)
+        except Exception:
+            pass
 
     if base64_decoded:
         data = base64_decoded
@@ -633,7 +695,7 @@ def decompress(data: Any, compression: str):
     except (json.JSONDecodeError, UnicodeDecodeError) as error_main:
         if compression == "":
             try:
-                return decompress(data, "gzip")
+                return _decode_legacy_payload(_gunzip(data), "gzip")
             except Exception as inner:
                 # re-trying with compression set didn't succeed, throw original error
                 raise RequestParsingError("Invalid JSON: %s" % (str(error_main))) from inner
@@ -644,6 +706,17 @@ def decompress(data: Any, compression: str):
     return data
 
 
+def set_request_scope(request: HttpRequest, data: Any = None) -> None:
+    # add the data in sentry's scope in case there's an exception
+    with configure_scope() as scope:
+        if isinstance(data, dict):
+            scope.set_context("data", data)
+        scope.set_tag("origin", request.headers.get("origin", request.headers.get("remote_host", "unknown")))
+        scope.set_tag("referer", request.headers.get("referer", "unknown"))
+        # since version 1.20.0 posthog-js adds its version to the `ver` query parameter as a debug signal here
+        scope.set_tag("library.version", request.GET.get("ver", "unknown"))
+
+
 # Used by non-DRF endpoints from capture.py and decide.py (/decide, /batch, /capture, etc)
 def load_data_from_request(request):
     if request.method == "POST":
@@ -654,14 +727,7 @@ def load_data_from_request(request):
     else:
         data = request.GET.get("data")
 
-    # add the data in sentry's scope in case there's an exception
-    with configure_scope() as scope:
-        if isinstance(data, dict):
-            scope.set_context("data", data)
-        scope.set_tag("origin", request.headers.get("origin", request.headers.get("remote_host", "unknown")))
-        scope.set_tag("referer", request.headers.get("referer", "unknown"))
-        # since version 1.20.0 posthog-js adds its version to the `ver` query parameter as a debug signal here
-        scope.set_tag("library.version", request.GET.get("ver", "unknown"))
+    set_request_scope(request, data)
 
     compression = (
         request.GET.get("compression") or request.POST.get("compression") or request.headers.get("content-encoding", "")
@@ -670,6 +736,163 @@ def load_data_from_request(request):
     return decompress(data, compression)
 
 
+STREAMING_READ_CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC_BYTES = b"\x1f\x8b"
+
+
+def iter_request_body(request: HttpRequest, max_bytes: Optional[int]) -> Generator[bytes, None, None]:
+    """
+    Reads the raw request body in chunks, without loading it into memory in full.
+
+    Raises `RequestDataTooBig` if the body is larger than `max_bytes`, mirroring the
+    `DATA_UPLOAD_MAX_MEMORY_SIZE` check Django does when accessing `request.body`.
+    """
+    read_bytes = 0
+    while True:
+        chunk = request.read(STREAMING_READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        read_bytes += len(chunk)
+        if max_bytes is not None and read_bytes > max_bytes:
+            raise RequestDataTooBig("Request body exceeded %s bytes." % max_bytes)
+        yield chunk
+
+
+def iter_gunzip(chunks: Iterable[bytes], max_bytes: int) -> Generator[bytes, None, None]:
+    """
+    Incrementally decompresses gzipped chunks, raising `RequestDataTooBig` as soon as the
+    decompressed output goes over `max_bytes` rather than after inflating all of it.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    decompressed_bytes = 0
+    try:
+        for chunk in chunks:
+            while chunk:
+                output = decompressor.decompress(chunk, STREAMING_READ_CHUNK_SIZE)
+                chunk = decompressor.unconsumed_tail
+                decompressed_bytes += len(output)
+                if decompressed_bytes > max_bytes:
+                    raise RequestDataTooBig("Decompressed request body exceeded %s bytes." % max_bytes)
+                yield output
+        output = decompressor.flush()
+    except zlib.error as error:
+        raise RequestParsingError("Failed to decompress data. %s" % (str(error)))
+
+    if not decompressor.eof:
+        raise RequestParsingError(
+            "Failed to decompress data. Compressed file ended before the end-of-stream marker was reached"
+        )
+    yield output
+
+
+class StreamingJSONReader:
+    """
+    Decodes a JSON document from an iterator of text chunks, one value at a time.
+
+    Only the values that are currently being decoded are kept in the buffer, which lets
+    callers walk through large arrays (e.g. a batch of events) without holding the whole
+    document, and its decoded copy, in memory.
+    """
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+        # parse_constant gets called in case of NaN, Infinity etc, see `decompress`
+        self._decoder = json.JSONDecoder(parse_constant=lambda x: None)
+
+    def _read_more(self, min_chars: int) -> None:
+        parts = [self._buffer[self._position :]]
+        size = len(parts[0])
+        target = size + min_chars
+        while size < target:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._eof = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        self._buffer = "".join(parts)
+        self._position = 0
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it, or "" at the end of the document."""
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in " \t\n\r":
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if self._eof:
+                return ""
+            self._read_more(STREAMING_READ_CHUNK_SIZE)
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise RequestParsingError("Invalid JSON: expected '%s' at position %s" % (char, self._position))
+        self._position += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+                # A value ending exactly at the end of the buffer may be truncated (e.g. a number)
+                if end < len(self._buffer) or self._eof:
+                    self._position = end
+                    return value
+            except json.JSONDecodeError as error:
+                if self._eof:
+                    raise RequestParsingError("Invalid JSON: %s" % (str(error)))
+            # Grow the buffer geometrically so that large values are re-scanned a bounded number of times
+            self._read_more(max(len(self._buffer) - self._position, STREAMING_READ_CHUNK_SIZE))
+
+    def iter_array(self) -> Generator[Any, None, None]:
+        self.expect("[")
+        if self.peek() == "]":
+            self._position += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self._position += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise RequestParsingError("Invalid JSON: expected ',' or ']' at position %s" % (self._position - 1))
+
+    def object(self, stream_keys: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        """
+        Decodes an object key by key. Array values under `stream_keys` are decoded element
+        by element, so that the document text is never buffered in full.
+        """
+        result: Dict[str, Any] = {}
+        self.expect("{")
+        if self.peek() == "}":
+            self._position += 1
+            return result
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise RequestParsingError("Invalid JSON: object keys must be strings")
+            self.expect(":")
+            if key in stream_keys and self.peek() == "[":
+                result[key] = list(self.iter_array())
+            else:
+                result[key] = self.value()
+            separator = self.peek()
+            self._position += 1
+            if separator == "}":
+                return result
+            if separator != ",":
+                raise RequestParsingError("Invalid JSON: expected ',' or '}' at position %s" % (self._position - 1))
+
+    def end(self) -> None:
+        if self.peek() != "":
+            raise RequestParsingError("Invalid JSON: Extra data at position %s" % self._position)
+
+
 class SingletonDecorator:
     def __init__(self, klass):
         self.klass = klass